@@ -0,0 +1,24 @@
+"""
+Configuración de gunicorn para servir con varios workers compartiendo los modelos
+Usage: PRELOAD_MODELS=true gunicorn -c gunicorn.conf.py main_refactored:app
+
+preload_app importa la app (y con PRELOAD_MODELS los modelos de avalúo) una sola
+vez en el master; los workers nacen por fork y comparten esa memoria mientras no
+la escriban. Cada worker corre sus hooks de startup (calentamiento, snapshots).
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+# El runtime OpenMP de LightGBM no sobrevive a un fork si el master ya abrió su
+# pool de hilos, y con N workers x INFERENCE_WORKERS hilos tampoco conviene que
+# cada predict use todos los cores: un hilo OpenMP por predict.
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+
+def when_ready(server):
+    server.log.info("Master listo: modelos precargados" if os.getenv("PRELOAD_MODELS", "false").lower() == "true"
+                    else "Master listo (PRELOAD_MODELS desactivado: cada worker carga los modelos al primer avalúo)")
@@ -7,6 +7,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import os
 import re
+import gc
+import asyncio
 
 from auth import verify_session, is_read_only, SESSION_SECRET
 
@@ -39,11 +41,16 @@ _MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
 # Escrituras exentas de sesión:
 #  - /api/auth/*  → login (aún no hay sesión)
 #  - /api/dashboard/{token}/sync → sync del share-link público de plan de pagos
-_PUBLIC_WRITE_PREFIXES = ("/api/auth/",)
+#  - /api/ingest/* → escrituras de los scrapers, autenticadas con INGEST_API_KEY en el router
+_PUBLIC_WRITE_PREFIXES = ("/api/auth/", "/api/ingest/")
 _PUBLIC_WRITE_REGEXES = (re.compile(r"^/api/dashboard/[^/]+/sync/?$"),)
 # POSTs de solo CÓMPUTO (no escriben nada): exigen sesión válida pero se permiten
-# a las cuentas de solo lectura — p. ej. el avalúo, que solo corre los modelos ML.
-_COMPUTE_ONLY_REGEXES = (re.compile(r"^/api/valuation/?$"),)
+# a las cuentas de solo lectura — p. ej. el avalúo (individual o por lote), que solo corre los modelos ML,
+# la búsqueda de comparables y la geocodificación inversa por lote.
+_COMPUTE_ONLY_REGEXES = (
+    re.compile(r"^/api/valuation(/batch|/comps)?/?$"),
+    re.compile(r"^/api/geo/reverse/batch/?$"),
+)
 
 
 @app.middleware("http")
@@ -85,6 +92,10 @@ from models.valuation import Valuation
 from models.payment_plan_dashboard import PaymentPlanDashboard
 from models.investor_tenant import InvestorTenantInfo
 from models.property_images import PropertyImage
+from models.zone_polygon import ZonePolygon
+from models.zone_sketch import ZoneSketch
+from models.rollup_watermark import RollupWatermark
+from models.price_snapshot import PriceSnapshot
 
 # Inicializar base de datos al arrancar
 from config.db_connection import init_db
@@ -105,6 +116,9 @@ from routers.client_name import router as client_name_router
 from routers.investor_data import router as investor_data_router
 from routers.auth import router as auth_router
 from routers.investment_opportunities import router as investment_opportunities_router
+from routers.stream import router as stream_router
+from routers.ingest import router as ingest_router
+from routers.geo import router as geo_router
 
 # Registrar routers
 app.include_router(dashboard_router)
@@ -120,9 +134,79 @@ app.include_router(client_name_router)
 app.include_router(investor_data_router)
 app.include_router(auth_router)
 app.include_router(investment_opportunities_router)
+app.include_router(stream_router)
+app.include_router(ingest_router)
+app.include_router(geo_router)
 
 # Importar servicio de estadísticas para el root endpoint
 from services.stats_service import get_local_now
+from services.dashboard_snapshot import start_all as start_snapshots
+from services.event_broadcaster import broadcaster
+from services.log_ingest import log_buffer
+from routers.valuations import inference, registry, warm_up_models, model_status, _load_models
+from services.reverse_geocoder import reverse_geocoder
+
+# PRELOAD_MODELS=true: los modelos de avalúo se parsean al importar la app. Con
+# gunicorn --preload (gunicorn.conf.py) eso pasa en el master antes del fork y
+# los workers comparten esas páginas (copy-on-write); gc.freeze saca lo cargado
+# del recolector para que no las toque. El predict de prueba va en cada worker.
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "false").lower() == "true"
+if PRELOAD_MODELS:
+    _load_models()
+    gc.freeze()
+
+
+@app.on_event("startup")
+async def start_background_snapshots():
+    """Arranca el refresco en segundo plano de los snapshots del dashboard"""
+    start_snapshots()
+
+
+@app.on_event("startup")
+async def warm_up_valuation_models():
+    """Valida y calienta los modelos antes de que /health reporte listo (opt-in)"""
+    if not PRELOAD_MODELS:
+        return
+    try:
+        await asyncio.to_thread(warm_up_models)
+    except Exception as e:
+        print(f"❌ Falló el calentamiento de los modelos de avalúo: {e}")
+
+
+@app.on_event("shutdown")
+async def stop_event_listener():
+    """Detiene el listener LISTEN/NOTIFY del stream de eventos"""
+    broadcaster.stop()
+
+
+@app.on_event("shutdown")
+async def flush_ingest_buffer():
+    """Vuelca a la BD los logs que quedaron en la cola de ingesta"""
+    await asyncio.to_thread(log_buffer.shutdown)
+
+
+@app.on_event("shutdown")
+async def stop_inference_pool():
+    """Detiene los hilos del pool de inferencia de avalúos"""
+    await asyncio.to_thread(inference.shutdown)
+
+
+@app.on_event("startup")
+async def start_model_watcher():
+    """Sigue ml_models/versions/CURRENT para activar versiones nuevas sin redeploy"""
+    registry.start_watcher()
+
+
+@app.on_event("shutdown")
+async def stop_model_watcher():
+    """Detiene el watcher de versiones de modelos"""
+    registry.stop_watcher()
+
+
+@app.on_event("startup")
+async def build_reverse_geocoder():
+    """Construye en segundo plano el índice lat/lon → ciudad/zona"""
+    reverse_geocoder.refresh_async()
 
 
 @app.get("/")
@@ -134,6 +218,15 @@ async def root():
 @app.get("/health")
 async def health():
     """Endpoint de healthcheck para Docker"""
+    if PRELOAD_MODELS:
+        models = model_status()
+        if not models["warmed_up"]:
+            return JSONResponse(
+                {"status": "unhealthy", "detail": models["warmup_error"] or "Modelos sin calentar", "timestamp": str(get_local_now())},
+                status_code=503
+            )
+        return {"status": "healthy", "timestamp": get_local_now(),
+                "models": {"load_ms": models["load_ms"], "warmup_ms": models["warmup_ms"]}}
     return {"status": "healthy", "timestamp": get_local_now()}
 
 
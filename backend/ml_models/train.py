@@ -18,12 +18,21 @@ Uso:
     # (o bien PGHOST/PGPORT/PGDATABASE/PGUSER/PGPASSWORD)
     python train.py
 
+    # Versionado: escribe en versions/<MODEL_VERSION>/ sin tocar lo que se sirve;
+    # luego POST /api/valuation/models/<MODEL_VERSION>/activate (o editar versions/CURRENT)
+    MODEL_VERSION=auto python train.py     # auto = fecha UTC, p. ej. 20260701-031333
+
+    # Modelo compacto (menos árboles): por defecto solo reporta en compact_report.json;
+    # serve lo escribe como el modelo servido. off salta la etapa.
+    COMPACT_MODEL=serve python train.py
+
 El objetivo es log1p(price_per_m2); el backend aplica expm1 en inferencia.
 """
 
 import os
 import re
 import json
+import time
 from pathlib import Path
 from datetime import datetime, timezone
 from urllib.parse import quote_plus
@@ -40,6 +49,11 @@ import lightgbm as lgb
 # --------------------------------------------------------------------------- #
 TABLE_NAME = os.environ.get("TRAIN_TABLE", "property")
 OUT_DIR = Path(os.environ.get("OUT_DIR", Path(__file__).resolve().parent))
+MODEL_VERSION = os.environ.get("MODEL_VERSION", "")
+# Filas de test que se guardan para verificar backends compilados (treelite/ONNX)
+HOLDOUT_ROWS = int(os.environ.get("HOLDOUT_ROWS", "500"))
+# Fracción de test: no la ve ni el early stopping ni la selección del compacto
+TEST_SIZE = float(os.environ.get("TEST_SIZE", "0.15"))
 
 FEATURES = [
     "area", "rooms", "baths", "garages", "stratum", "latitude", "longitude",
@@ -112,6 +126,7 @@ def convert_antiquity(val):
     return 0
 
 
+# Mismas reglas en services/property_filters.classify_property_type (índice de comps)
 def extract_property_type(title):
     if pd.isna(title):
         return 0
@@ -238,9 +253,16 @@ LGB_PARAMS = {
 }
 
 
+def split_train_val_test(X, y):
+    """train / val (early stopping y selección) / test (solo métricas finales); corte fijo"""
+    Xrest, Xte, yrest, yte = train_test_split(X, y, test_size=TEST_SIZE, random_state=42)
+    Xtr, Xva, ytr, yva = train_test_split(Xrest, yrest, test_size=0.2, random_state=42)
+    return Xtr, Xva, Xte, ytr, yva, yte
+
+
 def train_lgb(df_offer):
     X, y = prepare_Xy(df_offer)
-    Xtr, Xva, ytr, yva = train_test_split(X, y, test_size=0.2, random_state=42)
+    Xtr, Xva, Xte, ytr, yva, yte = split_train_val_test(X, y)
     cat = [f for f in CAT_FEATURES if f in Xtr.columns]
     dtr = lgb.Dataset(Xtr, label=ytr, categorical_feature=cat)
     dva = lgb.Dataset(Xva, label=yva, reference=dtr, categorical_feature=cat)
@@ -249,11 +271,146 @@ def train_lgb(df_offer):
         callbacks=[lgb.early_stopping(stopping_rounds=200, verbose=False),
                    lgb.log_evaluation(1000)],
     )
-    yp = model.predict(Xva)
-    metrics = {"rmse": rmse(yva, yp), "mape": mape(np.expm1(yva), np.expm1(yp)),
-               "r2": float(r2_score(yva, yp)), "n": int(len(X)),
+    yp = model.predict(Xte)
+    metrics = {"rmse": rmse(yte, yp), "mape": mape(np.expm1(yte), np.expm1(yp)),
+               "r2": float(r2_score(yte, yp)), "n": int(len(X)),
                "best_iteration": int(model.best_iteration or model.num_trees())}
-    return model, metrics, list(X.columns)
+    holdout = Xte.sample(min(HOLDOUT_ROWS, len(Xte)), random_state=42)
+    return model, metrics, list(X.columns), holdout
+
+
+# --------------------------------------------------------------------------- #
+# Modelo compacto — menos árboles para servir (latencia y tamaño de carga).
+#
+# Candidatos, elegidos con el split de validación del completo (el mismo de su
+# early stopping) y aceptados/reportados sobre el de test, que nadie vio:
+#   * truncated: los primeros N árboles del completo (poda por iteración), el N
+#     más chico cuyo RMSE de validación no empeora más de COMPACT_MAX_RMSE_LOSS_PCT
+#   * fast_lr:   reentrenado con learning_rate y num_leaves compactos
+#   * distilled: mismo setup pero aprendiendo las predicciones del completo
+#     (destilación; suaviza el ruido del target y converge con menos árboles)
+# El recomendado es el de menos árboles dentro de la tolerancia en test. El reporte
+# (compact_report.json) trae RMSE/R²/MAPE, latencia de una fila y tamaño de
+# cada uno para decidir a conciencia. COMPACT_MODEL=serve lo escribe como
+# model_*_lightgbm.txt (el completo queda en model_*_lightgbm_full.txt).
+# --------------------------------------------------------------------------- #
+COMPACT_MODEL = os.environ.get("COMPACT_MODEL", "report").lower()   # off | report | serve
+COMPACT_MAX_RMSE_LOSS_PCT = float(os.environ.get("COMPACT_MAX_RMSE_LOSS_PCT", "1.0"))
+COMPACT_PARAMS = {
+    **LGB_PARAMS,
+    "learning_rate": float(os.environ.get("COMPACT_LEARNING_RATE", "0.1")),
+    "num_leaves": int(os.environ.get("COMPACT_NUM_LEAVES", "31")),
+}
+COMPACT_MAX_TREES = int(os.environ.get("COMPACT_MAX_TREES", "1000"))
+LATENCY_ROWS = int(os.environ.get("COMPACT_LATENCY_ROWS", "300"))
+
+
+def encoded_matrix(X):
+    """Matriz float64 como la arma el FeatureEncoder del backend (códigos de categoría, NaN = desconocida)"""
+    columns = []
+    for c in X.columns:
+        if isinstance(X[c].dtype, pd.CategoricalDtype):
+            codes = X[c].cat.codes.to_numpy().astype(np.float64)
+            columns.append(np.where(codes < 0, np.nan, codes))
+        else:
+            columns.append(X[c].to_numpy(dtype=np.float64))
+    return np.column_stack(columns)
+
+
+def single_row_latency_ms(model, X_enc, num_iteration=None):
+    """p50/p99 de predict de una fila (lo que paga cada avalúo individual)"""
+    rows = X_enc[:LATENCY_ROWS]
+    model.predict(rows[:1], num_iteration=num_iteration)   # warm-up
+    latencies = []
+    for i in range(len(rows)):
+        start = time.perf_counter()
+        model.predict(rows[i:i + 1], num_iteration=num_iteration)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+
+def evaluate(model, Xte, yte, X_enc, num_iteration=None):
+    yp = model.predict(Xte, num_iteration=num_iteration)
+    trees = int(num_iteration or model.best_iteration or model.num_trees())
+    p50, p99 = single_row_latency_ms(model, X_enc, num_iteration)
+    return {
+        "rmse": rmse(yte, yp), "mape": mape(np.expm1(yte), np.expm1(yp)),
+        "r2": float(r2_score(yte, yp)), "trees": trees,
+        "num_leaves": int(model.params.get("num_leaves", LGB_PARAMS["num_leaves"])),
+        "latency_p50_ms": round(p50, 4), "latency_p99_ms": round(p99, 4),
+        "size_bytes": len(model.model_to_string(num_iteration=num_iteration).encode()),
+    }
+
+
+def _train_compact(Xtr, ytr, Xva, yva_target):
+    cat = [f for f in CAT_FEATURES if f in Xtr.columns]
+    dtr = lgb.Dataset(Xtr, label=ytr, categorical_feature=cat)
+    dva = lgb.Dataset(Xva, label=yva_target, reference=dtr, categorical_feature=cat)
+    return lgb.train(
+        COMPACT_PARAMS, dtr, valid_sets=[dva], num_boost_round=COMPACT_MAX_TREES,
+        callbacks=[lgb.early_stopping(stopping_rounds=100, verbose=False)],
+    )
+
+
+def compact_stage(df_offer, full_model):
+    """(modelo compacto recomendado o None, num_iteration para guardarlo, reporte)"""
+    X, y = prepare_Xy(df_offer)
+    # Mismo split que train_lgb (random_state fijo): val para elegir, test para aceptar y reportar
+    Xtr, Xva, Xte, ytr, yva, yte = split_train_val_test(X, y)
+    X_enc = encoded_matrix(Xte)
+    full_iter = int(full_model.best_iteration or full_model.num_trees())
+    full = evaluate(full_model, Xte, yte, X_enc, full_iter)
+    max_rmse = full["rmse"] * (1 + COMPACT_MAX_RMSE_LOSS_PCT / 100)
+
+    candidates = {}
+    # truncated: búsqueda binaria del N más chico dentro de la tolerancia en validación
+    # (el RMSE de validación baja casi monótono con N bajo early stopping)
+    full_val_rmse = rmse(yva, full_model.predict(Xva, num_iteration=full_iter))
+    max_val_rmse = full_val_rmse * (1 + COMPACT_MAX_RMSE_LOSS_PCT / 100)
+    lo, hi = 1, full_iter
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if rmse(yva, full_model.predict(Xva, num_iteration=mid)) <= max_val_rmse:
+            hi = mid
+        else:
+            lo = mid + 1
+    candidates["truncated"] = (full_model, lo)
+
+    fast = _train_compact(Xtr, ytr, Xva, yva)
+    candidates["fast_lr"] = (fast, int(fast.best_iteration or fast.num_trees()))
+
+    # Destilación: el alumno aprende las predicciones del completo (train y validación)
+    teacher_tr = full_model.predict(Xtr, num_iteration=full_iter)
+    teacher_va = full_model.predict(Xva, num_iteration=full_iter)
+    student = _train_compact(Xtr, teacher_tr, Xva, teacher_va)
+    candidates["distilled"] = (student, int(student.best_iteration or student.num_trees()))
+
+    report = {"full": full, "max_rmse_loss_pct": COMPACT_MAX_RMSE_LOSS_PCT, "eval_split": "test",
+              "n_train": int(len(Xtr)), "n_val": int(len(Xva)), "n_test": int(len(Xte)),
+              "compact_params": {k: COMPACT_PARAMS[k] for k in ("learning_rate", "num_leaves")},
+              "candidates": {}}
+    for name, (model, n) in candidates.items():
+        report["candidates"][name] = evaluate(model, Xte, yte, X_enc, n)
+
+    within = [name for name, m in report["candidates"].items() if m["rmse"] <= max_rmse]
+    if not within:
+        report["recommended"] = None
+        return None, None, report
+    best = min(within, key=lambda name: (report["candidates"][name]["trees"],
+                                          report["candidates"][name]["rmse"]))
+    report["recommended"] = best
+    model, n = candidates[best]
+    return model, n, report
+
+
+def print_compact_report(offer, report):
+    print(f"  — compacto ({offer}): tolerancia RMSE +{report['max_rmse_loss_pct']}%")
+    print(f"    {'modelo':<10}{'árboles':>8}{'RMSE':>9}{'R²':>8}{'MAPE%':>8}{'p50 ms':>9}{'p99 ms':>9}{'MB':>8}")
+    rows = [("full", report["full"])] + list(report["candidates"].items())
+    for name, m in rows:
+        mark = " ←" if name == report.get("recommended") else ""
+        print(f"    {name:<10}{m['trees']:>8}{m['rmse']:>9.4f}{m['r2']:>8.4f}{m['mape']:>8.2f}"
+              f"{m['latency_p50_ms']:>9.3f}{m['latency_p99_ms']:>9.3f}{m['size_bytes'] / 1e6:>8.2f}{mark}")
 
 
 def main():
@@ -283,28 +440,71 @@ def main():
     print(f"  tras filtros recomendados + features: {len(df):,}")
     print(f"  distribución offer: {df['offer'].value_counts().to_dict()}")
 
-    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    version = MODEL_VERSION
+    if version == "auto":
+        version = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    out_dir = OUT_DIR / "versions" / version if version else OUT_DIR
+    if version and out_dir.exists():
+        raise SystemExit(f"❌ La versión {version} ya existe en {out_dir}: las versiones no se sobreescriben")
+    out_dir.mkdir(parents=True, exist_ok=True)
     metadata = {}
+    compact_reports = {}
 
     for offer, out_name in [("rent", "model_rent_lightgbm.txt"),
                             ("sell", "model_sell_lightgbm.txt")]:
         df_offer = df[df["offer"] == offer].copy()
         print(f"\n=== {offer.upper()} (LightGBM) — n={len(df_offer):,} ===")
-        model, metrics, feat = train_lgb(df_offer)
-        path = OUT_DIR / out_name
-        model.save_model(str(path))
+        model, metrics, feat, holdout = train_lgb(df_offer)
+        path = out_dir / out_name
+        holdout.to_csv(out_dir / f"holdout_{offer}.csv", index=False)
         print(f"  RMSE={metrics['rmse']:.4f}  R²={metrics['r2']:.4f}  "
-              f"MAPE={metrics['mape']:.2f}%  best_iter={metrics['best_iteration']}  → {path.name}")
-        metadata[offer] = {"lightgbm": {
+              f"MAPE={metrics['mape']:.2f}%  best_iter={metrics['best_iteration']}")
+        entry = {
             "model_path": out_name, "features": feat,
             "cat_features": CAT_FEATURES, "target": "log1p(price_per_m2)",
             "metrics": metrics,
             "trained_at": datetime.now(timezone.utc).isoformat(),
-        }}
-
-    with open(OUT_DIR / "metadata.json", "w") as f:
+            "version": version or None,
+        }
+
+        compact, compact_iter = None, None
+        if COMPACT_MODEL in ("report", "serve"):
+            compact, compact_iter, report = compact_stage(df_offer, model)
+            print_compact_report(offer, report)
+            compact_reports[offer] = report
+            entry["compact_recommended"] = report["recommended"]
+
+        if COMPACT_MODEL == "serve" and compact is not None:
+            # Se sirve el compacto; el completo queda al lado para comparar o volver atrás
+            full_name = out_name.replace(".txt", "_full.txt")
+            model.save_model(str(out_dir / full_name))
+            compact.save_model(str(path), num_iteration=compact_iter)
+            chosen = report["candidates"][report["recommended"]]
+            entry.update({
+                "metrics": {**{k: chosen[k] for k in ("rmse", "mape", "r2")}, "n": metrics["n"],
+                            "best_iteration": chosen["trees"]},
+                "full_model_path": full_name, "full_metrics": metrics,
+                "compact": report["recommended"],
+            })
+            print(f"  → {path.name} (compacto {report['recommended']}, {chosen['trees']} árboles), "
+                  f"completo en {full_name}")
+        else:
+            if COMPACT_MODEL == "serve":
+                print("  ⚠️ Ningún compacto dentro de la tolerancia: se sirve el completo")
+            model.save_model(str(path))
+            print(f"  → {path.name}")
+        metadata[offer] = {"lightgbm": entry}
+
+    if compact_reports:
+        with open(out_dir / "compact_report.json", "w") as f:
+            json.dump(compact_reports, f, indent=2, ensure_ascii=False)
+
+    # metadata.json al final: el registro solo ve la versión cuando está completa
+    tmp = out_dir / "metadata.json.tmp"
+    with open(tmp, "w") as f:
         json.dump(metadata, f, indent=2, ensure_ascii=False)
-    print(f"\n✅ Modelos + metadata.json escritos en {OUT_DIR}")
+    os.replace(tmp, out_dir / "metadata.json")
+    print(f"\n✅ Modelos + metadata.json escritos en {out_dir}")
 
 
 if __name__ == "__main__":
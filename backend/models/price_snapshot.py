@@ -0,0 +1,26 @@
+"""
+Price Snapshot model - Serie diaria de medianas de precio/m² por zona y ciudad
+"""
+from datetime import date
+from typing import Optional
+from sqlmodel import SQLModel, Field
+from sqlalchemy import UniqueConstraint, Index
+
+class PriceSnapshot(SQLModel, table=True):
+    """Foto diaria del mercado: una fila por (día, ciudad, zona); location_main='' es el total de la ciudad"""
+    
+    __tablename__ = "zone_price_snapshot"
+    __table_args__ = (
+        UniqueConstraint("snapshot_date", "city_id", "location_main"),
+        Index("ix_zone_price_snapshot_zone_date", "city_id", "location_main", "snapshot_date"),
+    )
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    snapshot_date: date = Field(index=True, description="Día de la foto")
+    city_id: int = Field(foreign_key="city.id", description="Ciudad")
+    location_main: str = Field(default="", max_length=255, description="Zona ('' = ciudad completa)")
+    
+    sell_median_m2: Optional[float] = Field(default=None, description="Mediana de precio/m² en venta")
+    rent_median_m2: Optional[float] = Field(default=None, description="Mediana de precio/m² en renta")
+    sell_count: int = Field(default=0, description="Propiedades en venta activas")
+    rent_count: int = Field(default=0, description="Propiedades en renta activas")
@@ -38,3 +38,6 @@ class Property(SQLModel, table=True):
     antiquity: Optional[int] = Field(default=None, description="Property age in years")
     is_new: Optional[bool] = Field(default=None, description="Whether property is new")
     
+    # Hash del contenido scrapeado (migrations/add_property_content_hash.sql): la ingesta
+    # masiva solo reescribe la fila si cambió
+    content_hash: Optional[str] = Field(default=None, max_length=32, description="md5 of the scraped content columns")
@@ -0,0 +1,15 @@
+"""
+Rollup Watermark model - Hasta dónde procesó cada job incremental
+"""
+from datetime import datetime
+from typing import Optional
+from sqlmodel import SQLModel, Field
+
+class RollupWatermark(SQLModel, table=True):
+    """Marca de agua por job: el siguiente run procesa solo lo posterior a `value`"""
+    
+    __tablename__ = "rollup_watermark"
+    
+    name: str = Field(primary_key=True, max_length=100, description="Nombre del job incremental")
+    value: Optional[str] = Field(default=None, max_length=100, description="Último valor procesado (id, fecha ISO, ...)")
+    updated_at: datetime = Field(default_factory=datetime.utcnow, description="Último avance de la marca")
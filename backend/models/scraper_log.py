@@ -27,8 +27,9 @@ class ScraperLog(SQLModel, table=True):
     __tablename__ = "scraper_logs"
     """Scraper logs table for tracking all scraper activity"""
     
-    id: Optional[int] = Field(default=None, primary_key=True)
-    timestamp: datetime = Field(default_factory=lambda: datetime.now(), description="When the log entry was created")
+    # PK compuesta: la tabla está particionada por mes sobre timestamp (migrations/partition_scraper_logs.sql)
+    id: Optional[int] = Field(default=None, primary_key=True, sa_column_kwargs={"autoincrement": True})
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(), primary_key=True, description="When the log entry was created")
     
     # Scraper identification
     scraper_name: str = Field(max_length=50, description="Name of the scraper")
@@ -0,0 +1,24 @@
+"""
+Zone Polygon model - Geometría precalculada (concave hull) de cada zona
+"""
+from datetime import datetime
+from typing import Optional, Dict, Any
+from sqlmodel import SQLModel, Field, JSON, Column
+from sqlalchemy import LargeBinary, UniqueConstraint
+
+class ZonePolygon(SQLModel, table=True):
+    """Polígono por (ciudad, location_main) calculado offline desde las coordenadas de property"""
+    
+    __tablename__ = "zone_polygon"
+    __table_args__ = (UniqueConstraint("city_id", "location_main"),)
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    city_id: int = Field(foreign_key="city.id", index=True, description="Ciudad de la zona")
+    location_main: str = Field(max_length=255, description="Nombre de la zona (property.location_main)")
+    
+    # Geometría simplificada para el mapa, en ambos formatos
+    geojson: Dict[str, Any] = Field(default={}, sa_column=Column(JSON), description="Geometría GeoJSON (WGS84)")
+    wkb: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary), description="Geometría en WKB")
+    
+    property_count: int = Field(default=0, description="Propiedades usadas para construir el polígono")
+    updated_at: datetime = Field(default_factory=datetime.utcnow, description="Última reconstrucción")
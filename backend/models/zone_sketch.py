@@ -0,0 +1,26 @@
+"""
+Zone Sketch model - Sketches de cuantiles (KLL) por zona y tipo de oferta
+"""
+from datetime import datetime
+from typing import Optional, Dict, Any
+from sqlmodel import SQLModel, Field, JSON, Column
+from sqlalchemy import UniqueConstraint
+
+class ZoneSketch(SQLModel, table=True):
+    """Distribución aproximada de precio, área y precio/m² de una (ciudad, zona, oferta)"""
+    
+    __tablename__ = "zone_sketch"
+    __table_args__ = (UniqueConstraint("city_id", "location_main", "offer"),)
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    city_id: int = Field(foreign_key="city.id", index=True, description="Ciudad de la zona")
+    location_main: str = Field(max_length=255, index=True, description="Nombre de la zona (property.location_main)")
+    offer: str = Field(max_length=10, description="'sell' o 'rent'")
+    
+    # KLLSketch.to_dict() de cada métrica
+    price: Dict[str, Any] = Field(default={}, sa_column=Column(JSON), description="Sketch de precio")
+    area: Dict[str, Any] = Field(default={}, sa_column=Column(JSON), description="Sketch de área")
+    price_m2: Dict[str, Any] = Field(default={}, sa_column=Column(JSON), description="Sketch de precio/m²")
+    
+    n: int = Field(default=0, description="Valores observados")
+    updated_at: datetime = Field(default_factory=datetime.utcnow, description="Última actualización")
@@ -2,148 +2,183 @@
 Router de Dashboard - Endpoints del panel principal
 """
 from fastapi import APIRouter
-from sqlmodel import Session, select, func
+from sqlmodel import Session, select
 from config.db_connection import engine
 from models.city import City
-from models.property import Property
 from services.stats_service import (
     get_local_now, get_city_status, get_recent_logs, get_next_executions,
-    get_property_stats, get_avg_speed, get_last_execution_time,
-    get_recent_errors_count, get_system_alerts
+    get_property_stats_by_city, get_summary_counts, get_log_metrics, get_system_alerts
 )
-from datetime import timedelta
+from services.dashboard_snapshot import register_snapshot
+from services.scraper_throughput import get_throughput
+from services.scraper_eta import estimate_schedule
+import asyncio
 
 router = APIRouter(prefix="/api", tags=["dashboard"])
 
 
-@router.get("/dashboard")
-async def get_dashboard():
-    """Dashboard con datos REALES de BD"""
-    try:
-        with Session(engine) as session:
-            cities = session.exec(select(City).order_by(City.name)).all()
+def _build_dashboard():
+    """Payload completo del dashboard (lanza excepción si falla)"""
+    with Session(engine) as session:
+        # Conteos por ciudad en una sola consulta; los globales son la suma
+        # (número fijo de queries sin importar cuántas ciudades haya)
+        stats_by_city = get_property_stats_by_city(session)
+        # Las ciudades se cargan después: el fallback de los conteos hace rollback,
+        # lo que expiraría cada City ya cargada y costaría un SELECT por ciudad
+        cities = session.exec(select(City).order_by(City.name)).all()
+        total_properties_global = sum(s["total"] for s in stats_by_city.values())
+        today_properties_global = sum(s["today"] for s in stats_by_city.values())
+        properties_updated_today = sum(s["updated_today"] for s in stats_by_city.values())
+        log_metrics = get_log_metrics(session)
+        
+        city_data = []
+        for city in cities:
+            # Calcular páginas procesadas
+            sell_pages_processed = city.current_sell_offset // 25 if city.current_sell_offset > 0 else 0
+            rent_pages_processed = city.current_rent_offset // 25 if city.current_rent_offset > 0 else 0
             
-            # Estadísticas globales
-            total_properties_global, today_properties_global = get_property_stats(session)
-            avg_speed = get_avg_speed(session)
+            sell_pages_processed = min(sell_pages_processed, city.sell_pages_limit)
+            rent_pages_processed = min(rent_pages_processed, city.rent_pages_limit)
             
-            # Propiedades actualizadas hoy
-            today = get_local_now().date()
-            updated_today_query = select(func.count(Property.fr_property_id)).where(Property.last_update == today)
-            properties_updated_today = session.exec(updated_today_query).first() or 0
+            sell_progress = min((sell_pages_processed / city.sell_pages_limit * 100), 100.0) if city.sell_pages_limit > 0 else 0
+            rent_progress = min((rent_pages_processed / city.rent_pages_limit * 100), 100.0) if city.rent_pages_limit > 0 else 0
             
-            city_data = []
-            for city in cities:
-                # Calcular páginas procesadas
-                sell_pages_processed = city.current_sell_offset // 25 if city.current_sell_offset > 0 else 0
-                rent_pages_processed = city.current_rent_offset // 25 if city.current_rent_offset > 0 else 0
-                
-                sell_pages_processed = min(sell_pages_processed, city.sell_pages_limit)
-                rent_pages_processed = min(rent_pages_processed, city.rent_pages_limit)
-                
-                sell_progress = min((sell_pages_processed / city.sell_pages_limit * 100), 100.0) if city.sell_pages_limit > 0 else 0
-                rent_progress = min((rent_pages_processed / city.rent_pages_limit * 100), 100.0) if city.rent_pages_limit > 0 else 0
-                
-                total_properties_city, today_properties_city = get_property_stats(session, city.id)
-                
-                hours_inactive = 0.0
-                if city.last_updated:
-                    delta = get_local_now().date() - city.last_updated
-                    hours_inactive = round(delta.total_seconds() / 3600, 1)
-                
-                city_data.append({
-                    "id": city.id,
-                    "name": city.name,
-                    "website_name": city.website_name,
-                    "sell_progress": round(sell_progress, 1),
-                    "rent_progress": round(rent_progress, 1),
-                    "sell_pages": f"{sell_pages_processed}/{city.sell_pages_limit}",
-                    "rent_pages": f"{rent_pages_processed}/{city.rent_pages_limit}",
-                    "status": get_city_status(city),
-                    "last_update": city.last_updated.isoformat() if city.last_updated else get_local_now().isoformat(),
-                    "hours_inactive": hours_inactive,
-                    "properties_today": today_properties_city,
-                    "properties_total": total_properties_city
-                })
+            city_stats = stats_by_city.get(city.id, {})
+            total_properties_city = city_stats.get("total", 0)
+            today_properties_city = city_stats.get("today", 0)
             
-            return {
-                "status": "success",
-                "timestamp": get_local_now().isoformat(),
-                "data": {
-                    "summary": {
-                        "total_cities": len(cities),
-                        "active_cities": len([c for c in cities if not c.updated]),
-                        "completed_cities": len([c for c in cities if c.updated]),
-                        "properties_today": today_properties_global,
-                        "properties_updated_today": (properties_updated_today - today_properties_global),
-                        "properties_total": total_properties_global,
-                        "avg_speed_ms": avg_speed,
-                        "last_execution_time": get_last_execution_time(session),
-                        "recent_errors_count": get_recent_errors_count(session)
-                    },
-                    "cities": city_data,
-                    "next_executions": get_next_executions(session),
-                    "alerts": get_system_alerts(session),
-                    "recent_logs": get_recent_logs(session)
-                }
+            hours_inactive = 0.0
+            if city.last_updated:
+                delta = get_local_now().date() - city.last_updated
+                hours_inactive = round(delta.total_seconds() / 3600, 1)
+            
+            city_data.append({
+                "id": city.id,
+                "name": city.name,
+                "website_name": city.website_name,
+                "sell_progress": round(sell_progress, 1),
+                "rent_progress": round(rent_progress, 1),
+                "sell_pages": f"{sell_pages_processed}/{city.sell_pages_limit}",
+                "rent_pages": f"{rent_pages_processed}/{city.rent_pages_limit}",
+                "status": get_city_status(city),
+                "last_update": city.last_updated.isoformat() if city.last_updated else get_local_now().isoformat(),
+                "hours_inactive": hours_inactive,
+                "properties_today": today_properties_city,
+                "properties_total": total_properties_city
+            })
+        
+        return {
+            "status": "success",
+            "timestamp": get_local_now().isoformat(),
+            "data": {
+                "summary": {
+                    "total_cities": len(cities),
+                    "active_cities": len([c for c in cities if not c.updated]),
+                    "completed_cities": len([c for c in cities if c.updated]),
+                    "properties_today": today_properties_global,
+                    "properties_updated_today": (properties_updated_today - today_properties_global),
+                    "properties_total": total_properties_global,
+                    **log_metrics
+                },
+                "cities": city_data,
+                "next_executions": get_next_executions(session),
+                "alerts": get_system_alerts(session),
+                "recent_logs": get_recent_logs(session)
             }
-    except Exception as e:
-        return {"status": "error", "detail": f"Error: {str(e)}"}
+        }
+
+
+_dashboard_snapshot = register_snapshot("dashboard", _build_dashboard)
+
+
+@router.get("/dashboard")
+async def get_dashboard():
+    """Dashboard con datos REALES de BD (snapshot refrescado en segundo plano)"""
+    return await _dashboard_snapshot.get()
+
+
+def _summary_counts():
+    with Session(engine) as session:
+        return get_summary_counts(session)
+
+
+def _summary_log_metrics():
+    with Session(engine) as session:
+        return get_log_metrics(session)
+
+
+async def _build_summary():
+    """Resumen con cambios porcentuales: conteos y métricas de logs en paralelo (lanza excepción si falla)"""
+    counts, log_metrics = await asyncio.gather(
+        asyncio.to_thread(_summary_counts),
+        asyncio.to_thread(_summary_log_metrics)
+    )
+    
+    today_count = counts["today"]
+    yesterday_count = counts["yesterday"]
+    properties_change = 0
+    if yesterday_count > 0:
+        properties_change = round(((today_count - yesterday_count) / yesterday_count) * 100, 1)
+    
+    total_properties = counts["total"]
+    week_ago_total = counts["week_ago_total"]
+    total_change = 0
+    if week_ago_total > 0:
+        total_change = round(((total_properties - week_ago_total) / week_ago_total) * 100, 1)
+    
+    return {
+        "status": "success",
+        "data": {
+            "total_cities": counts["total_cities"],
+            "active_cities": counts["active_cities"],
+            "completed_cities": counts["total_cities"] - counts["active_cities"],
+            "properties_today": today_count,
+            "properties_total": total_properties,
+            **log_metrics,
+            "changes": {
+                "properties_today_change": properties_change,
+                "cities_change": 0,
+                "total_change": total_change
+            }
+        }
+    }
+
+
+_summary_snapshot = register_snapshot("summary", _build_summary)
 
 
 @router.get("/summary")
 async def get_summary_with_changes():
     """Obtener resumen con cambios porcentuales"""
+    return await _summary_snapshot.get()
+
+
+def _load_throughput(hours: int, city_code: str, offer_type: str):
+    with Session(engine) as session:
+        return get_throughput(session, hours=hours, city_code=city_code, offer_type=offer_type)
+
+
+@router.get("/scraper/throughput")
+async def get_scraper_throughput(hours: int = 24, city_code: str = None, offer_type: str = None):
+    """Páginas, propiedades, errores y p50/p95 de execution_time_ms por hora, ciudad y oferta"""
     try:
-        with Session(engine) as session:
-            today = get_local_now().date()
-            yesterday = today - timedelta(days=1)
-            
-            today_properties_query = select(func.count(Property.fr_property_id)).where(Property.creation_date == today)
-            yesterday_properties_query = select(func.count(Property.fr_property_id)).where(Property.creation_date == yesterday)
-            
-            today_count = session.exec(today_properties_query).first() or 0
-            yesterday_count = session.exec(yesterday_properties_query).first() or 0
-            
-            properties_change = 0
-            if yesterday_count > 0:
-                properties_change = round(((today_count - yesterday_count) / yesterday_count) * 100, 1)
-            
-            cities_query = select(City)
-            cities = session.exec(cities_query).all()
-            
-            total_cities = len(cities)
-            active_cities = len([c for c in cities if not c.updated])
-            
-            week_ago = today - timedelta(days=7)
-            total_properties_query = select(func.count(Property.fr_property_id))
-            week_ago_query = select(func.count(Property.fr_property_id)).where(Property.creation_date <= week_ago)
-            
-            total_properties = session.exec(total_properties_query).first() or 0
-            week_ago_total = session.exec(week_ago_query).first() or 0
-            
-            total_change = 0
-            if week_ago_total > 0:
-                total_change = round(((total_properties - week_ago_total) / week_ago_total) * 100, 1)
-            
-            return {
-                "status": "success",
-                "data": {
-                    "total_cities": total_cities,
-                    "active_cities": active_cities,
-                    "completed_cities": total_cities - active_cities,
-                    "properties_today": today_count,
-                    "properties_total": total_properties,
-                    "avg_speed_ms": get_avg_speed(session),
-                    "last_execution_time": get_last_execution_time(session),
-                    "recent_errors_count": get_recent_errors_count(session),
-                    "changes": {
-                        "properties_today_change": properties_change,
-                        "cities_change": 0,
-                        "total_change": total_change
-                    }
-                }
-            }
+        hours = max(1, min(hours, 24 * 90))
+        data = await asyncio.to_thread(_load_throughput, hours, city_code, offer_type)
+        return {"status": "success", "data": data}
+    except Exception as e:
+        return {"status": "error", "detail": str(e)}
+
+
+def _load_eta():
+    with Session(engine) as session:
+        return estimate_schedule(session)
+
+
+@router.get("/scraper/eta")
+async def get_scraper_eta():
+    """Arranque/fin estimado de cada ciudad pendiente, fin del ciclo y ms por página aprendidos"""
+    try:
+        return {"status": "success", "data": await asyncio.to_thread(_load_eta)}
     except Exception as e:
         return {"status": "error", "detail": str(e)}
 
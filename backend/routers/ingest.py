@@ -0,0 +1,191 @@
+"""
+Router de Ingesta - Escritura masiva desde los scrapers
+"""
+import os
+import json
+import hmac
+import asyncio
+from datetime import date, datetime
+from typing import Optional
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, ValidationError
+from config.db_connection import engine
+from models.scraper_log import LogLevel, LogType
+from services.log_ingest import log_buffer, as_row
+from services.property_ingest import upsert_properties, property_ingest_stats
+from services.stats_service import get_local_now
+
+router = APIRouter(prefix="/api", tags=["ingest"])
+
+# Los scrapers no tienen sesión de usuario: se autentican con una API key propia
+INGEST_API_KEY = os.getenv("INGEST_API_KEY", "")
+MAX_BATCH = int(os.getenv("INGEST_MAX_BATCH", "10000"))
+MAX_REJECTED_DETAILS = 20
+
+
+class ScraperLogIn(BaseModel):
+    timestamp: Optional[datetime] = None
+    scraper_name: str = Field(max_length=50)
+    city_code: Optional[str] = Field(default=None, max_length=50)
+    offer_type: Optional[str] = Field(default=None, max_length=10)
+    page_number: Optional[int] = None
+    log_level: LogLevel
+    log_type: LogType
+    message: str
+    execution_time_ms: Optional[float] = None
+    properties_found: Optional[int] = None
+    properties_validated: Optional[int] = None
+    error_type: Optional[str] = Field(default=None, max_length=100)
+    session_id: Optional[str] = Field(default=None, max_length=100)
+    scheduled_time: Optional[datetime] = None
+
+
+class PropertyIn(BaseModel):
+    fr_property_id: int
+    offer: str = Field(pattern="^(sell|rent)$")
+    area: Optional[float] = None
+    rooms: Optional[int] = None
+    price: Optional[float] = None
+    city_id: Optional[int] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    title: Optional[str] = None
+    location_main: Optional[str] = None
+    stratum: Optional[int] = None
+    baths: Optional[int] = None
+    garages: Optional[int] = None
+    antiquity: Optional[int] = None
+    is_new: Optional[bool] = None
+    creation_date: Optional[date] = None
+    last_update: Optional[date] = None
+
+    def as_row(self) -> tuple:
+        return (
+            self.fr_property_id, self.area, self.rooms, self.price, self.offer, self.city_id,
+            self.latitude, self.longitude, self.title, self.location_main, self.stratum,
+            self.baths, self.garages, self.antiquity, self.is_new, self.creation_date, self.last_update,
+        )
+
+
+def check_ingest_key(request: Request) -> Optional[JSONResponse]:
+    """None si la key es válida; si no, la respuesta de error"""
+    if not INGEST_API_KEY:
+        return JSONResponse({"status": "error", "detail": "Ingesta deshabilitada (INGEST_API_KEY no configurada)"}, status_code=503)
+    key = request.headers.get("x-ingest-key", "")
+    if not hmac.compare_digest(key.encode(), INGEST_API_KEY.encode()):
+        return JSONResponse({"status": "error", "detail": "API key de ingesta inválida"}, status_code=401)
+    return None
+
+
+async def parse_records(request: Request) -> list:
+    """Cuerpo JSON (lista u objeto con "logs"/"records") o NDJSON (un objeto por línea)"""
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+    payload = json.loads(body or b"[]")
+    if isinstance(payload, dict):
+        payload = payload.get("logs", payload.get("records", [payload]))
+    return payload if isinstance(payload, list) else [payload]
+
+
+@router.post("/ingest/scraper-logs")
+async def ingest_scraper_logs(request: Request):
+    """Valida un lote de logs y lo encola para COPY a scraper_logs"""
+    error = check_ingest_key(request)
+    if error:
+        return error
+
+    try:
+        records = await parse_records(request)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "detail": f"JSON inválido: {e}"}, status_code=400)
+    if len(records) > MAX_BATCH:
+        return JSONResponse({"status": "error", "detail": f"Máximo {MAX_BATCH} registros por lote"}, status_code=413)
+
+    rows, rejected = [], []
+    for index, record in enumerate(records):
+        try:
+            rows.append(as_row(ScraperLogIn.model_validate(record)))
+        except ValidationError as e:
+            rejected.append({"index": index, "error": e.errors(include_url=False)[0]["msg"]})
+
+    if rejected and not rows:
+        return JSONResponse(
+            {"status": "error", "detail": "Ningún registro válido", "rejected": len(rejected),
+             "rejected_details": rejected[:MAX_REJECTED_DETAILS]},
+            status_code=422
+        )
+
+    if rows and not log_buffer.enqueue(rows):
+        # Contrapresión: el scraper debe reintentar el lote completo más tarde
+        return JSONResponse(
+            {"status": "error", "detail": "Cola de ingesta llena, reintenta más tarde"},
+            status_code=503, headers={"Retry-After": "5"}
+        )
+
+    return {
+        "status": "success",
+        "accepted": len(rows),
+        "rejected": len(rejected),
+        "rejected_details": rejected[:MAX_REJECTED_DETAILS],
+        "queued": log_buffer.stats()["queued"]
+    }
+
+
+def _upsert_batch(rows: list) -> dict:
+    raw = engine.raw_connection()
+    try:
+        return upsert_properties(raw, rows, get_local_now().date())
+    finally:
+        raw.close()
+
+
+@router.post("/ingest/properties")
+async def ingest_properties(request: Request):
+    """Upsert de un lote de publicaciones: contenido solo si cambió, last_update una vez por día"""
+    error = check_ingest_key(request)
+    if error:
+        return error
+
+    try:
+        records = await parse_records(request)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "detail": f"JSON inválido: {e}"}, status_code=400)
+    if len(records) > MAX_BATCH:
+        return JSONResponse({"status": "error", "detail": f"Máximo {MAX_BATCH} registros por lote"}, status_code=413)
+
+    rows, rejected = [], []
+    for index, record in enumerate(records):
+        try:
+            rows.append(PropertyIn.model_validate(record).as_row())
+        except ValidationError as e:
+            rejected.append({"index": index, "error": e.errors(include_url=False)[0]["msg"]})
+
+    if not rows:
+        return {"status": "success", "received": 0, "rejected": len(rejected),
+                "rejected_details": rejected[:MAX_REJECTED_DETAILS]}
+    try:
+        result = await asyncio.to_thread(_upsert_batch, rows)
+    except Exception as e:
+        return JSONResponse({"status": "error", "detail": str(e)}, status_code=500)
+
+    return {
+        "status": "success",
+        **result,
+        "rejected": len(rejected),
+        "rejected_details": rejected[:MAX_REJECTED_DETAILS]
+    }
+
+
+@router.get("/ingest/stats")
+async def ingest_stats():
+    """Contadores de la ingesta: logs (cola + COPY) y propiedades (upsert)"""
+    return {
+        "status": "success",
+        "data": {
+            "scraper_logs": log_buffer.stats(),
+            "properties": property_ingest_stats()
+        }
+    }
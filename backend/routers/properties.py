@@ -12,9 +12,11 @@ from services.stats_service import get_local_now
 from services.property_filters import (
     build_rooms_filter, build_baths_filter, build_garages_filter,
     build_stratum_filter, build_antiquity_filter, build_property_type_filter,
-    build_price_type_filters, format_antiquity
+    build_price_type_filters, format_antiquity, property_types_to_mask, MAP_PROPERTY_TYPES
 )
+from services.cluster_index import get_city_index
 from services.geo_service import geocode_address, filter_properties_by_distance
+from services.reverse_geocoder import reverse_geocoder
 import re
 
 router = APIRouter(prefix="/api", tags=["properties"])
@@ -195,9 +197,22 @@ async def get_properties(
                     latitude, longitude = lat, lng
             
             distance_map = {}
+            search_location = None
             
             # Filtrar por distancia si hay coordenadas
             if latitude is not None and longitude is not None and radius is not None:
+                search_location = reverse_geocoder.lookup(latitude, longitude)
+                # Acotar a las ciudades cuyo bbox (con holgura) toca el radio; se conservan las
+                # propiedades sin ciudad y las de ciudades que el índice aún no conoce
+                if not city_ids:
+                    nearby_cities = reverse_geocoder.cities_within(latitude, longitude, radius)
+                    known_cities = reverse_geocoder.known_cities()
+                    if nearby_cities is not None and known_cities is not None:
+                        filters.append(or_(
+                            Property.city_id.in_(nearby_cities),
+                            Property.city_id.notin_(known_cities),
+                            Property.city_id.is_(None)
+                        ))
                 if filters:
                     query = query.where(and_(*filters))
                 
@@ -233,6 +248,7 @@ async def get_properties(
                 "status": "success",
                 "data": {
                     "properties": properties,
+                    "search_location": search_location,
                     "pagination": {
                         "page": page,
                         "limit": limit,
@@ -257,11 +273,61 @@ async def get_properties_by_zone(
     west: Optional[float] = Query(None),
     property_type: Optional[str] = Query(None),
     updated_date_from: Optional[str] = Query(None),
-    updated_date_to: Optional[str] = Query(None)
+    updated_date_to: Optional[str] = Query(None),
+    cluster: bool = Query(False, description="Devolver clusters calculados en el servidor"),
+    zoom: Optional[int] = Query(None, description="Zoom del mapa (requerido con cluster=true)")
 ):
     """Obtener propiedades agrupadas por zona"""
     try:
         with Session(engine) as session:
+            if cluster:
+                if zoom is None:
+                    return {'status': 'error', 'message': 'zoom es requerido con cluster=true', 'data': None}
+                if not city_id:
+                    return {'status': 'error', 'message': 'city_id es requerido con cluster=true', 'data': None}
+                
+                from datetime import datetime
+                date_from = datetime.strptime(updated_date_from, '%Y-%m-%d').date() if updated_date_from else None
+                date_to = datetime.strptime(updated_date_to, '%Y-%m-%d').date() if updated_date_to else None
+                has_bounds = all([north, south, east, west])
+                
+                # Tipos que el índice no sabe clasificar se resuelven con el mismo ILIKE
+                # del listado, para que conteos de clusters y resultados coincidan
+                types = property_type.split(',') if property_type else []
+                type_mask, type_ids = 0, None
+                if any(t.strip().lower() not in MAP_PROPERTY_TYPES for t in types):
+                    type_filter = build_property_type_filter(Property, types)
+                    if type_filter is not None:
+                        type_ids = session.exec(
+                            select(Property.fr_property_id).where(Property.city_id == city_id, type_filter)
+                        ).all()
+                elif types:
+                    type_mask = property_types_to_mask(types)
+                
+                index = get_city_index(session, city_id)
+                features, summary, effective_zoom = index.clusters(
+                    zoom,
+                    north=north if has_bounds else None,
+                    south=south if has_bounds else None,
+                    east=east if has_bounds else None,
+                    west=west if has_bounds else None,
+                    type_mask=type_mask,
+                    date_from=date_from,
+                    date_to=date_to,
+                    ids=type_ids
+                )
+                
+                return {
+                    'status': 'success',
+                    'boundary_type': boundary_type,
+                    'data': {
+                        'clusters': features,
+                        'zoom': zoom,
+                        'effective_zoom': effective_zoom,
+                        'summary': summary
+                    }
+                }
+            
             filters = [
                 Property.latitude.isnot(None),
                 Property.longitude.isnot(None)
@@ -0,0 +1,53 @@
+"""
+Router de Streaming - Eventos del scraper en vivo por Server-Sent Events
+"""
+import json
+import asyncio
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse, JSONResponse
+from services.event_broadcaster import broadcaster
+
+router = APIRouter(prefix="/api", tags=["stream"])
+
+KEEPALIVE_SECONDS = 15
+
+
+@router.get("/stream/scraper-events")
+async def stream_scraper_events(request: Request):
+    """Logs nuevos de scraper_logs (event: log) y progreso de ciudades (event: city) en vivo"""
+    queue = broadcaster.subscribe()
+    if queue is None:
+        return JSONResponse(
+            {"status": "error", "detail": "Demasiados clientes conectados, usa polling"},
+            status_code=503
+        )
+
+    async def events():
+        try:
+            # Si se corta la conexión, EventSource reintenta a los 5s
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # Comentario SSE: mantiene viva la conexión a través de proxies
+                    yield ": keepalive\n\n"
+                    continue
+                event_id = f"id: {event['id']}\n" if event.get("type") == "log" and event.get("id") else ""
+                yield f"{event_id}event: {event.get('type', 'message')}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/stream/stats")
+async def stream_stats():
+    """Clientes conectados y eventos recibidos/descartados/omitidos por el broadcaster"""
+    return {"status": "success", "data": broadcaster.stats()}
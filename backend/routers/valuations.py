@@ -2,17 +2,27 @@
 Router de Avalúos - Endpoints de valuaciones de propiedades
 """
 import os
+import time
+import asyncio
 from fastapi import APIRouter
-from pydantic import BaseModel
-from typing import Optional
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ValidationError
+from typing import Optional, List, Dict, Any
 from sqlmodel import Session, select
 from config.db_connection import engine
 from models.valuation import Valuation
 from models.payment_plan_dashboard import PaymentPlanDashboard
 from services.stats_service import get_local_now
+from services.inference_executor import InferenceExecutor, InferenceQueueFull
+from services.valuation_cache import ValuationCache, file_fingerprint
+from services.model_registry import ModelRegistry
+from services.reverse_geocoder import reverse_geocoder
+from services.comps_index import find_comps, MAX_RADIUS_M as COMPS_MAX_RADIUS_M
 
 router = APIRouter(prefix="/api", tags=["valuations"])
 
+VALUATION_BATCH_MAX = int(os.getenv("VALUATION_BATCH_MAX", "5000"))
+
 
 class PropertyValuationRequest(BaseModel):
     area: float
@@ -31,6 +41,28 @@ class PropertyValuationRequest(BaseModel):
     property_type: int
 
 
+class ValuationBatchRequest(BaseModel):
+    # dicts sin validar: cada fila se valida por separado para reportar errores por fila
+    properties: List[Dict[str, Any]]
+
+
+class CompsRequest(BaseModel):
+    latitude: float
+    longitude: float
+    area: float
+    rooms: Optional[int] = None
+    baths: Optional[int] = None
+    stratum: Optional[int] = None
+    property_type: int = 0
+    offer: str = "sell"
+    k: int = 10
+    max_radius_m: Optional[float] = None
+    # Pesos por componente (location, area, rooms, baths, stratum, property_type)
+    weights: Optional[Dict[str, float]] = None
+    # fr_property_id a excluir (p. ej. la propia publicación que se está avaluando)
+    exclude_id: Optional[int] = None
+
+
 class SaveValuationRequest(BaseModel):
     valuation_name: str
     area: float
@@ -88,7 +120,7 @@ def _load_centroids():
     return _CENTROIDS
 
 
-def _city_id_from_latlon(lat, lon):
+def _nearest_centroid_city(lat, lon):
     """city_id de la ciudad cuyo centroide está más cerca (o None si no aplica)."""
     try:
         lat, lon = float(lat), float(lon)
@@ -105,11 +137,74 @@ def _city_id_from_latlon(lat, lon):
     return best
 
 
-def _normalize_categoricals(pd_data):
+_CENTROID_ARRAYS = None
+
+
+def _nearest_centroid_cities(lats, lons):
+    """Versión vectorizada de _nearest_centroid_city para lotes (None donde no aplica)."""
+    import numpy as np
+
+    global _CENTROID_ARRAYS
+    if _CENTROID_ARRAYS is None:
+        centroids = _load_centroids()
+        _CENTROID_ARRAYS = (
+            [cid for cid, _, _ in centroids],
+            np.array([clat for _, clat, _ in centroids], dtype=np.float64),
+            np.array([clon for _, _, clon in centroids], dtype=np.float64),
+        )
+    ids, clats, clons = _CENTROID_ARRAYS
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if not ids:
+        return [None] * len(lats)
+    d = (lats[:, None] - clats[None, :]) ** 2 + (lons[:, None] - clons[None, :]) ** 2
+    # argmin devuelve el primer mínimo, igual que el loop de _nearest_centroid_city
+    nearest = np.argmin(d, axis=1)
+    inside = (lats >= -5) & (lats <= 15) & (lons >= -82) & (lons <= -66)
+    return [ids[i] if ok else None for i, ok in zip(nearest, inside)]
+
+
+# Ciudad y zona: geocodificador inverso (vecinos scrapeados + polígonos de zona);
+# el centroide más cercano queda de respaldo mientras el índice se construye.
+def _centroid_city_id(key):
+    """Las claves de city_centroids.json son texto; el geocodificador devuelve int"""
+    return int(key) if key is not None else None
+
+
+def _locate(lat, lon) -> dict:
+    found = reverse_geocoder.lookup(lat, lon)
+    if found is not None:
+        return found
+    return {"city_id": _centroid_city_id(_nearest_centroid_city(lat, lon)), "zone": None, "source": "centroid"}
+
+
+def _locate_many(lats, lons) -> list:
+    found = reverse_geocoder.lookup_many(lats, lons)
+    missing = [i for i, f in enumerate(found) if f is None]
+    if missing:
+        fallback = _nearest_centroid_cities([lats[i] for i in missing], [lons[i] for i in missing])
+        for i, city_id in zip(missing, fallback):
+            found[i] = {"city_id": _centroid_city_id(city_id), "zone": None, "source": "centroid"}
+    return found
+
+
+def _city_id_from_latlon(lat, lon):
+    """city_id del punto (geocodificador inverso o centroide), o None si no aplica."""
+    return _locate(lat, lon)["city_id"]
+
+
+_DERIVE = object()
+
+
+def _normalize_categoricals(pd_data, derived_city_id=_DERIVE):
     """Traduce los categóricos del formulario a como fueron entrenados (in place)."""
     # city_id: preferimos derivarlo de lat/lon (el formulario siempre manda "1");
     # el modelo entrenó con city_id como float-string ("1" -> "1.0").
-    derived = _city_id_from_latlon(pd_data.get("latitude"), pd_data.get("longitude"))
+    # En lotes la ciudad ya viene derivada (vectorizada) en derived_city_id.
+    if derived_city_id is _DERIVE:
+        derived = _city_id_from_latlon(pd_data.get("latitude"), pd_data.get("longitude"))
+    else:
+        derived = derived_city_id
     cid = derived if derived is not None else pd_data.get("city_id")
     if cid is not None and str(cid).strip() != "":
         try:
@@ -126,22 +221,27 @@ def _normalize_categoricals(pd_data):
     pd_data["is_new"] = "true" if str(pd_data.get("is_new", "")).strip().lower() in _IS_NEW_TRUE else "false"
     return pd_data
 
-# Cache de modelos a nivel de módulo: los archivos (~10-12 MB) se cargan y
-# parsean una sola vez, no en cada request.
-_MODELS = {}
-
+# Modelos servidos: registro versionado (ver services/model_registry.py). Cada
+# versión se carga y parsea una sola vez (~10-12 MB por archivo), no en cada request.
+_MODELS_DIR = os.path.join(os.path.dirname(__file__), '..', 'ml_models')
+_MODEL_FILES = (('rent', 'model_rent_lightgbm.txt'), ('sell', 'model_sell_lightgbm.txt'))
+# Métricas de carga de la versión que se sirve y de su calentamiento (ver warm_up_models y
+# /api/valuation/models/status). Cada carga arma las suyas en models["_load_stats"] y se
+# publican recién cuando el registro pone esa versión en servicio (_publish_load_stats).
+_LOAD_STATS = {"pid": None, "source": None, "loaded_at": None, "load_ms": None, "offers": {},
+               "warmed_up": False, "warmup_ms": None, "warmup_error": None}
 
-def _load_models():
-    """Carga (y cachea) los modelos LightGBM de renta y venta + orden de features."""
-    if _MODELS:
-        return _MODELS
 
+def _read_models(directory=_MODELS_DIR):
+    """Lee de `directory` los Boosters, su orden de features y su encoder."""
     import lightgbm as lgb
+    from services.feature_encoder import FeatureEncoder
+    from services.inference_backends import NativeBackend, select_backend
     import os
     import json
 
-    base_path = os.path.join(os.path.dirname(__file__), '..', 'ml_models')
-    metadata_path = os.path.join(base_path, 'metadata.json')
+    load_start = time.perf_counter()
+    metadata_path = os.path.join(directory, 'metadata.json')
 
     default_order = ['area', 'rooms', 'baths', 'garages', 'stratum', 'latitude',
                      'longitude', 'antiquity', 'is_new', 'area_per_room',
@@ -151,21 +251,71 @@ def _load_models():
         with open(metadata_path, 'r') as f:
             metadata = json.load(f)
 
-    for offer, filename in (('rent', 'model_rent_lightgbm.txt'),
-                            ('sell', 'model_sell_lightgbm.txt')):
-        model_path = os.path.join(base_path, filename)
+    models, offers = {}, {}
+    for offer, filename in _MODEL_FILES:
+        model_path = os.path.join(directory, filename)
         features = metadata.get(offer, {}).get('lightgbm', {}).get('features') or default_order
         model = None
+        encoder = None
+        backend = None
         if os.path.exists(model_path):
+            start = time.perf_counter()
             with open(model_path, 'r') as f:
                 model = lgb.Booster(model_str=f.read())
-        _MODELS[offer] = {'model': model, 'features': features}
+            offers[offer] = {
+                "file_mb": round(os.path.getsize(model_path) / 1024 / 1024, 2),
+                "num_trees": model.num_trees(),
+                "load_ms": round((time.perf_counter() - start) * 1000, 1)
+            }
+            try:
+                encoder = FeatureEncoder.from_booster(model, features, CATEGORICAL_FEATURES)
+            except ValueError as e:
+                # Sin categorías de entrenamiento no hay códigos fijos: se usa el camino con pandas
+                print(f"⚠️ Encoder de {offer} no disponible, se usa pandas: {e}")
+            try:
+                backend, offers[offer]["backend"] = select_backend(model, model_path, encoder, offer, directory)
+            except Exception as e:
+                backend = NativeBackend(model)
+                offers[offer]["backend"] = {"backend": "native", "fallback_reason": str(e)}
+                print(f"⚠️ No se pudo elegir backend de {offer}, se usa el Booster: {e}")
+        models[offer] = {'model': model, 'features': features, 'encoder': encoder, 'backend': backend}
+
+    source = os.path.relpath(directory, _MODELS_DIR)
+    load_stats = {
+        "pid": os.getpid(),
+        "source": "ml_models/" if source == "." else f"ml_models/{source}",
+        "loaded_at": get_local_now().isoformat(),
+        "load_ms": round((time.perf_counter() - load_start) * 1000, 1),
+        "offers": offers
+    }
+    models["_load_stats"] = load_stats
+    print(f"🧠 Modelos de avalúo cargados desde {load_stats['source']} en {load_stats['load_ms']} ms (pid {os.getpid()})")
+    return models
 
-    return _MODELS
+
+def _publish_load_stats(version: str, models: dict):
+    """on_swap del registro: las métricas de carga pasan a ser las de la versión servida"""
+    _LOAD_STATS.update(models.get("_load_stats", {}))
 
 
 def _predict_price_per_sqm(bundle, processed_data):
     """Predice precio/m² con un modelo LightGBM (target = log1p, se aplica expm1)."""
+    import numpy as np
+
+    encoder = bundle.get('encoder')
+    if encoder is None:
+        return _predict_price_per_sqm_pandas(bundle, processed_data)
+    pred = _backend(bundle).predict(encoder.encode_row(processed_data))[0]
+    return float(np.expm1(pred))
+
+
+def _backend(bundle):
+    """Backend elegido al cargar (Booster, treelite u ONNX); el Booster si no hay"""
+    return bundle.get('backend') or bundle['model']
+
+
+def _predict_price_per_sqm_pandas(bundle, processed_data):
+    """Camino original con DataFrame + pd.Categorical (respaldo y referencia del benchmark)."""
     import pandas as pd
     import numpy as np
 
@@ -177,68 +327,327 @@ def _predict_price_per_sqm(bundle, processed_data):
     return float(np.expm1(pred))
 
 
+def _predict_price_per_sqm_batch(bundle, rows):
+    """Precio/m² de muchas filas con una sola llamada a Booster.predict."""
+    import pandas as pd
+    import numpy as np
+
+    encoder = bundle.get('encoder')
+    if encoder is not None:
+        return np.expm1(_backend(bundle).predict(encoder.encode_rows(rows)))
+
+    df = pd.DataFrame.from_records(rows, columns=bundle['features'])
+    for cat in CATEGORICAL_FEATURES:
+        if cat in df.columns:
+            df[cat] = pd.Categorical(df[cat].astype(str))
+    return np.expm1(bundle['model'].predict(df))
+
+
+# Fila de prueba para validar y calentar (apartamento típico en Bogotá)
+_WARMUP_ROW = {
+    'area': 70.0, 'rooms': 3, 'baths': 2, 'garages': 1, 'stratum': 4,
+    'latitude': 4.67, 'longitude': -74.05, 'antiquity': 10, 'is_new': 'no',
+    'area_per_room': 70.0 / 3, 'age_bucket': '9-15', 'has_garage': 1,
+    'city_id': '1', 'property_type': 0
+}
+
+
+def _validate_models(models: dict) -> dict:
+    """Ambos modelos presentes, features acordes a metadata y un predict de prueba sano. Lanza si no."""
+    import numpy as np
+
+    sample = _normalize_categoricals(dict(_WARMUP_ROW), None)
+    prices = {}
+    for offer, _ in _MODEL_FILES:
+        bundle = models.get(offer) or {}
+        model = bundle.get('model')
+        if model is None:
+            raise RuntimeError(f"Falta el modelo de {offer}")
+        if model.num_feature() != len(bundle['features']):
+            raise RuntimeError(
+                f"Modelo de {offer}: espera {model.num_feature()} features, metadata trae {len(bundle['features'])}"
+            )
+        prices[offer] = _predict_price_per_sqm(bundle, sample)
+        if not np.isfinite(prices[offer]) or prices[offer] <= 0:
+            raise RuntimeError(f"Modelo de {offer}: predicción de prueba inválida ({prices[offer]})")
+    return prices
+
+
+registry = ModelRegistry(_MODELS_DIR, _read_models, _validate_models, _publish_load_stats)
+
+
+def _load_models():
+    """Modelos de la versión activa (la primera llamada carga la versión inicial)."""
+    return registry.active()[1]
+
+
+# Dueño de los Boosters en tiempo de request: los endpoints solo encolan y esperan
+inference = InferenceExecutor(_load_models, _predict_price_per_sqm_batch)
+
+
+def _model_fingerprint() -> tuple:
+    version = registry.active_version
+    try:
+        directory = registry.version_dir(version) if version else _MODELS_DIR
+    except ValueError:
+        directory = _MODELS_DIR
+    paths = [os.path.join(directory, filename) for _, filename in _MODEL_FILES]
+    return (version, file_fingerprint(paths + [os.path.join(directory, 'metadata.json')]))
+
+
+# Predicciones ya hechas por vector de features normalizado (se vacía si cambian los modelos)
+valuation_cache = ValuationCache(_model_fingerprint)
+
+
+def warm_up_models() -> dict:
+    """Carga, valida y calienta ambos modelos con un predict de prueba. Lanza si algo falla."""
+    import numpy as np
+
+    try:
+        version, models = registry.active()
+        start = time.perf_counter()
+        sample = _normalize_categoricals(dict(_WARMUP_ROW), None)
+        single = _validate_models(models)
+        for offer, price in single.items():
+            # El camino del pool debe dar lo mismo (y así arrancan sus hilos)
+            pooled = float(inference.predict(offer, [sample, sample], models[offer])[0])
+            if not np.isclose(price, pooled):
+                raise RuntimeError(f"Modelo de {offer}: el pool predice {pooled} y el camino directo {price}")
+        _LOAD_STATS["warmup_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        _LOAD_STATS["warmed_up"] = True
+        _LOAD_STATS["warmup_error"] = None
+        print(f"🔥 Modelos de avalúo (versión {version}) calentados en {_LOAD_STATS['warmup_ms']} ms")
+    except Exception as e:
+        _LOAD_STATS["warmup_error"] = str(e)
+        raise
+    return model_status()
+
+
+def model_status() -> dict:
+    return {**_LOAD_STATS, "offers": dict(_LOAD_STATS["offers"]), "registry": registry.status()}
+
+
+def _valuation_inputs(data: PropertyValuationRequest) -> dict:
+    return {
+        'area': data.area,
+        'rooms': data.rooms,
+        'baths': data.baths,
+        'garages': data.garages,
+        'stratum': data.stratum,
+        'latitude': data.latitude,
+        'longitude': data.longitude,
+        'antiquity': data.antiquity,
+        'is_new': data.is_new,
+        'area_per_room': data.area_per_room,
+        'age_bucket': data.age_bucket,
+        'has_garage': data.has_garage,
+        'city_id': data.city_id,
+        'property_type': data.property_type
+    }
+
+
+def value_properties_batch(items: list) -> dict:
+    """Valida, normaliza y predice un lote (lista de dicts). Errores por fila en vez de fallar el lote."""
+    start = time.perf_counter()
+    version, models = registry.active()
+    results = [None] * len(items)
+    valid_idx, valid_rows, areas = [], [], []
+    for i, item in enumerate(items):
+        try:
+            data = PropertyValuationRequest.model_validate(item)
+        except ValidationError as e:
+            err = e.errors(include_url=False)[0]
+            results[i] = {"index": i, "error": f"{'.'.join(str(x) for x in err['loc'])}: {err['msg']}"}
+            continue
+        valid_idx.append(i)
+        valid_rows.append(_valuation_inputs(data))
+        areas.append(data.area)
+
+    if valid_rows:
+        locations = _locate_many([r['latitude'] for r in valid_rows], [r['longitude'] for r in valid_rows])
+        model_rows = [_normalize_categoricals(dict(row), loc['city_id']) for row, loc in zip(valid_rows, locations)]
+
+        per_row = [{} for _ in valid_rows]
+        pending = {offer: inference.submit(offer, model_rows, models[offer])
+                   for offer in ('rent', 'sell') if models.get(offer, {}).get('model') is not None}
+        for offer, future in pending.items():
+            try:
+                prices = future.result()
+            except Exception as e:
+                print(f"Error modelo {offer} (lote): {e}")
+                for r in per_row:
+                    r[f'{offer}_error'] = str(e)
+                continue
+            for r, price, area in zip(per_row, prices, areas):
+                r[f'{offer}_price_per_sqm'] = round(float(price), 2)
+                r[f'total_{offer}_price'] = round(float(price) * area, 2)
+
+        for i, r, loc in zip(valid_idx, per_row, locations):
+            results[i] = {"index": i, "valuation_results": r, "location": loc}
+
+    elapsed = time.perf_counter() - start
+    return {
+        "results": results,
+        "count": len(items),
+        "errors": len(items) - len(valid_idx),
+        "model_version": version,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "rows_per_second": round(len(items) / elapsed) if elapsed > 0 else None
+    }
+
+
+@router.post("/valuation/batch")
+async def calculate_valuation_batch(data: ValuationBatchRequest):
+    """Avalúo de muchas propiedades: un solo predict vectorizado por modelo"""
+    if len(data.properties) > VALUATION_BATCH_MAX:
+        return {"status": "error", "message": f"Máximo {VALUATION_BATCH_MAX} propiedades por lote", "data": None}
+    try:
+        # Predicción CPU-bound: fuera del event loop
+        result = await asyncio.to_thread(value_properties_batch, data.properties)
+        return {"status": "success", "message": "Avalúos realizados", "data": result}
+    except InferenceQueueFull as e:
+        return _busy_response(e)
+    except Exception as e:
+        print(f"Error en avalúo por lote: {e}")
+        return {"status": "error", "message": str(e), "data": None}
+
+
+def _busy_response(error: InferenceQueueFull):
+    return JSONResponse(
+        {"status": "error", "message": str(error), "data": None},
+        status_code=503, headers={"Retry-After": "1"}
+    )
+
+
 @router.post("/valuation")
 async def calculate_valuation(data: PropertyValuationRequest):
     """Calcular avalúo de propiedad usando modelos ML (LightGBM renta y venta)"""
     try:
-        processed_data = {
-            'area': data.area,
-            'rooms': data.rooms,
-            'baths': data.baths,
-            'garages': data.garages,
-            'stratum': data.stratum,
-            'latitude': data.latitude,
-            'longitude': data.longitude,
-            'antiquity': data.antiquity,
-            'is_new': data.is_new,
-            'area_per_room': data.area_per_room,
-            'age_bucket': data.age_bucket,
-            'has_garage': data.has_garage,
-            'city_id': data.city_id,
-            'property_type': data.property_type
-        }
+        processed_data = _valuation_inputs(data)
 
         # Copia normalizada para el modelo (categóricos alineados con el
         # entrenamiento); processed_data queda intacto para el eco de la respuesta.
-        model_input = _normalize_categoricals(dict(processed_data))
+        location = _locate(data.latitude, data.longitude)
+        model_input = _normalize_categoricals(dict(processed_data), location["city_id"])
 
-        models = _load_models()
+        # Una sola versión para toda la request (la carga inicial lee ~20 MB: fuera del event loop)
+        version, models = await asyncio.to_thread(registry.active)
         results = {}
 
-        # Modelo de renta (LightGBM)
-        if models.get('rent', {}).get('model') is not None:
+        # Primero el cache; lo que falte se encola junto al pool de inferencia (LightGBM)
+        offers = [offer for offer in ('rent', 'sell') if models.get(offer, {}).get('model') is not None]
+        keys = {offer: valuation_cache.key(offer, model_input, version) for offer in offers}
+        prices = {offer: valuation_cache.get(keys[offer]) for offer in offers}
+        pending = {offer: asyncio.wrap_future(inference.submit(offer, [model_input], models[offer]))
+                   for offer in offers if prices[offer] is None}
+        for offer in offers:
             try:
-                rent_price = _predict_price_per_sqm(models['rent'], model_input)
-                results['rent_price_per_sqm'] = round(rent_price, 2)
-                results['total_rent_price'] = round(rent_price * data.area, 2)
+                price = prices[offer]
+                if price is None:
+                    price = float((await pending[offer])[0])
+                    valuation_cache.put(keys[offer], price)
+                results[f'{offer}_price_per_sqm'] = round(price, 2)
+                results[f'total_{offer}_price'] = round(price * data.area, 2)
             except Exception as e:
-                results['rent_error'] = str(e)
-                print(f"Error modelo renta: {e}")
-
-        # Modelo de venta (LightGBM)
-        if models.get('sell', {}).get('model') is not None:
-            try:
-                sell_price = _predict_price_per_sqm(models['sell'], model_input)
-                results['sell_price_per_sqm'] = round(sell_price, 2)
-                results['total_sell_price'] = round(sell_price * data.area, 2)
-            except Exception as e:
-                results['sell_error'] = str(e)
-                print(f"Error modelo venta: {e}")
+                results[f'{offer}_error'] = str(e)
+                print(f"Error modelo {'renta' if offer == 'rent' else 'venta'}: {e}")
 
         return {
             "status": "success",
             "message": "Avalúo realizado exitosamente",
             "data": {
                 "property_info": processed_data,
-                "valuation_results": results
+                "valuation_results": results,
+                "location": location,
+                "model_version": version
             }
         }
 
+    except InferenceQueueFull as e:
+        return _busy_response(e)
     except Exception as e:
         print(f"Error en avalúo: {e}")
         return {"status": "error", "message": str(e), "data": None}
 
 
+def _comps(data: CompsRequest) -> dict:
+    start = time.perf_counter()
+    location = _locate(data.latitude, data.longitude)
+    max_radius_m = data.max_radius_m or COMPS_MAX_RADIUS_M
+    # Cerca de un límite de ciudad los comps pueden estar en la vecina
+    city_ids = reverse_geocoder.cities_within(data.latitude, data.longitude, max_radius_m) or set()
+    if location["city_id"] is not None:
+        city_ids.add(location["city_id"])
+    with Session(engine) as session:
+        result = find_comps(
+            session, sorted(city_ids), data.model_dump(include={
+                "latitude", "longitude", "area", "rooms", "baths", "stratum", "property_type"
+            }),
+            offer=data.offer, k=data.k, weights=data.weights,
+            max_radius_m=max_radius_m, exclude_id=data.exclude_id
+        )
+    result.update({"location": location, "took_ms": round((time.perf_counter() - start) * 1000, 2)})
+    return result
+
+
+@router.post("/valuation/comps")
+async def get_valuation_comps(data: CompsRequest):
+    """Publicaciones activas más comparables al inmueble, con precio/m² y similitud"""
+    if data.offer not in ("sell", "rent"):
+        return {"status": "error", "message": "offer debe ser 'sell' o 'rent'", "data": None}
+    if data.area <= 0:
+        return {"status": "error", "message": "El área debe ser mayor que 0", "data": None}
+    if data.weights and any(w < 0 for w in data.weights.values()):
+        return {"status": "error", "message": "Los pesos no pueden ser negativos", "data": None}
+    try:
+        result = await asyncio.to_thread(_comps, data)
+        return {"status": "success", "message": "Comparables encontrados", "data": result}
+    except Exception as e:
+        print(f"Error buscando comparables: {e}")
+        return {"status": "error", "message": str(e), "data": None}
+
+
+@router.get("/valuation/inference/stats")
+async def get_inference_stats():
+    """Cola, micro-lotes y latencias del pool de inferencia + hit ratio del cache de avalúos"""
+    return {"status": "success", "data": {**inference.stats(), "cache": valuation_cache.stats()}}
+
+
+@router.get("/valuation/models/status")
+async def get_models_status():
+    """Tiempos de carga/calentamiento de los modelos en este proceso"""
+    return {"status": "success", "data": model_status()}
+
+
+@router.get("/valuation/models")
+async def list_model_versions():
+    """Versiones de modelos disponibles, cuál se sirve y cuál queda para rollback"""
+    return {"status": "success", "data": {**registry.status(), "versions": registry.describe()}}
+
+
+@router.post("/valuation/models/rollback")
+async def rollback_model_version():
+    """Vuelve a la versión anterior (ya está en memoria: el cambio es inmediato)"""
+    try:
+        return {"status": "success", "data": registry.rollback()}
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=409)
+
+
+@router.post("/valuation/models/{version}/activate")
+async def activate_model_version(version: str):
+    """Carga y valida `version` en segundo plano y la pone en servicio con un swap atómico"""
+    try:
+        registry.version_dir(version)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=404)
+    try:
+        return {"status": "success", "data": await asyncio.to_thread(registry.activate, version)}
+    except Exception as e:
+        print(f"Error activando modelos {version}: {e}")
+        return JSONResponse({"status": "error", "message": f"La versión {version} no pasó la validación: {e}"}, status_code=422)
+
+
 @router.post("/save-valuation")
 async def save_valuation(data: SaveValuationRequest):
     """Guardar o actualizar avalúo"""
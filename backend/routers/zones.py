@@ -4,12 +4,60 @@ Router de Zonas - Endpoints de estadísticas por zona geográfica
 from fastapi import APIRouter, Query
 from typing import Optional
 from sqlmodel import Session
-from sqlalchemy import text
 from config.db_connection import engine
+from services.zone_polygons import get_city_polygons
+from services.zone_sketches import get_zone_quantiles
+from services.price_history import get_zone_valorizations, get_price_history
+from services.analytics_engine import run_analytical
 import math
 
 router = APIRouter(prefix="/api", tags=["zones"])
 
+# Filtro de outliers a 3 sigmas: necesita recorrer la zona dos veces (media y
+# desviación). Solo se usa cuando no hay sketch de la zona (p. ej. con bounds).
+_SIGMA_OUTLIER_FILTER = """
+            area_stats AS (
+                SELECT AVG(area) as mean_area, STDDEV(area) as stddev_area FROM zone_data
+            ),
+            price_stats AS (
+                SELECT offer, AVG(price) as mean_price, STDDEV(price) as stddev_price
+                FROM zone_data GROUP BY offer
+            ),
+            filtered_data AS (
+                SELECT zd.*
+                FROM zone_data zd
+                CROSS JOIN area_stats ast
+                LEFT JOIN price_stats ps ON zd.offer = ps.offer
+                WHERE zd.price BETWEEN (ps.mean_price - 3 * COALESCE(ps.stddev_price, 0)) 
+                                   AND (ps.mean_price + 3 * COALESCE(ps.stddev_price, 0))
+                  AND zd.area BETWEEN (ast.mean_area - 3 * COALESCE(ast.stddev_area, 0))
+                                  AND (ast.mean_area + 3 * COALESCE(ast.stddev_area, 0))
+            )"""
+
+# Filtro de outliers por IQR con límites precalculados desde los sketches de la zona
+_SKETCH_OUTLIER_FILTER = """
+            filtered_data AS (
+                SELECT zd.*
+                FROM zone_data zd
+                WHERE (zd.offer = 'sell'
+                        AND zd.price BETWEEN :sell_price_lo AND :sell_price_hi
+                        AND zd.area BETWEEN :sell_area_lo AND :sell_area_hi)
+                   OR (zd.offer = 'rent'
+                        AND zd.price BETWEEN :rent_price_lo AND :rent_price_hi
+                        AND zd.area BETWEEN :rent_area_lo AND :rent_area_hi)
+            )"""
+
+
+def _sketch_outlier_params(quantiles: dict) -> dict:
+    """Límites IQR (lower/upper fence) de precio y área por oferta para _SKETCH_OUTLIER_FILTER"""
+    params = {}
+    for offer in ('sell', 'rent'):
+        for metric in ('price', 'area'):
+            summary = quantiles.get(offer, {}).get(metric)
+            params[f"{offer}_{metric}_lo"] = summary['lower_fence'] if summary else -1e18
+            params[f"{offer}_{metric}_hi"] = summary['upper_fence'] if summary else 1e18
+    return params
+
 
 @router.get("/zone-statistics")
 async def get_zone_statistics(
@@ -45,7 +93,7 @@ async def get_zone_statistics(
             city_filter = f"AND p.city_id = {city_id}" if city_id else ""
             final_query = query_sql.format(city_filter=city_filter)
             
-            results = session.exec(text(final_query)).all()
+            results = run_analytical(session, "zone-statistics", final_query)
             
             zone_stats = []
             for row in results:
@@ -80,11 +128,16 @@ async def get_zone_statistics(
 async def get_zone_statistics_full(
     city_id: int = None,
     updated_date_from: str = None,
-    updated_date_to: str = None
+    updated_date_to: str = None,
+    valorization_days: int = 30
 ):
     """Obtener estadísticas completas de zonas con valorización"""
     try:
         with Session(engine) as session:
+            # Valorización desde la historia diaria (dos fotos por zona); sin
+            # historia todavía se cae al cálculo contra updated_property
+            valorizations = get_zone_valorizations(session, city_id, valorization_days)
+            
             query_sql = """
             WITH zone_stats AS (
                 SELECT 
@@ -99,10 +152,10 @@ async def get_zone_statistics_full(
                     AVG(p.longitude) as center_lng,
                     AVG(CASE WHEN p.offer = 'sell' THEN p.price / NULLIF(p.area, 0) END) as sale_price_m2,
                     AVG(CASE WHEN p.offer = 'rent' THEN p.price / NULLIF(p.area, 0) END) as rent_price_m2,
-                    AVG(CASE WHEN p.offer = 'sell' AND up.previous_value > 0 THEN up.previous_value / NULLIF(p.area, 0) END) as prev_sale_m2,
-                    AVG(CASE WHEN p.offer = 'rent' AND up.previous_value > 0 THEN up.previous_value / NULLIF(p.area, 0) END) as prev_rent_m2
+                    {prev_columns},
+                    c.id as city_id
                 FROM property p
-                LEFT JOIN updated_property up ON p.fr_property_id = up.property_id
+                {updated_join}
                 LEFT JOIN city c ON p.city_id = c.id
                 WHERE p.location_main IS NOT NULL 
                     AND p.area > 0 
@@ -111,7 +164,7 @@ async def get_zone_statistics_full(
                     AND p.longitude IS NOT NULL
                     {city_filter}
                     {date_filter}
-                GROUP BY p.location_main, c.name
+                GROUP BY p.location_main, c.id, c.name
                 HAVING COUNT(DISTINCT p.fr_property_id) > 3
             )
             SELECT 
@@ -135,7 +188,8 @@ async def get_zone_statistics_full(
                     WHEN sale_price_m2 > 0 AND rent_price_m2 > 0 THEN 
                         ((rent_price_m2 * 12) / sale_price_m2)
                     ELSE 0 
-                END as cap_rate
+                END as cap_rate,
+                city_id
             FROM zone_stats
             ORDER BY property_count DESC;
             """
@@ -147,10 +201,21 @@ async def get_zone_statistics_full(
                 date_filter += f" AND (up.updated_date IS NULL OR up.updated_date >= '{updated_date_from}')"
             if updated_date_to:
                 date_filter += f" AND (up.updated_date IS NULL OR up.updated_date <= '{updated_date_to}')"
+            
+            # updated_property solo hace falta para el filtro de fechas o para la valorización legacy
+            updated_join = ""
+            if date_filter or not valorizations:
+                updated_join = "LEFT JOIN updated_property up ON p.fr_property_id = up.property_id"
+            if valorizations:
+                prev_columns = "NULL::float as prev_sale_m2, NULL::float as prev_rent_m2"
+            else:
+                prev_columns = """AVG(CASE WHEN p.offer = 'sell' AND up.previous_value > 0 THEN up.previous_value / NULLIF(p.area, 0) END) as prev_sale_m2,
+                    AVG(CASE WHEN p.offer = 'rent' AND up.previous_value > 0 THEN up.previous_value / NULLIF(p.area, 0) END) as prev_rent_m2"""
                 
-            final_query = query_sql.format(city_filter=city_filter, date_filter=date_filter)
+            final_query = query_sql.format(city_filter=city_filter, date_filter=date_filter,
+                                           prev_columns=prev_columns, updated_join=updated_join)
             
-            results = session.exec(text(final_query)).all()
+            results = run_analytical(session, "zone-statistics-full", final_query)
             
             zones_data = []
             for result in results:
@@ -161,6 +226,11 @@ async def get_zone_statistics_full(
                 rent_valorization = float(result[12]) if result[12] and not math.isnan(float(result[12])) else 0
                 cap_rate = float(result[13]) if result[13] and not math.isnan(float(result[13])) else 0
                 
+                if valorizations:
+                    zone_valorization = valorizations.get((result[14], result[0]), {})
+                    sale_valorization = zone_valorization.get('sale_valorization', 0)
+                    rent_valorization = zone_valorization.get('rent_valorization', 0)
+                
                 zones_data.append({
                     'id': str(result[0]),
                     'name': str(result[0]),
@@ -218,6 +288,18 @@ async def get_zone_details(
                 """
                 location_params = {"north": north, "south": south, "east": east, "west": west}
             
+            # Límites de outliers: desde el sketch de la zona si existe (O(1)). Los
+            # sketches son de toda la zona, así que con filtros de tipo o fecha (o
+            # bounds arbitrarios, o zona sin sketch) se usa el filtro de 3 sigmas
+            # sobre los datos filtrados
+            outlier_filter = _SIGMA_OUTLIER_FILTER
+            unfiltered = not (property_type or updated_date_from or updated_date_to)
+            if not all([north, south, east, west]) and unfiltered:
+                quantiles = get_zone_quantiles(session, zone_name, city_id)
+                if quantiles:
+                    outlier_filter = _SKETCH_OUTLIER_FILTER
+                    location_params = {**location_params, **_sketch_outlier_params(quantiles)}
+            
             has_date_filter = updated_date_from or updated_date_to
             
             # Query para período filtrado
@@ -235,24 +317,7 @@ async def get_zone_details(
                     {{city_filter}}
                     {{date_filter}}
                     {{type_filter}}
-            ),
-            area_stats AS (
-                SELECT AVG(area) as mean_area, STDDEV(area) as stddev_area FROM zone_data
-            ),
-            price_stats AS (
-                SELECT offer, AVG(price) as mean_price, STDDEV(price) as stddev_price
-                FROM zone_data GROUP BY offer
-            ),
-            filtered_data AS (
-                SELECT zd.*
-                FROM zone_data zd
-                CROSS JOIN area_stats ast
-                LEFT JOIN price_stats ps ON zd.offer = ps.offer
-                WHERE zd.price BETWEEN (ps.mean_price - 3 * COALESCE(ps.stddev_price, 0)) 
-                                   AND (ps.mean_price + 3 * COALESCE(ps.stddev_price, 0))
-                  AND zd.area BETWEEN (ast.mean_area - 3 * COALESCE(ast.stddev_area, 0))
-                                  AND (ast.mean_area + 3 * COALESCE(ast.stddev_area, 0))
-            )
+            ),{outlier_filter}
             SELECT 
                 COUNT(DISTINCT fr_property_id) as total_properties,
                 COUNT(DISTINCT CASE WHEN offer = 'sell' THEN fr_property_id END) as sale_count,
@@ -288,7 +353,7 @@ async def get_zone_details(
                 date_filter += f" AND p.creation_date <= '{updated_date_to}'"
                 
             final_query = query_filtered.format(city_filter=city_filter, date_filter=date_filter, type_filter=type_filter)
-            result_filtered = session.execute(text(final_query), location_params).first()
+            result_filtered = next(iter(run_analytical(session, "zone-details", final_query, location_params)), None)
             
             # PERÍODO ACTUAL (último mes) - solo si hay filtro de fecha
             result_current = None
@@ -305,24 +370,7 @@ async def get_zone_details(
                         {{city_filter}}
                         {{type_filter}}
                         AND p.last_update >= :date_30_days_ago
-                ),
-                area_stats AS (
-                    SELECT AVG(area) as mean_area, STDDEV(area) as stddev_area FROM zone_data
-                ),
-                price_stats AS (
-                    SELECT offer, AVG(price) as mean_price, STDDEV(price) as stddev_price
-                    FROM zone_data GROUP BY offer
-                ),
-                filtered_data AS (
-                    SELECT zd.*
-                    FROM zone_data zd
-                    CROSS JOIN area_stats ast
-                    LEFT JOIN price_stats ps ON zd.offer = ps.offer
-                    WHERE zd.price BETWEEN (ps.mean_price - 3 * COALESCE(ps.stddev_price, 0)) 
-                                       AND (ps.mean_price + 3 * COALESCE(ps.stddev_price, 0))
-                      AND zd.area BETWEEN (ast.mean_area - 3 * COALESCE(ast.stddev_area, 0))
-                                      AND (ast.mean_area + 3 * COALESCE(ast.stddev_area, 0))
-                )
+                ),{outlier_filter}
                 SELECT 
                     COUNT(DISTINCT fr_property_id) as total_properties,
                     COUNT(DISTINCT CASE WHEN offer = 'sell' THEN fr_property_id END) as sale_count,
@@ -336,7 +384,7 @@ async def get_zone_details(
                 
                 final_query_current = query_current.format(city_filter=city_filter, type_filter=type_filter)
                 current_params = {**location_params, "date_30_days_ago": date_30_days_ago}
-                result_current = session.execute(text(final_query_current), current_params).first()
+                result_current = next(iter(run_analytical(session, "zone-details", final_query_current, current_params)), None)
             
             # Procesar resultado del período filtrado
             filtered_data = {}
@@ -402,6 +450,35 @@ async def get_zone_details(
         return {'status': 'error', 'message': str(e)}
 
 
+@router.get("/zone-quantiles")
+async def get_zone_quantiles_endpoint(zone_name: str, city_id: int = None):
+    """Mediana, percentiles e IQR de precio, área y precio/m² de una zona (desde sketches)"""
+    try:
+        with Session(engine) as session:
+            quantiles = get_zone_quantiles(session, zone_name, city_id)
+        
+        # Todas las publicaciones de la zona, sin filtros de tipo ni fecha
+        return {'status': 'success', 'scope': 'all_time', 'data': quantiles}
+        
+    except Exception as e:
+        print(f"Error getting zone quantiles: {e}")
+        return {'status': 'error', 'message': str(e), 'data': None}
+
+
+@router.get("/zone-price-history")
+async def get_zone_price_history(city_id: int, zone_name: str = None, days: int = 365):
+    """Serie diaria de medianas de precio/m² de una zona (o de la ciudad sin zone_name)"""
+    try:
+        with Session(engine) as session:
+            series = get_price_history(session, city_id, zone_name or "", days)
+        
+        return {'status': 'success', 'data': series}
+        
+    except Exception as e:
+        print(f"Error getting zone price history: {e}")
+        return {'status': 'error', 'message': str(e), 'data': []}
+
+
 @router.get("/all-postal-codes")
 async def get_all_postal_codes(city_id: int = None):
     """Obtener códigos postales por ciudad"""
@@ -426,7 +503,7 @@ async def get_all_postal_codes(city_id: int = None):
             """
             
             city_filter = f"AND p.city_id = {city_id}" if city_id else ""
-            result = session.exec(text(query.format(city_filter))).all()
+            result = run_analytical(session, "all-postal-codes", query.format(city_filter))
             
             all_postal_codes = [{
                 'postal_code': row[0],
@@ -451,3 +528,17 @@ async def get_all_postal_codes(city_id: int = None):
     except Exception as e:
         print(f"Error getting all postal codes: {e}")
         return {'status': 'error', 'message': str(e), 'data': []}
+
+
+@router.get("/zones/{city_id}/polygons")
+async def get_zone_polygons(city_id: int):
+    """Polígonos precalculados (concave hull) de las zonas de una ciudad"""
+    try:
+        with Session(engine) as session:
+            collection = get_city_polygons(session, city_id)
+        
+        return {'status': 'success', 'data': collection}
+        
+    except Exception as e:
+        print(f"Error getting zone polygons: {e}")
+        return {'status': 'error', 'message': str(e), 'data': None}
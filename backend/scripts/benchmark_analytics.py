@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Benchmark lado a lado de los endpoints analíticos: Postgres vs DuckDB/Parquet
+Usage: python scripts/benchmark_analytics.py [repeticiones] [city_id]
+Requiere un snapshot Parquet (scripts/export_parquet_snapshot.py).
+"""
+import sys
+import time
+import asyncio
+import statistics
+from pathlib import Path
+
+# Add backend to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from services.analytics_engine import set_route
+from routers.zones import get_zone_statistics, get_zone_statistics_full, get_all_postal_codes
+
+
+def bench(endpoint, call, repeats):
+    timings = {}
+    for backend in ("postgres", "duckdb"):
+        set_route(endpoint, backend)
+        asyncio.run(call())  # warm-up (conexiones, vistas, caché de páginas)
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            asyncio.run(call())
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[backend] = samples
+    set_route(endpoint, None)
+    return timings
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    city_id = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    cases = [
+        ("zone-statistics", lambda: get_zone_statistics(city_id=city_id)),
+        ("zone-statistics-full", lambda: get_zone_statistics_full(city_id=city_id)),
+        ("all-postal-codes", lambda: get_all_postal_codes(city_id=city_id)),
+    ]
+
+    print(f"{'endpoint':<24}{'pg p50 ms':>12}{'duck p50 ms':>14}{'speedup':>10}")
+    for endpoint, call in cases:
+        timings = bench(endpoint, call, repeats)
+        pg = statistics.median(timings["postgres"])
+        duck = statistics.median(timings["duckdb"])
+        print(f"{endpoint:<24}{pg:>12.1f}{duck:>14.1f}{pg / duck if duck else 0:>9.1f}x")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark de backends de inferencia (native / treelite / onnx) por modelo
+Usage: python scripts/benchmark_inference_backends.py [versión|base] [repeticiones]
+
+Para cada backend con artefacto y librería disponibles mide la latencia de una
+fila (p50/p99) y el throughput en lotes de 64 y 1024 filas sobre la muestra de
+paridad (holdout de train.py o sintética), y la diferencia máxima contra el Booster.
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add backend to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from routers.valuations import registry, _read_models
+from services.inference_backends import (
+    NativeBackend, COMPILED_BACKENDS, compiled_path, parity_sample, check_parity
+)
+
+BATCH_SIZES = (64, 1024)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def single_row_ms(backend, X):
+    latencies = []
+    for i in range(len(X)):
+        row = X[i:i + 1]
+        start = time.perf_counter()
+        backend.predict(row)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return percentile(latencies, 0.5), percentile(latencies, 0.99)
+
+
+def rows_per_second(backend, X, batch_size, repeats):
+    batch = np.resize(X, (batch_size, X.shape[1]))
+    backend.predict(batch)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        backend.predict(batch)
+    return batch_size * repeats / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    available = registry.available()
+    if not available:
+        print("❌ No hay modelos en ml_models/")
+        sys.exit(1)
+    version = sys.argv[1] if len(sys.argv) > 1 else available[-1]
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    directory = registry.version_dir(version)
+    models = _read_models(directory)
+
+    header = f"{'modelo':<6}{'backend':<10}{'p50 ms':>9}{'p99 ms':>9}" + "".join(f"{f'filas/s@{b}':>14}" for b in BATCH_SIZES) + f"{'dif. máx':>11}"
+    print(f"📦 Versión {version}\n{header}")
+    for offer, bundle in models.items():
+        if bundle["model"] is None or bundle["encoder"] is None:
+            print(f"⚠️ {offer}: sin modelo o sin encoder, se omite")
+            continue
+        X, source = parity_sample(directory, offer, bundle["encoder"])
+        model_path = os.path.join(directory, f"model_{offer}_lightgbm.txt")
+
+        backends = [NativeBackend(bundle["model"])]
+        for name, backend_class in COMPILED_BACKENDS.items():
+            path = compiled_path(model_path, name)
+            if not os.path.exists(path):
+                continue
+            try:
+                backends.append(backend_class(path))
+            except ImportError as e:
+                print(f"⚠️ {offer}/{name}: librería no instalada ({e})")
+
+        for backend in backends:
+            p50, p99 = single_row_ms(backend, X)
+            throughput = [rows_per_second(backend, X, b, repeats) for b in BATCH_SIZES]
+            diff = check_parity(backend, bundle["model"], X)["max_abs_diff"]
+            print(f"{offer:<6}{backend.name:<10}{p50:>9.3f}{p99:>9.3f}"
+                  + "".join(f"{t:>14.0f}" for t in throughput) + f"{diff:>11.1e}")
+        print(f"       (muestra {source}, {len(X)} filas)")
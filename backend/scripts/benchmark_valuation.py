@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark de avalúos: camino fila a fila (/api/valuation) vs lote vectorizado (/api/valuation/batch)
+Usage: python scripts/benchmark_valuation.py [filas]
+Requiere los modelos en ml_models/. Las filas son sintéticas alrededor de los
+centroides de ciudad; también verifica que ambos caminos den el mismo precio.
+"""
+import sys
+import time
+import random
+from pathlib import Path
+
+# Add backend to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from routers.valuations import (
+    _load_models, _load_centroids, _normalize_categoricals, _predict_price_per_sqm,
+    value_properties_batch
+)
+
+AGE_LABELS = ["0-1", "1-8", "9-15", "16-30", "30+", ""]
+
+
+def synthetic_rows(n, seed=7):
+    rng = random.Random(seed)
+    centroids = _load_centroids() or [("1", 4.67, -74.07)]
+    rows = []
+    for _ in range(n):
+        _, lat, lon = rng.choice(centroids)
+        area = rng.uniform(30, 250)
+        rooms = rng.randint(1, 5)
+        garages = rng.randint(0, 2)
+        rows.append({
+            "area": area, "rooms": rooms, "baths": rng.randint(1, 4), "garages": garages,
+            "stratum": rng.randint(1, 6),
+            "latitude": lat + rng.uniform(-0.05, 0.05), "longitude": lon + rng.uniform(-0.05, 0.05),
+            "antiquity": rng.randint(0, 40), "is_new": rng.choice(["si", "no"]),
+            "area_per_room": area / rooms, "age_bucket": rng.choice(AGE_LABELS),
+            "has_garage": int(garages > 0), "city_id": "1", "property_type": rng.randint(0, 4)
+        })
+    return rows
+
+
+def single_path(rows, models):
+    prices = []
+    for row in rows:
+        model_input = _normalize_categoricals(dict(row))
+        prices.append({offer: _predict_price_per_sqm(models[offer], model_input)
+                       for offer in ("rent", "sell") if models[offer]["model"] is not None})
+    return prices
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    models = _load_models()
+    if all(bundle["model"] is None for bundle in models.values()):
+        print("❌ No hay modelos en ml_models/")
+        sys.exit(1)
+
+    rows = synthetic_rows(n)
+    value_properties_batch(rows[:10])  # warm-up
+
+    start = time.perf_counter()
+    single = single_path(rows, models)
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = value_properties_batch(rows)
+    batch_s = time.perf_counter() - start
+
+    max_diff = 0.0
+    for expected, got in zip(single, batch["results"]):
+        for offer, price in expected.items():
+            max_diff = max(max_diff, abs(round(price, 2) - got["valuation_results"][f"{offer}_price_per_sqm"]))
+
+    print(f"{'camino':<12}{'filas':>8}{'total s':>10}{'filas/s':>12}")
+    print(f"{'fila a fila':<12}{n:>8}{single_s:>10.2f}{n / single_s:>12.0f}")
+    print(f"{'lote':<12}{n:>8}{batch_s:>10.2f}{n / batch_s:>12.0f}")
+    print(f"⚡ speedup {single_s / batch_s:.1f}x · diferencia máxima precio/m²: {max_diff:.4f}")
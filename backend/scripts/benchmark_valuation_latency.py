@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Latencia de una predicción: DataFrame + pd.Categorical vs FeatureEncoder
+Usage: python scripts/benchmark_valuation_latency.py [filas]
+Requiere los modelos en ml_models/. Reporta p50/p99 por camino y verifica que
+ambos den exactamente el mismo precio/m² (bit a bit, sin redondeo).
+"""
+import sys
+import time
+from pathlib import Path
+
+# Add backend to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from routers.valuations import (
+    _load_models, _normalize_categoricals, _predict_price_per_sqm, _predict_price_per_sqm_pandas
+)
+from scripts.benchmark_valuation import synthetic_rows
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def timed(predict, bundle, inputs):
+    latencies, prices = [], []
+    for model_input in inputs:
+        start = time.perf_counter()
+        prices.append(predict(bundle, model_input))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, prices
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    models = _load_models()
+    inputs = [_normalize_categoricals(dict(row)) for row in synthetic_rows(n)]
+
+    print(f"{'modelo':<8}{'camino':<10}{'p50 ms':>10}{'p99 ms':>10}")
+    ran = False
+    for offer, bundle in models.items():
+        if bundle["model"] is None:
+            continue
+        if bundle.get("encoder") is None:
+            print(f"⚠️ {offer}: modelo sin encoder (sin pandas_categorical), se omite")
+            continue
+        ran = True
+        # warm-up de ambos caminos
+        timed(_predict_price_per_sqm_pandas, bundle, inputs[:20])
+        timed(_predict_price_per_sqm, bundle, inputs[:20])
+
+        pandas_ms, pandas_prices = timed(_predict_price_per_sqm_pandas, bundle, inputs)
+        encoder_ms, encoder_prices = timed(_predict_price_per_sqm, bundle, inputs)
+        mismatches = sum(1 for a, b in zip(pandas_prices, encoder_prices) if a != b)
+
+        print(f"{offer:<8}{'pandas':<10}{percentile(pandas_ms, 0.5):>10.3f}{percentile(pandas_ms, 0.99):>10.3f}")
+        print(f"{offer:<8}{'encoder':<10}{percentile(encoder_ms, 0.5):>10.3f}{percentile(encoder_ms, 0.99):>10.3f}")
+        speedup = percentile(pandas_ms, 0.5) / percentile(encoder_ms, 0.5)
+        status = "✅ paridad exacta" if mismatches == 0 else f"❌ {mismatches} predicciones distintas"
+        print(f"⚡ {offer}: speedup p50 {speedup:.1f}x · {status}")
+
+    if not ran:
+        print("❌ No hay modelos en ml_models/")
+        sys.exit(1)
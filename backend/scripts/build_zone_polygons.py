@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Reconstruye los polígonos de zona (concave hulls) desde las coordenadas de property
+Usage: python scripts/build_zone_polygons.py [city_id ...]
+Pensado para correr como cron nocturno; sin argumentos procesa todas las ciudades.
+"""
+import sys
+import time
+from pathlib import Path
+
+# Add backend to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlmodel import Session
+from config.db_connection import engine, init_db
+from services.zone_polygons import build_zone_polygons
+
+if __name__ == "__main__":
+    init_db()
+    city_ids = [int(arg) for arg in sys.argv[1:]] or [None]
+    
+    with Session(engine) as session:
+        for city_id in city_ids:
+            start = time.time()
+            count = build_zone_polygons(session, city_id)
+            label = f"ciudad {city_id}" if city_id else "todas las ciudades"
+            print(f"✅ {count} polígonos construidos para {label} en {time.time() - start:.1f}s")
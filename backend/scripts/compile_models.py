@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Compila los modelos de avalúo de una versión a treelite (.so) y/o ONNX (.onnx)
+Usage: python scripts/compile_models.py [versión|base] [treelite,onnx]
+(por defecto la versión más reciente y ambos backends)
+
+Los artefactos quedan junto a cada model_*.txt y el backend los usa si
+INFERENCE_BACKEND lo pide y pasan la paridad contra el Booster. Dependencias
+opcionales (no están en requirements.txt):
+  treelite: pip install treelite tl2cgen   (+ gcc)
+  onnx:     pip install onnxmltools onnxconverter-common onnxruntime
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add backend to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from routers.valuations import registry, _read_models
+from services.inference_backends import (
+    COMPILED_BACKENDS, compiled_path, parity_sample, check_parity
+)
+
+
+def compile_treelite(booster, path):
+    import treelite
+    import tl2cgen
+
+    model = treelite.frontend.from_lightgbm(booster)
+    tl2cgen.export_lib(model, toolchain="gcc", libpath=path,
+                       params={"parallel_comp": os.cpu_count() or 1})
+
+
+def compile_onnx(booster, path):
+    from onnxmltools import convert_lightgbm
+    from onnxmltools.utils import save_model
+    from onnxmltools.convert.common.data_types import FloatTensorType
+
+    onnx_model = convert_lightgbm(
+        booster, initial_types=[("input", FloatTensorType([None, booster.num_feature()]))],
+        zipmap=False
+    )
+    save_model(onnx_model, path)
+
+
+COMPILERS = {"treelite": compile_treelite, "onnx": compile_onnx}
+
+
+if __name__ == "__main__":
+    available = registry.available()
+    if not available:
+        print("❌ No hay modelos en ml_models/")
+        sys.exit(1)
+    version = sys.argv[1] if len(sys.argv) > 1 else available[-1]
+    targets = sys.argv[2].split(",") if len(sys.argv) > 2 else list(COMPILERS)
+    directory = registry.version_dir(version)
+    print(f"📦 Versión {version} ({directory})")
+
+    models = _read_models(directory)
+    failed = False
+    for offer, bundle in models.items():
+        if bundle["model"] is None:
+            print(f"⚠️ {offer}: no hay modelo, se omite")
+            continue
+        if bundle["encoder"] is None:
+            print(f"⚠️ {offer}: modelo sin pandas_categorical, los backends compilados no aplican")
+            continue
+        model_path = os.path.join(directory, f"model_{offer}_lightgbm.txt")
+        X, source = parity_sample(directory, offer, bundle["encoder"])
+        for name in targets:
+            path = compiled_path(model_path, name)
+            start = time.perf_counter()
+            try:
+                COMPILERS[name](bundle["model"], path)
+                parity = check_parity(COMPILED_BACKENDS[name](path), bundle["model"], X)
+            except ImportError as e:
+                print(f"❌ {offer}/{name}: falta la dependencia ({e})")
+                failed = True
+                continue
+            status = "✅" if parity["rows_over_tolerance"] == 0 else "❌"
+            failed = failed or parity["rows_over_tolerance"] > 0
+            print(f"{status} {offer}/{name}: {os.path.basename(path)} en {time.perf_counter() - start:.1f}s · "
+                  f"dif. máx {parity['max_abs_diff']:.2e} ({parity['rows_over_tolerance']}/{parity['rows']} "
+                  f"filas {source} sobre {parity['tolerance']:g})")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Exporta property, city y updated_property a un snapshot Parquet para DuckDB
+Usage: python scripts/export_parquet_snapshot.py
+Pensado para correr como cron nocturno. El destino es ANALYTICS_PARQUET_DIR
+(por defecto backend/data/parquet); se conservan ANALYTICS_SNAPSHOTS_TO_KEEP.
+"""
+import sys
+import time
+from pathlib import Path
+
+# Add backend to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config.db_connection import engine
+from services.analytics_engine import export_parquet_snapshot
+
+if __name__ == "__main__":
+    start = time.time()
+    snapshot_dir = export_parquet_snapshot(engine)
+    print(f"✅ Snapshot Parquet escrito en {snapshot_dir} en {time.time() - start:.1f}s")
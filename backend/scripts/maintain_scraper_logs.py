@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Mantenimiento de scraper_logs: particiones futuras, rollup horario y retención
+Usage: python scripts/maintain_scraper_logs.py [--no-retention]
+Requiere migrations/partition_scraper_logs.sql. Pensado para correr como cron
+horario; la retención solo borra meses ya cubiertos por el rollup. Los logs que
+llegan tarde (reencolados o backfill de la ingesta, con su timestamp original)
+recalculan su hora en la corrida siguiente, sin importar el atraso.
+"""
+import sys
+import time
+from pathlib import Path
+
+# Add backend to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlmodel import Session
+from config.db_connection import engine, init_db
+from services.log_retention import ensure_partitions, rollup_hourly, apply_retention
+
+if __name__ == "__main__":
+    init_db()
+
+    with Session(engine) as session:
+        start = time.time()
+        created = ensure_partitions(session)
+        print(f"📅 Particiones nuevas: {created}")
+
+        hours = rollup_hourly(session)
+        print(f"📊 Rollup horario: {hours} horas recalculadas")
+
+        if "--no-retention" not in sys.argv[1:]:
+            dropped = apply_retention(session)
+            print(f"🧹 Retención: {len(dropped)} particiones eliminadas")
+
+        print(f"✅ Mantenimiento de scraper_logs en {time.time() - start:.1f}s")
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Foto diaria de medianas de precio/m² por zona y ciudad (zone_price_snapshot)
+Usage: python scripts/snapshot_zone_prices.py [YYYY-MM-DD]
+Pensado para correr como cron diario al final del ciclo de scraping; sin
+argumento toma la fecha de hoy. Reejecutar el mismo día reescribe la foto.
+"""
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Add backend to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlmodel import Session
+from config.db_connection import engine, init_db
+from services.price_history import take_price_snapshot
+
+if __name__ == "__main__":
+    init_db()
+    snapshot_date = datetime.strptime(sys.argv[1], "%Y-%m-%d").date() if len(sys.argv) > 1 else None
+    
+    with Session(engine) as session:
+        start = time.time()
+        rows = take_price_snapshot(session, snapshot_date)
+        print(f"✅ Foto de precios: {rows} filas escritas en {time.time() - start:.1f}s")
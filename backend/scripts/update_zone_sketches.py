@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Actualiza los sketches de cuantiles por zona con las propiedades nuevas/actualizadas
+Usage: python scripts/update_zone_sketches.py [--rebuild]
+Pensado para correr como cron diario: recalcula las zonas con propiedades
+actualizadas hasta el día anterior (las que llegan por la ingesta ya se
+recalculan al escribir). --rebuild recalcula todas; correrlo semanalmente para
+sacar las publicaciones borradas, que no marcan su zona:
+  0 4 * * *  python scripts/update_zone_sketches.py
+  0 5 * * 0  python scripts/update_zone_sketches.py --rebuild
+"""
+import sys
+import time
+from pathlib import Path
+
+# Add backend to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlmodel import Session
+from config.db_connection import engine, init_db
+from services.zone_sketches import update_zone_sketches
+
+if __name__ == "__main__":
+    init_db()
+    rebuild = "--rebuild" in sys.argv[1:]
+    
+    with Session(engine) as session:
+        start = time.time()
+        observed = update_zone_sketches(session, rebuild=rebuild)
+        mode = "reconstrucción" if rebuild else "incremental"
+        print(f"✅ Sketches de zona ({mode}): {observed} propiedades recalculadas en {time.time() - start:.1f}s")
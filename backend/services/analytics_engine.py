@@ -0,0 +1,186 @@
+"""
+Motor analítico: DuckDB embebido sobre snapshots Parquet nocturnos
+
+Los agregados pesados de zonas corren por defecto contra el Postgres OLTP.
+export_parquet_snapshot() vuelca property (particionada por ciudad), city y
+updated_property a Parquet, y run_analytical() enruta a DuckDB las consultas
+de los endpoints listados en ANALYTICS_DUCKDB_ENDPOINTS (coma-separados,
+p. ej. "zone-statistics,zone-statistics-full,all-postal-codes"). Las vistas
+de DuckDB se llaman igual que las tablas, así que el mismo SQL sirve en ambos
+motores. Si DuckDB falla o no hay snapshot, se cae a Postgres.
+
+Los datos de DuckDB tienen la antigüedad del último snapshot: los conteos
+"de hoy" del dashboard no se enrutan aquí.
+"""
+import os
+import re
+import time
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import text
+
+PARQUET_DIR = Path(os.getenv(
+    "ANALYTICS_PARQUET_DIR",
+    Path(__file__).resolve().parent.parent / "data" / "parquet"
+))
+DUCKDB_ENDPOINTS = {e.strip() for e in os.getenv("ANALYTICS_DUCKDB_ENDPOINTS", "").split(",") if e.strip()}
+DUCKDB_THREADS = int(os.getenv("ANALYTICS_DUCKDB_THREADS", "4"))
+SNAPSHOTS_TO_KEEP = int(os.getenv("ANALYTICS_SNAPSHOTS_TO_KEEP", "2"))
+EXPORT_BATCH_ROWS = 50_000
+
+# Columnas exportadas por tabla, con su tipo Arrow (solo las que usan los agregados)
+_EXPORT_TABLES = {
+    "property": {
+        "columns": [
+            ("fr_property_id", "int64"), ("city_id", "int64"), ("offer", "string"),
+            ("price", "float64"), ("area", "float64"),
+            ("latitude", "float64"), ("longitude", "float64"),
+            ("location_main", "string"), ("title", "string"),
+            ("creation_date", "date32"), ("last_update", "date32"),
+        ],
+        # Se exportan todas las filas (también sin ciudad) para que DuckDB devuelva
+        # lo mismo que Postgres. La partición va por una columna aparte porque una
+        # clave de partición hive no puede ser NULL con tipo entero; city_id queda
+        # como columna normal (nullable) y la vista oculta city_part.
+        "computed": {"city_part": ("int64", "COALESCE(city_id, 0)")},
+        "partition_by": ["city_part"],
+    },
+    "city": {
+        "columns": [("id", "int64"), ("name", "string"), ("website_name", "string"), ("updated", "bool")],
+        "partition_by": None,
+    },
+    "updated_property": {
+        "columns": [("property_id", "int64"), ("previous_value", "float64"), ("updated_date", "date32")],
+        "partition_by": None,
+    },
+}
+
+
+def export_parquet_snapshot(engine) -> Path:
+    """Exporta las tablas a un nuevo snapshot Parquet y lo marca como CURRENT"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    snapshot_dir = PARQUET_DIR / datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    raw = engine.raw_connection()
+    try:
+        for table, spec in _EXPORT_TABLES.items():
+            computed = spec.get("computed", {})
+            columns = spec["columns"] + [(name, type_name) for name, (type_name, _) in computed.items()]
+            schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in columns])
+            select = [name for name, _ in spec["columns"]] + [f"{expr} AS {name}" for name, (_, expr) in computed.items()]
+            # Cursor con nombre = server-side: no trae la tabla entera a memoria
+            cursor = raw.cursor(name=f"export_{table}")
+            cursor.itersize = EXPORT_BATCH_ROWS
+            cursor.execute(f"SELECT {', '.join(select)} FROM {table}")
+
+            def batches():
+                while True:
+                    rows = cursor.fetchmany(EXPORT_BATCH_ROWS)
+                    if not rows:
+                        break
+                    columns = list(zip(*rows))
+                    yield pa.RecordBatch.from_arrays(
+                        [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                        schema=schema
+                    )
+
+            partitioning = None
+            if spec["partition_by"]:
+                partitioning = ds.partitioning(
+                    pa.schema([schema.field(name) for name in spec["partition_by"]]), flavor="hive"
+                )
+            ds.write_dataset(
+                batches(), snapshot_dir / table, schema=schema, format="parquet",
+                partitioning=partitioning, existing_data_behavior="overwrite_or_ignore"
+            )
+            cursor.close()
+    finally:
+        raw.close()
+
+    # El puntero se escribe al final: los lectores nunca ven un snapshot a medias
+    tmp_pointer = PARQUET_DIR / "CURRENT.tmp"
+    tmp_pointer.write_text(snapshot_dir.name)
+    os.replace(tmp_pointer, PARQUET_DIR / "CURRENT")
+
+    old = sorted(p for p in PARQUET_DIR.iterdir() if p.is_dir() and p != snapshot_dir)
+    for path in old[:max(0, len(old) - (SNAPSHOTS_TO_KEEP - 1))]:
+        shutil.rmtree(path, ignore_errors=True)
+    return snapshot_dir
+
+
+def _current_snapshot():
+    pointer = PARQUET_DIR / "CURRENT"
+    if not pointer.exists():
+        return None
+    snapshot_dir = PARQUET_DIR / pointer.read_text().strip()
+    return snapshot_dir if snapshot_dir.is_dir() else None
+
+
+_DUCK = {"con": None, "snapshot": None}
+_DUCK_LOCK = threading.Lock()
+
+
+def _duckdb_cursor():
+    """Cursor DuckDB (uno por llamada: cada cursor es seguro en su propio hilo) sobre el snapshot vigente"""
+    snapshot_dir = _current_snapshot()
+    if snapshot_dir is None:
+        return None
+
+    with _DUCK_LOCK:
+        if _DUCK["con"] is None:
+            import duckdb
+            _DUCK["con"] = duckdb.connect(database=":memory:", config={"threads": DUCKDB_THREADS})
+        if _DUCK["snapshot"] != snapshot_dir:
+            con = _DUCK["con"]
+            for table, spec in _EXPORT_TABLES.items():
+                hive = ", hive_partitioning = true" if spec["partition_by"] else ""
+                hidden = f" EXCLUDE ({', '.join(spec['computed'])})" if spec.get("computed") else ""
+                con.execute(
+                    f"CREATE OR REPLACE VIEW {table} AS "
+                    f"SELECT *{hidden} FROM read_parquet('{snapshot_dir / table}/**/*.parquet'{hive})"
+                )
+            _DUCK["snapshot"] = snapshot_dir
+            print(f"🦆 DuckDB apuntando al snapshot {snapshot_dir.name}")
+        return _DUCK["con"].cursor()
+
+
+# :nombre (SQLAlchemy) → $nombre (DuckDB); no toca los casts ::tipo
+_NAMED_PARAM = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+_OVERRIDES = {}
+
+
+def set_route(endpoint: str, backend: str = None):
+    """Fuerza 'duckdb' o 'postgres' para un endpoint (None restaura la config). Usado por el benchmark."""
+    if backend is None:
+        _OVERRIDES.pop(endpoint, None)
+    else:
+        _OVERRIDES[endpoint] = backend
+
+
+def routes_to_duckdb(endpoint: str) -> bool:
+    backend = _OVERRIDES.get(endpoint)
+    if backend is not None:
+        return backend == "duckdb"
+    return endpoint in DUCKDB_ENDPOINTS
+
+
+def run_analytical(session, endpoint: str, sql: str, params: dict = None) -> list:
+    """Ejecuta un agregado en DuckDB o Postgres según la ruta del endpoint. Devuelve tuplas."""
+    params = params or {}
+    if routes_to_duckdb(endpoint):
+        try:
+            cursor = _duckdb_cursor()
+            if cursor is not None:
+                used = {name: params[name] for name in _NAMED_PARAM.findall(sql) if name in params}
+                start = time.perf_counter()
+                rows = cursor.execute(_NAMED_PARAM.sub(r"$\1", sql), used).fetchall()
+                print(f"🦆 {endpoint}: {len(rows)} filas en {(time.perf_counter() - start) * 1000:.0f} ms")
+                return rows
+        except Exception as e:
+            print(f"⚠️ DuckDB falló en {endpoint}, usando Postgres: {e}")
+    return session.execute(text(sql), params).fetchall()
@@ -0,0 +1,246 @@
+"""
+Índice espacial en memoria por ciudad para clustering de propiedades en el mapa
+
+Replica la idea de supercluster en el servidor: los puntos se proyectan a
+Web Mercator normalizado (0..1) y se agrupan en celdas de CLUSTER_RADIUS_PX
+píxeles al zoom pedido. Si una vista genera más de CLUSTER_MAX_FEATURES
+celdas, se duplica el tamaño de celda hasta quedar por debajo del límite, así
+la respuesta queda acotada a cualquier zoom.
+
+El índice se carga una vez por ciudad y después se refresca incrementalmente
+con las filas cuyo last_update >= al último visto. Cada
+CLUSTER_INDEX_RECONCILE_SECONDS se cruzan los ids contra la tabla para sacar
+las propiedades borradas o que cambiaron de ciudad.
+"""
+import os
+import math
+import time
+import threading
+from datetime import date
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from services.property_filters import property_type_mask
+
+REFRESH_SECONDS = int(os.getenv("CLUSTER_INDEX_REFRESH_SECONDS", "300"))
+RECONCILE_SECONDS = int(os.getenv("CLUSTER_INDEX_RECONCILE_SECONDS", "3600"))
+MAX_FEATURES = int(os.getenv("CLUSTER_MAX_FEATURES", "3000"))
+CLUSTER_RADIUS_PX = int(os.getenv("CLUSTER_RADIUS_PX", "60"))
+TILE_SIZE = 256
+MAX_ZOOM = 20
+
+_OFFER_CODES = {"sell": 1, "rent": 2}
+
+
+def _project(lat, lng):
+    """lat/lng → Web Mercator normalizado (x, y en 0..1)"""
+    x = lng / 360.0 + 0.5
+    sin_lat = np.sin(np.radians(np.clip(lat, -85.05112878, 85.05112878)))
+    y = 0.5 - 0.25 * np.log((1 + sin_lat) / (1 - sin_lat)) / math.pi
+    return x, y
+
+
+class CityClusterIndex:
+    """Puntos de una ciudad en arrays NumPy, refrescables por watermark"""
+
+    def __init__(self, city_id: int):
+        self.city_id = city_id
+        self.rows = {}            # fr_property_id -> (lat, lng, price, area, offer, type_mask, last_update)
+        self.watermark = None     # mayor last_update visto
+        self.refreshed_at = 0.0
+        self.reconciled_at = 0.0
+        self.lock = threading.Lock()
+        self._arrays = None
+
+    def refresh(self, session):
+        """Carga completa la primera vez; después solo filas con last_update >= watermark"""
+        params = {"city_id": self.city_id}
+        watermark_filter = ""
+        if self.watermark is not None:
+            # >= y no >: un mismo día puede recibir más filas después del último refresh
+            watermark_filter = "AND last_update >= :watermark"
+            params["watermark"] = self.watermark
+
+        query = text(f"""
+            SELECT fr_property_id, latitude, longitude, price, area, offer, title, last_update
+            FROM property
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+                AND city_id = :city_id
+                {watermark_filter}
+        """)
+        rows = session.execute(query, params).fetchall()
+
+        for fr_id, lat, lng, price, area, offer, title, last_update in rows:
+            self.rows[fr_id] = (
+                float(lat), float(lng),
+                float(price) if price else 0.0,
+                float(area) if area else 0.0,
+                _OFFER_CODES.get(offer, 0),
+                property_type_mask(title),
+                last_update.toordinal() if last_update else 0,
+            )
+            if last_update and (self.watermark is None or last_update > self.watermark):
+                self.watermark = last_update
+
+        removed = 0
+        if self.watermark is not None and time.time() - self.reconciled_at > RECONCILE_SECONDS:
+            removed = self.reconcile(session)
+
+        if rows or removed:
+            self._arrays = None  # se reconstruye perezosamente en la próxima consulta
+        self.refreshed_at = time.time()
+        return len(rows)
+
+    def reconcile(self, session) -> int:
+        """Saca del índice los ids que ya no están en la ciudad (borrados o movidos)"""
+        present = {row[0] for row in session.execute(text("""
+            SELECT fr_property_id FROM property
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND city_id = :city_id
+        """), {"city_id": self.city_id}).fetchall()}
+        stale = [fr_id for fr_id in self.rows if fr_id not in present]
+        for fr_id in stale:
+            del self.rows[fr_id]
+        self.reconciled_at = time.time()
+        return len(stale)
+
+    def _build_arrays(self):
+        if self._arrays is None:
+            ids = np.fromiter(self.rows.keys(), dtype=np.int64, count=len(self.rows))
+            data = np.array(list(self.rows.values()), dtype=np.float64).reshape(-1, 7)
+            lat, lng = data[:, 0], data[:, 1]
+            x, y = _project(lat, lng)
+            self._arrays = {
+                "id": ids, "lat": lat, "lng": lng, "x": x, "y": y,
+                "price": data[:, 2], "area": data[:, 3],
+                "offer": data[:, 4].astype(np.int8),
+                "type_mask": data[:, 5].astype(np.int64),
+                "last_update": data[:, 6].astype(np.int64),
+            }
+        return self._arrays
+
+    def clusters(self, zoom: int, north=None, south=None, east=None, west=None,
+                 type_mask: int = 0, date_from: Optional[date] = None,
+                 date_to: Optional[date] = None, ids=None):
+        """Clusters (conteo, centroide y resumen de precios) para un zoom y vista.
+
+        ids: si viene, solo esos fr_property_id (filtros que se resuelven en SQL)
+        """
+        with self.lock:
+            arr = self._build_arrays()
+
+        mask = np.ones(len(arr["id"]), dtype=bool)
+        if all(v is not None for v in (north, south, east, west)):
+            mask &= (arr["lat"] <= north) & (arr["lat"] >= south)
+            mask &= (arr["lng"] <= east) & (arr["lng"] >= west)
+        if type_mask:
+            mask &= (arr["type_mask"] & type_mask) != 0
+        if ids is not None:
+            mask &= np.isin(arr["id"], np.fromiter(ids, dtype=np.int64))
+        if date_from:
+            mask &= arr["last_update"] >= date_from.toordinal()
+        if date_to:
+            mask &= (arr["last_update"] > 0) & (arr["last_update"] <= date_to.toordinal())
+
+        idx = np.nonzero(mask)[0]
+        zoom = max(0, min(int(zoom), MAX_ZOOM))
+        if len(idx) == 0:
+            return [], {"total": 0, "for_sale": 0, "for_rent": 0}, zoom
+
+        x, y = arr["x"][idx], arr["y"][idx]
+        cell = CLUSTER_RADIUS_PX / (TILE_SIZE * 2 ** zoom)
+        effective_zoom = zoom
+        while True:
+            cells_per_axis = int(1 / cell) + 1
+            keys = np.floor(x / cell).astype(np.int64) * cells_per_axis + np.floor(y / cell).astype(np.int64)
+            _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+            if len(first) <= MAX_FEATURES or effective_zoom == 0:
+                break
+            cell *= 2
+            effective_zoom -= 1
+
+        n = len(first)
+        offer = arr["offer"][idx]
+        price = arr["price"][idx]
+        area = arr["area"][idx]
+        valid_m2 = (price > 0) & (area > 0)
+        price_m2 = np.where(valid_m2, price / np.where(area > 0, area, 1), 0.0)
+        is_sell = offer == 1
+        is_rent = offer == 2
+
+        count = np.bincount(inverse, minlength=n)
+        sum_lat = np.bincount(inverse, weights=arr["lat"][idx], minlength=n)
+        sum_lng = np.bincount(inverse, weights=arr["lng"][idx], minlength=n)
+        sale_count = np.bincount(inverse, weights=is_sell, minlength=n)
+        rent_count = np.bincount(inverse, weights=is_rent, minlength=n)
+        sale_m2_sum = np.bincount(inverse, weights=price_m2 * (is_sell & valid_m2), minlength=n)
+        sale_m2_n = np.bincount(inverse, weights=is_sell & valid_m2, minlength=n)
+        rent_m2_sum = np.bincount(inverse, weights=price_m2 * (is_rent & valid_m2), minlength=n)
+        rent_m2_n = np.bincount(inverse, weights=is_rent & valid_m2, minlength=n)
+        min_price = np.full(n, np.inf)
+        max_price = np.zeros(n)
+        priced = price > 0
+        np.minimum.at(min_price, inverse[priced], price[priced])
+        np.maximum.at(max_price, inverse[priced], price[priced])
+
+        features = []
+        for c in range(n):
+            if count[c] == 1:
+                i = idx[first[c]]
+                features.append({
+                    'type': 'point',
+                    'id': int(arr["id"][i]),
+                    'latitude': float(arr["lat"][i]),
+                    'longitude': float(arr["lng"][i]),
+                    'count': 1,
+                    'price': float(arr["price"][i]) or None,
+                    'area': float(arr["area"][i]) or None,
+                    'offer': 'sell' if arr["offer"][i] == 1 else 'rent' if arr["offer"][i] == 2 else None
+                })
+                continue
+            features.append({
+                'type': 'cluster',
+                'latitude': float(sum_lat[c] / count[c]),
+                'longitude': float(sum_lng[c] / count[c]),
+                'count': int(count[c]),
+                'sale_count': int(sale_count[c]),
+                'rent_count': int(rent_count[c]),
+                'avg_sale_price_m2': round(float(sale_m2_sum[c] / sale_m2_n[c]), 2) if sale_m2_n[c] else 0,
+                'avg_rent_price_m2': round(float(rent_m2_sum[c] / rent_m2_n[c]), 2) if rent_m2_n[c] else 0,
+                'min_price': float(min_price[c]) if np.isfinite(min_price[c]) else None,
+                'max_price': float(max_price[c]) or None,
+                'expansion_zoom': min(effective_zoom + 1, MAX_ZOOM)
+            })
+
+        summary = {
+            'total': int(len(idx)),
+            'for_sale': int(is_sell.sum()),
+            'for_rent': int(is_rent.sum())
+        }
+        return features, summary, effective_zoom
+
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_city_index(session, city_id: int) -> CityClusterIndex:
+    """Índice de la ciudad, refrescado si pasó REFRESH_SECONDS.
+
+    Siempre por ciudad: un índice global cargaría la tabla entera en cada proceso.
+    """
+    if not city_id:
+        raise ValueError("El índice de clusters requiere city_id")
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(city_id)
+        if index is None:
+            index = _INDEXES[city_id] = CityClusterIndex(city_id)
+
+    if time.time() - index.refreshed_at > REFRESH_SECONDS:
+        with index.lock:
+            # Otro request pudo refrescarlo mientras esperábamos el lock
+            if time.time() - index.refreshed_at > REFRESH_SECONDS:
+                added = index.refresh(session)
+                print(f"🗺️ Índice de clusters ciudad={city_id}: {added} filas nuevas/actualizadas, {len(index.rows)} total")
+    return index
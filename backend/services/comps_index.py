@@ -0,0 +1,273 @@
+"""
+Índice en memoria de comparables (comps) por ciudad para el avalúo
+
+Cada ciudad guarda sus publicaciones activas (last_update dentro de
+COMPS_ACTIVE_DAYS) en arrays NumPy. Para un inmueble sujeto se calcula una
+distancia ponderada sobre features normalizadas:
+
+- location:      distancia en metros / COMPS_LOCATION_SCALE_M
+- area:          |log(área / área sujeto)| / COMPS_AREA_LOG_SCALE (0.25 ≈ 28% más o menos)
+- rooms, baths, stratum: diferencia absoluta (1 = una unidad)
+- property_type: 0 si coincide el código de classify_property_type, 1 si no
+
+Los valores faltantes cuentan como diferencia 1. similarity = exp(-distancia).
+Igual que el índice de clusters, la carga es completa la primera vez y después
+incremental por watermark de last_update cada COMPS_INDEX_REFRESH_SECONDS; cada
+COMPS_INDEX_RECONCILE_SECONDS se cruzan los ids contra la tabla para sacar las
+publicaciones borradas, movidas de ciudad o que dejaron de ser comparables.
+"""
+import os
+import re
+import math
+import time
+import threading
+from datetime import date, timedelta
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from services.property_filters import classify_property_type
+from services.stats_service import get_local_now
+
+REFRESH_SECONDS = int(os.getenv("COMPS_INDEX_REFRESH_SECONDS", "300"))
+RECONCILE_SECONDS = int(os.getenv("COMPS_INDEX_RECONCILE_SECONDS", "3600"))
+ACTIVE_DAYS = int(os.getenv("COMPS_ACTIVE_DAYS", "90"))
+MAX_RADIUS_M = float(os.getenv("COMPS_MAX_RADIUS_M", "5000"))
+LOCATION_SCALE_M = float(os.getenv("COMPS_LOCATION_SCALE_M", "1000"))
+AREA_LOG_SCALE = float(os.getenv("COMPS_AREA_LOG_SCALE", "0.25"))
+MAX_K = 100
+
+DEFAULT_WEIGHTS = {
+    "location": 1.0,
+    "area": 1.0,
+    "rooms": 0.5,
+    "baths": 0.3,
+    "stratum": 0.8,
+    "property_type": 2.0,
+}
+
+_OFFER_CODES = {"sell": 1, "rent": 2}
+# Publicaciones que pueden ser comps (lo usan la carga y la reconciliación)
+_COMPARABLE = """
+    city_id = :city_id
+    AND latitude IS NOT NULL AND longitude IS NOT NULL
+    AND area > 0 AND price > 0
+    AND last_update >= :since
+"""
+_EARTH_M_PER_DEGREE = 111_320.0
+# lat, lon, area, rooms, baths, stratum, property_type, offer, price, last_update
+_COLUMNS = 10
+
+
+def _number(value) -> float:
+    """int/float/'Estrato 4' → float; NaN si no hay número"""
+    if value is None:
+        return math.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    m = re.search(r"\d+", str(value))
+    return float(m.group()) if m else math.nan
+
+
+class CityCompsIndex:
+    """Publicaciones activas de una ciudad en arrays NumPy, refrescables por watermark"""
+
+    def __init__(self, city_id: int):
+        self.city_id = city_id
+        self.rows = {}            # fr_property_id -> (tupla de _COLUMNS, location_main)
+        self.watermark = None     # mayor last_update visto
+        self.refreshed_at = 0.0
+        self.reconciled_at = 0.0
+        self.lock = threading.Lock()
+        self._arrays = None
+
+    def refresh(self, session) -> int:
+        """Carga completa la primera vez; después solo filas con last_update >= watermark"""
+        active_since = get_local_now().date() - timedelta(days=ACTIVE_DAYS)
+        params = {"city_id": self.city_id, "since": active_since}
+        first_load = self.watermark is None
+        if self.watermark is not None and self.watermark > active_since:
+            # >= y no >: un mismo día puede recibir más filas después del último refresh
+            params["since"] = self.watermark
+
+        rows = session.execute(text(f"""
+            SELECT fr_property_id, latitude, longitude, area, rooms, baths, stratum,
+                   title, offer, price, last_update, location_main
+            FROM property
+            WHERE {_COMPARABLE}
+        """), params).fetchall()
+
+        for (fr_id, lat, lng, area, rooms, baths, stratum, title, offer,
+             price, last_update, location_main) in rows:
+            self.rows[fr_id] = ((
+                float(lat), float(lng), float(area),
+                _number(rooms), _number(baths), _number(stratum),
+                classify_property_type(title), _OFFER_CODES.get(offer, 0),
+                float(price), last_update.toordinal()
+            ), location_main)
+            if self.watermark is None or last_update > self.watermark:
+                self.watermark = last_update
+
+        # Las que salieron de la ventana activa ya no son comparables
+        cutoff = active_since.toordinal()
+        expired = [fr_id for fr_id, (values, _) in self.rows.items() if values[9] < cutoff]
+        for fr_id in expired:
+            del self.rows[fr_id]
+
+        removed = 0
+        if first_load:
+            self.reconciled_at = time.time()  # la carga completa ya es una foto exacta
+        elif time.time() - self.reconciled_at > RECONCILE_SECONDS:
+            removed = self.reconcile(session, active_since)
+
+        if rows or expired or removed:
+            self._arrays = None  # se reconstruye perezosamente en la próxima consulta
+        self.refreshed_at = time.time()
+        return len(rows)
+
+    def reconcile(self, session, active_since: date) -> int:
+        """Saca del índice los ids que ya no cumplen el filtro (borrados, movidos, sin precio/área...)"""
+        present = {row[0] for row in session.execute(text(f"""
+            SELECT fr_property_id FROM property WHERE {_COMPARABLE}
+        """), {"city_id": self.city_id, "since": active_since}).fetchall()}
+        stale = [fr_id for fr_id in self.rows if fr_id not in present]
+        for fr_id in stale:
+            del self.rows[fr_id]
+        self.reconciled_at = time.time()
+        return len(stale)
+
+    def _build_arrays(self):
+        if self._arrays is None:
+            ids = np.fromiter(self.rows.keys(), dtype=np.int64, count=len(self.rows))
+            data = np.array([values for values, _ in self.rows.values()], dtype=np.float64).reshape(-1, _COLUMNS)
+            self._arrays = {
+                "id": ids, "lat": data[:, 0], "lng": data[:, 1], "area": data[:, 2],
+                "rooms": data[:, 3], "baths": data[:, 4], "stratum": data[:, 5],
+                "property_type": data[:, 6].astype(np.int8),
+                "offer": data[:, 7].astype(np.int8),
+                "price": data[:, 8],
+                "last_update": data[:, 9].astype(np.int64),
+                "location_main": [location_main for _, location_main in self.rows.values()],
+            }
+        return self._arrays
+
+    def nearest(self, subject: dict, offer: str, weights: dict, k: int, max_radius_m: float,
+                exclude_id: Optional[int] = None) -> tuple:
+        """(candidatos dentro de max_radius_m, [(distancia, fila)] de los k más parecidos)"""
+        with self.lock:
+            arr = self._build_arrays()
+        if len(arr["id"]) == 0:
+            return 0, []
+
+        lat0, lng0 = subject["latitude"], subject["longitude"]
+        cos_lat = max(math.cos(math.radians(lat0)), 1e-6)
+        dy = (arr["lat"] - lat0) * _EARTH_M_PER_DEGREE
+        dx = (arr["lng"] - lng0) * _EARTH_M_PER_DEGREE * cos_lat
+        meters = np.sqrt(dx * dx + dy * dy)
+
+        mask = (arr["offer"] == _OFFER_CODES.get(offer, 0)) & (meters <= max_radius_m)
+        if exclude_id is not None:
+            mask &= arr["id"] != exclude_id
+        idx = np.nonzero(mask)[0]
+        if len(idx) == 0:
+            return 0, []
+
+        def unit_diff(column):
+            diff = np.abs(arr[column][idx] - subject[column])
+            return np.where(np.isnan(diff), 1.0, diff)
+
+        components = {
+            "location": meters[idx] / LOCATION_SCALE_M,
+            "area": np.abs(np.log(arr["area"][idx] / subject["area"])) / AREA_LOG_SCALE,
+            "rooms": unit_diff("rooms"),
+            "baths": unit_diff("baths"),
+            "stratum": unit_diff("stratum"),
+            "property_type": (arr["property_type"][idx] != subject["property_type"]).astype(np.float64),
+        }
+        squared = sum(weights[name] * components[name] ** 2 for name in components)
+        distance = np.sqrt(squared)
+
+        # Solo los k mejores pasan a dict: el resto se descarta en NumPy
+        top = np.argpartition(distance, k - 1)[:k] if len(idx) > k else np.arange(len(idx))
+        return len(idx), [
+            (float(distance[j]), {
+                "fr_property_id": int(arr["id"][i]),
+                "latitude": float(arr["lat"][i]),
+                "longitude": float(arr["lng"][i]),
+                "distance_m": int(round(meters[i])),
+                "area": float(arr["area"][i]),
+                "rooms": None if np.isnan(arr["rooms"][i]) else int(arr["rooms"][i]),
+                "baths": None if np.isnan(arr["baths"][i]) else int(arr["baths"][i]),
+                "stratum": None if np.isnan(arr["stratum"][i]) else int(arr["stratum"][i]),
+                "property_type": int(arr["property_type"][i]),
+                "location_main": arr["location_main"][i],
+                "price": float(arr["price"][i]),
+                "price_per_sqm": round(float(arr["price"][i] / arr["area"][i]), 2),
+                "last_update": date.fromordinal(int(arr["last_update"][i])).isoformat(),
+                "finca_raiz_link": f"https://www.fincaraiz.com.co/inmueble/{int(arr['id'][i])}",
+            })
+            for j, i in zip(top.tolist(), idx[top].tolist())
+        ]
+
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_comps_index(session, city_id: int) -> CityCompsIndex:
+    """Índice de comps de la ciudad, refrescado si pasó REFRESH_SECONDS"""
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(city_id)
+        if index is None:
+            index = _INDEXES[city_id] = CityCompsIndex(city_id)
+
+    if time.time() - index.refreshed_at > REFRESH_SECONDS:
+        with index.lock:
+            # Otro request pudo refrescarlo mientras esperábamos el lock
+            if time.time() - index.refreshed_at > REFRESH_SECONDS:
+                added = index.refresh(session)
+                print(f"🏘️ Índice de comps ciudad={city_id}: {added} filas nuevas/actualizadas, {len(index.rows)} activas")
+    return index
+
+
+def find_comps(session, city_ids, subject: dict, offer: str = "sell", k: int = 10,
+               weights: Optional[dict] = None, max_radius_m: float = MAX_RADIUS_M,
+               exclude_id: Optional[int] = None) -> dict:
+    """Los k comparables más parecidos al sujeto entre las ciudades dadas + resumen de precio/m²"""
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    subject = {
+        **subject,
+        "area": float(subject["area"]),
+        "rooms": _number(subject.get("rooms")),
+        "baths": _number(subject.get("baths")),
+        "stratum": _number(subject.get("stratum")),
+        "property_type": int(subject.get("property_type") or 0),
+    }
+    k = max(1, min(int(k), MAX_K))
+
+    scored, candidates = [], 0
+    for city_id in city_ids:
+        index = get_comps_index(session, city_id)
+        found, nearest = index.nearest(subject, offer, weights, k, max_radius_m, exclude_id)
+        candidates += found
+        scored.extend(nearest)
+
+    scored.sort(key=lambda item: item[0])
+    comps = []
+    for distance, row in scored[:k]:
+        row["similarity"] = round(math.exp(-distance), 4)
+        comps.append(row)
+
+    price_m2 = np.array([row["price_per_sqm"] for row in comps])
+    similarity = np.array([row["similarity"] for row in comps])
+    summary = {
+        "count": len(comps),
+        "candidates": candidates,
+        "median_price_per_sqm": round(float(np.median(price_m2)), 2) if len(comps) else None,
+        "weighted_price_per_sqm": (
+            round(float(np.average(price_m2, weights=similarity)), 2)
+            if len(comps) and similarity.sum() > 0 else None
+        ),
+    }
+    return {"comps": comps, "summary": summary, "weights": weights}
@@ -0,0 +1,107 @@
+"""
+Snapshots en memoria refrescados en segundo plano (stale-while-revalidate)
+
+Las pantallas de monitoreo hacen polling constante de /api/dashboard y
+/api/summary. En vez de recalcular todo en cada request, una tarea de fondo
+reconstruye el payload cada N segundos y los requests reciben el último
+snapshot bueno al instante, con su antigüedad. Los refrescos concurrentes se
+unen en uno solo, y si un refresco falla se sigue sirviendo el anterior.
+"""
+import os
+import time
+import asyncio
+from typing import Any, Callable, Optional
+
+DASHBOARD_SNAPSHOT_SECONDS = float(os.getenv("DASHBOARD_SNAPSHOT_SECONDS", "15"))
+
+
+class SnapshotService:
+    """Mantiene el último payload bueno de `builder` (función síncrona o async que puede lanzar)"""
+
+    def __init__(self, name: str, builder: Callable[[], Any], interval: float = DASHBOARD_SNAPSHOT_SECONDS):
+        self.name = name
+        self.builder = builder
+        self.interval = interval
+        self.payload: Optional[dict] = None
+        self.built_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._inflight: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    async def _build(self) -> dict:
+        if asyncio.iscoroutinefunction(self.builder):
+            return await self.builder()
+        # El builder hace I/O bloqueante a la BD: fuera del event loop
+        return await asyncio.to_thread(self.builder)
+
+    async def refresh(self):
+        """Reconstruye el snapshot; si ya hay un refresco en curso, espera ese mismo"""
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._rebuild())
+        await asyncio.shield(self._inflight)
+
+    async def _rebuild(self):
+        start = time.time()
+        try:
+            payload = await self._build()
+            self.payload = payload
+            self.built_at = time.time()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"⚠️ Snapshot {self.name}: refresco falló en {time.time() - start:.1f}s, se mantiene el anterior: {e}")
+        finally:
+            self._inflight = None
+
+    async def get(self) -> dict:
+        """Último snapshot (construyéndolo si aún no existe) con su antigüedad"""
+        if not self.enabled:
+            try:
+                return await self._build()
+            except Exception as e:
+                print(f"❌ Snapshot {self.name}: {e}")
+                return {"status": "error", "detail": f"Error: {e}"}
+
+        if self.payload is None:
+            await self.refresh()
+        if self.payload is None:
+            return {"status": "error", "detail": f"Error: {self.last_error}"}
+
+        age = time.time() - self.built_at
+        # Si la tarea de fondo se atrasó, el request dispara el refresco pero no lo espera
+        if age > 2 * self.interval and self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._rebuild())
+
+        return {
+            **self.payload,
+            "snapshot_age_seconds": round(age, 1),
+            "snapshot_error": self.last_error
+        }
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Arranca la tarea de fondo (llamar desde el startup de la app)"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+
+_SERVICES = []
+
+
+def register_snapshot(name: str, builder: Callable[[], Any]) -> SnapshotService:
+    service = SnapshotService(name, builder)
+    _SERVICES.append(service)
+    return service
+
+
+def start_all():
+    for service in _SERVICES:
+        service.start()
@@ -0,0 +1,131 @@
+"""
+Broadcaster de eventos del scraper (Postgres LISTEN/NOTIFY → clientes SSE)
+
+Un único hilo escucha el canal scraper_events con una conexión psycopg2
+dedicada (ver migrations/add_scraper_event_notify.sql) y reparte cada evento
+a todos los clientes conectados. Los logs llegan agrupados por sentencia
+(type "logs") y se reparten como eventos "log" individuales. Cada cliente tiene una cola acotada: si un
+cliente lento la llena, se descarta su evento más viejo en vez de frenar al
+resto o crecer sin límite.
+"""
+import os
+import json
+import time
+import select
+import asyncio
+import threading
+from typing import Optional
+
+import psycopg2
+
+from config.db_connection import get_database_url
+
+CHANNEL = "scraper_events"
+CLIENT_QUEUE_SIZE = int(os.getenv("SSE_CLIENT_QUEUE_SIZE", "200"))
+MAX_CLIENTS = int(os.getenv("SSE_MAX_CLIENTS", "200"))
+_POLL_SECONDS = 5
+_RECONNECT_MAX_SECONDS = 30
+
+
+class EventBroadcaster:
+    """Fan-out de un listener de BD a N colas asyncio por cliente"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.connected = False
+        self.events_received = 0
+        self.events_dropped = 0
+        self.events_omitted = 0
+
+    @property
+    def client_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Optional[asyncio.Queue]:
+        """Cola del nuevo cliente (None si se alcanzó SSE_MAX_CLIENTS). Arranca el listener si hace falta."""
+        if len(self._subscribers) >= MAX_CLIENTS:
+            return None
+        self._ensure_listener()
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def _fanout(self, event: dict):
+        """Corre en el event loop: reparte un evento a todas las colas"""
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+                self.events_dropped += 1
+            queue.put_nowait(event)
+
+    def _expand(self, event: dict) -> list:
+        """Un NOTIFY de logs agrupados → un evento "log" por fila incluida"""
+        if event.get("type") != "logs":
+            return [event]
+        self.events_omitted += event.get("omitted", 0)
+        return [{"type": "log", **row} for row in event.get("logs") or []]
+
+    def _ensure_listener(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen_forever, name="scraper-events-listener", daemon=True)
+        self._thread.start()
+
+    def _listen_forever(self):
+        backoff = 1
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(get_database_url())
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL};")
+                self.connected = True
+                backoff = 1
+                print(f"📡 Escuchando {CHANNEL} en Postgres")
+
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], _POLL_SECONDS) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            event = json.loads(notify.payload)
+                        except ValueError:
+                            continue
+                        for item in self._expand(event):
+                            self.events_received += 1
+                            self._loop.call_soon_threadsafe(self._fanout, item)
+            except Exception as e:
+                self.connected = False
+                print(f"⚠️ Listener de {CHANNEL} caído, reintentando en {backoff}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, _RECONNECT_MAX_SECONDS)
+            finally:
+                self.connected = False
+                if conn is not None:
+                    conn.close()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            "clients": self.client_count,
+            "listener_connected": self.connected,
+            "events_received": self.events_received,
+            "events_dropped": self.events_dropped,
+            "events_omitted": self.events_omitted
+        }
+
+
+broadcaster = EventBroadcaster()
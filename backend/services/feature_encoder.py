@@ -0,0 +1,61 @@
+"""
+Codificador de features precompilado para los modelos LightGBM del avalúo
+
+Booster.predict(DataFrame) rehace en cada llamada lo mismo: DataFrame, cast a
+Categorical, set_categories con las categorías de entrenamiento y conversión
+a float. Para una fila eso cuesta más que recorrer los árboles. El encoder
+toma el orden de features y `pandas_categorical` del Booster una sola vez
+(al cargar el modelo) y escribe directo en un array NumPy: numéricas como
+float, categóricas como su código de entrenamiento y NaN si la categoría no
+existía, que es exactamente lo que hace LightGBM por dentro.
+"""
+import threading
+
+import numpy as np
+
+
+class FeatureEncoder:
+    """dict de features → fila float64 en el orden del modelo"""
+
+    def __init__(self, features: list, categorical_features: list, pandas_categorical: list):
+        self.features = list(features)
+        self.n_features = len(self.features)
+        # LightGBM guarda las categorías en el orden en que aparecen las columnas categóricas
+        categorical_in_order = [f for f in self.features if f in set(categorical_features)]
+        if len(categorical_in_order) != len(pandas_categorical or []):
+            raise ValueError(
+                f"El modelo tiene {len(pandas_categorical or [])} columnas categóricas, "
+                f"se esperaban {len(categorical_in_order)}: {categorical_in_order}"
+            )
+        self.codes = {
+            name: {str(category): float(code) for code, category in enumerate(categories)}
+            for name, categories in zip(categorical_in_order, pandas_categorical or [])
+        }
+        self.slots = [(i, name, self.codes.get(name)) for i, name in enumerate(self.features)]
+        self._local = threading.local()
+
+    @classmethod
+    def from_booster(cls, booster, features: list, categorical_features: list) -> "FeatureEncoder":
+        return cls(features, categorical_features, booster.pandas_categorical)
+
+    def _fill(self, out, data: dict):
+        for i, name, codes in self.slots:
+            value = data.get(name)
+            if codes is not None:
+                out[i] = codes.get(str(value), np.nan)
+            else:
+                out[i] = np.nan if value is None else float(value)
+
+    def encode_row(self, data: dict) -> np.ndarray:
+        """Fila (1, n_features) reutilizando un buffer por hilo: no guardar la referencia"""
+        row = getattr(self._local, "row", None)
+        if row is None:
+            row = self._local.row = np.empty((1, self.n_features), dtype=np.float64)
+        self._fill(row[0], data)
+        return row
+
+    def encode_rows(self, rows: list) -> np.ndarray:
+        matrix = np.empty((len(rows), self.n_features), dtype=np.float64)
+        for out, data in zip(matrix, rows):
+            self._fill(out, data)
+        return matrix
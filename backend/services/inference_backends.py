@@ -0,0 +1,164 @@
+"""
+Backends de inferencia para los modelos LightGBM del avalúo
+
+El mismo modelo puede servirse con:
+- native:   lightgbm.Booster sobre el .txt (siempre disponible, respaldo)
+- treelite: librería compartida compilada con treelite/tl2cgen (model_*.so)
+- onnx:     grafo ONNX ejecutado con onnxruntime CPU (model_*.onnx)
+
+Los artefactos compilados se generan con scripts/compile_models.py junto al .txt
+de cada versión. INFERENCE_BACKEND (native | treelite | onnx | auto) elige cuál
+intentar; antes de usar uno compilado se compara contra el Booster en la
+muestra held-out que deja train.py (holdout_<offer>.csv) o, si no existe, en
+filas sintéticas. Si falta la librería, el artefacto o la paridad no da
+(INFERENCE_PARITY_TOLERANCE en escala log1p), se queda el Booster nativo.
+
+Todos reciben la matriz float64 del FeatureEncoder y devuelven log1p(precio/m²).
+"""
+import os
+import csv
+import random
+
+import numpy as np
+
+BACKEND = os.getenv("INFERENCE_BACKEND", "native").lower()
+PARITY_TOLERANCE = float(os.getenv("INFERENCE_PARITY_TOLERANCE", "1e-4"))
+PARITY_SAMPLE = int(os.getenv("INFERENCE_PARITY_SAMPLE", "500"))
+
+
+class NativeBackend:
+    name = "native"
+
+    def __init__(self, booster):
+        self.booster = booster
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.booster.predict(X)
+
+
+class TreeliteBackend:
+    """Modelo compilado a código C por treelite (runtime tl2cgen)"""
+    name = "treelite"
+    suffix = ".so"
+
+    def __init__(self, path: str):
+        import tl2cgen
+        self._tl2cgen = tl2cgen
+        # Un hilo por predict: la concurrencia la pone el pool de inferencia
+        self.predictor = tl2cgen.Predictor(path, nthread=1)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        out = self.predictor.predict(self._tl2cgen.DMatrix(X, dtype="float64"))
+        return np.asarray(out, dtype=np.float64).reshape(len(X))
+
+
+class OnnxBackend:
+    """Grafo ONNX (onnxmltools) ejecutado con onnxruntime. Trabaja en float32."""
+    name = "onnx"
+    suffix = ".onnx"
+
+    def __init__(self, path: str):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        out = self.session.run(None, {self.input_name: X.astype(np.float32)})[0]
+        return np.asarray(out, dtype=np.float64).reshape(len(X))
+
+
+COMPILED_BACKENDS = {"treelite": TreeliteBackend, "onnx": OnnxBackend}
+
+
+def compiled_path(model_path: str, name: str) -> str:
+    """model_rent_lightgbm.txt → model_rent_lightgbm.so / .onnx"""
+    return os.path.splitext(model_path)[0] + COMPILED_BACKENDS[name].suffix
+
+
+def holdout_path(directory: str, offer: str) -> str:
+    return os.path.join(directory, f"holdout_{offer}.csv")
+
+
+def _synthetic_rows(encoder, n: int) -> list:
+    """Filas plausibles cuando la versión no trae holdout (categorías del propio modelo)"""
+    rng = random.Random(42)
+    categories = {name: list(codes) for name, codes in encoder.codes.items()}
+    rows = []
+    for _ in range(n):
+        area = rng.uniform(25, 400)
+        rooms = rng.randint(1, 6)
+        garages = rng.randint(0, 3)
+        row = {
+            "area": area, "rooms": rooms, "baths": rng.randint(1, 5), "garages": garages,
+            "stratum": rng.randint(1, 6), "latitude": rng.uniform(1.0, 11.0),
+            "longitude": rng.uniform(-77.5, -72.5), "antiquity": rng.randint(0, 5),
+            "area_per_room": area / rooms, "has_garage": int(garages > 0),
+            "property_type": rng.randint(0, 9),
+        }
+        for name, values in categories.items():
+            row[name] = rng.choice(values) if values else None
+        rows.append(row)
+    return rows
+
+
+def parity_sample(directory: str, offer: str, encoder) -> tuple:
+    """(matriz codificada, origen): holdout de train.py o filas sintéticas"""
+    path = holdout_path(directory, offer)
+    if os.path.exists(path):
+        with open(path, newline="") as f:
+            rows = [row for _, row in zip(range(PARITY_SAMPLE), csv.DictReader(f))]
+        if rows:
+            return encoder.encode_rows(rows), "holdout"
+    return encoder.encode_rows(_synthetic_rows(encoder, PARITY_SAMPLE)), "synthetic"
+
+
+def check_parity(backend, booster, X: np.ndarray) -> dict:
+    expected = booster.predict(X)
+    diff = np.abs(backend.predict(X) - expected)
+    return {
+        "rows": int(len(X)),
+        "max_abs_diff": float(diff.max()) if len(diff) else 0.0,
+        "rows_over_tolerance": int((diff > PARITY_TOLERANCE).sum()),
+        "tolerance": PARITY_TOLERANCE
+    }
+
+
+def select_backend(booster, model_path: str, encoder, offer: str, directory: str) -> tuple:
+    """(backend, reporte): el primer backend compilado que pase paridad, o el nativo"""
+    native = NativeBackend(booster)
+    if BACKEND == "native":
+        return native, {"backend": "native"}
+    if encoder is None:
+        return native, {"backend": "native", "fallback_reason": "sin encoder (modelo sin pandas_categorical)"}
+
+    candidates = list(COMPILED_BACKENDS) if BACKEND == "auto" else [BACKEND]
+    report = {"backend": "native", "tried": {}}
+    X, source = parity_sample(directory, offer, encoder)
+    report["parity_sample"] = source
+    for name in candidates:
+        if name not in COMPILED_BACKENDS:
+            report["tried"][name] = "backend desconocido"
+            continue
+        path = compiled_path(model_path, name)
+        if not os.path.exists(path):
+            report["tried"][name] = f"no existe {os.path.basename(path)}"
+            continue
+        try:
+            backend = COMPILED_BACKENDS[name](path)
+            parity = check_parity(backend, booster, X)
+        except ImportError as e:
+            report["tried"][name] = f"librería no instalada: {e}"
+            continue
+        except Exception as e:
+            report["tried"][name] = f"error al cargar/predecir: {e}"
+            continue
+        if parity["rows_over_tolerance"]:
+            report["tried"][name] = parity
+            print(f"⚠️ Backend {name} de {offer} descartado: diferencia máxima {parity['max_abs_diff']:.2e}")
+            continue
+        report.update({"backend": name, "parity": parity})
+        print(f"⚡ Modelo de {offer} servido con {name} (paridad {parity['max_abs_diff']:.2e} en {parity['rows']} filas {source})")
+        return backend, report
+    return native, report
@@ -0,0 +1,214 @@
+"""
+Pool de inferencia para los modelos de avalúo (fuera del event loop)
+
+Las predicciones LightGBM (miles de árboles por modelo) son CPU: hechas dentro
+de un endpoint async frenan todas las demás rutas. Aquí los endpoints solo
+encolan (offer, filas) y esperan un Future; INFERENCE_WORKERS hilos toman de
+la cola, juntan las solicitudes que llegan dentro de INFERENCE_BATCH_WAIT_MS
+(hasta INFERENCE_MAX_BATCH filas) y hacen un solo predict por modelo, que luego
+se reparte a cada solicitud. Hilos y no procesos: LightGBM suelta el GIL en
+predict, y así los Boosters se cargan una vez y se comparten.
+
+Con la cola llena submit lanza InferenceQueueFull en vez de crecer sin límite.
+"""
+import os
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "256"))
+BATCH_WAIT_MS = float(os.getenv("INFERENCE_BATCH_WAIT_MS", "2"))
+QUEUE_MAX = int(os.getenv("INFERENCE_QUEUE_MAX", "1000"))
+_LATENCY_SAMPLES = 2048
+
+
+class InferenceQueueFull(Exception):
+    """La cola de inferencia alcanzó INFERENCE_QUEUE_MAX"""
+
+
+class _Job:
+    __slots__ = ("offer", "rows", "bundle", "future", "enqueued_at")
+
+    def __init__(self, offer: str, rows: list, bundle: Optional[dict]):
+        self.offer = offer
+        self.rows = rows
+        self.bundle = bundle
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(int(len(ordered) * q), len(ordered) - 1)], 3)
+
+
+class InferenceExecutor:
+    """
+    Cola + hilos que hacen micro-batching de predicciones.
+    models_provider() → {offer: bundle}; predict_batch(bundle, filas) → array de predicciones.
+    """
+
+    def __init__(self, models_provider: Callable[[], dict], predict_batch: Callable):
+        self._models_provider = models_provider
+        self._predict_batch = predict_batch
+        self._queue = queue.Queue(maxsize=QUEUE_MAX)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.batched_rows = 0
+        self._wait_ms = deque(maxlen=_LATENCY_SAMPLES)
+        self._latency_ms = deque(maxlen=_LATENCY_SAMPLES)
+
+    def _ensure_workers(self):
+        if len(self._threads) == WORKERS and all(t.is_alive() for t in self._threads):
+            return
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            self._stop.clear()
+            while len(self._threads) < WORKERS:
+                thread = threading.Thread(target=self._run, name=f"inference-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, offer: str, rows: list, bundle: Optional[dict] = None) -> Future:
+        """
+        Encola la predicción de `rows` (dicts de features) con el modelo `offer`.
+        Con `bundle` se usa ese modelo exacto (p. ej. la versión que se reporta
+        en la respuesta); sin él, el que entregue models_provider al procesar.
+        """
+        self._ensure_workers()
+        job = _Job(offer, rows, bundle)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self.rejected += 1
+            raise InferenceQueueFull(f"Cola de inferencia llena ({QUEUE_MAX} solicitudes)")
+        self.submitted += 1
+        return job.future
+
+    def predict(self, offer: str, rows: list, bundle: Optional[dict] = None, timeout: Optional[float] = None):
+        """Versión bloqueante de submit (para código que ya corre en un hilo)"""
+        return self.submit(offer, rows, bundle).result(timeout)
+
+    def _collect(self, first: _Job) -> list:
+        """Junta solicitudes que lleguen dentro de la ventana, hasta MAX_BATCH filas"""
+        jobs, rows = [first], len(first.rows)
+        deadline = time.perf_counter() + BATCH_WAIT_MS / 1000
+        while rows < MAX_BATCH:
+            remaining = deadline - time.perf_counter()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            jobs.append(job)
+            rows += len(job.rows)
+        return jobs
+
+    def _run_bundle(self, offer: str, bundle: dict, jobs: list):
+        if bundle.get("model") is None:
+            for job in jobs:
+                job.future.set_exception(RuntimeError(f"Modelo {offer} no disponible"))
+            self.failed += len(jobs)
+            return
+        rows = [row for job in jobs for row in job.rows]
+        try:
+            predictions = self._predict_batch(bundle, rows)
+        except Exception as e:
+            for job in jobs:
+                job.future.set_exception(e)
+            self.failed += len(jobs)
+            return
+
+        done = time.perf_counter()
+        start = 0
+        for job in jobs:
+            end = start + len(job.rows)
+            job.future.set_result(predictions[start:end])
+            self._latency_ms.append((done - job.enqueued_at) * 1000)
+            start = end
+        self.completed += len(jobs)
+        self.batches += 1
+        self.batched_requests += len(jobs)
+        self.batched_rows += len(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            jobs = self._collect(first)
+            picked_at = time.perf_counter()
+
+            running = []
+            for job in jobs:
+                # Cancelada mientras esperaba en la cola (p. ej. el cliente cortó)
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                self._wait_ms.append((picked_at - job.enqueued_at) * 1000)
+                running.append(job)
+            if not running:
+                continue
+
+            models = None
+            if any(job.bundle is None for job in running):
+                try:
+                    models = self._models_provider()
+                except Exception as e:
+                    for job in running:
+                        job.future.set_exception(e)
+                    self.failed += len(running)
+                    continue
+
+            # Un predict por modelo concreto (oferta + versión)
+            groups = {}
+            for job in running:
+                bundle = job.bundle if job.bundle is not None else (models.get(job.offer) or {})
+                groups.setdefault(id(bundle), (job.offer, bundle, []))[2].append(job)
+            for offer, bundle, bundle_jobs in groups.values():
+                self._run_bundle(offer, bundle, bundle_jobs)
+
+    def shutdown(self):
+        """Detiene los hilos; las solicitudes aún en cola fallan (llamar al apagar la app)"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job.future.set_running_or_notify_cancel():
+                job.future.set_exception(RuntimeError("Pool de inferencia detenido"))
+
+    def stats(self) -> dict:
+        wait_ms, latency_ms = list(self._wait_ms), list(self._latency_ms)
+        return {
+            "workers": WORKERS,
+            "workers_alive": sum(1 for t in self._threads if t.is_alive()),
+            "queue_depth": self._queue.qsize(),
+            "queue_max": QUEUE_MAX,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "avg_requests_per_batch": round(self.batched_requests / self.batches, 2) if self.batches else None,
+            "avg_rows_per_batch": round(self.batched_rows / self.batches, 2) if self.batches else None,
+            "queue_wait_ms": {"p50": _percentile(wait_ms, 0.5), "p99": _percentile(wait_ms, 0.99)},
+            "latency_ms": {"p50": _percentile(latency_ms, 0.5), "p99": _percentile(latency_ms, 0.99)},
+            "max_batch": MAX_BATCH,
+            "batch_wait_ms": BATCH_WAIT_MS
+        }
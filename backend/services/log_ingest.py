@@ -0,0 +1,214 @@
+"""
+Ingesta masiva de scraper_logs: cola en memoria + COPY por lotes
+
+Los scrapers mandan lotes a POST /api/ingest/scraper-logs; los registros
+validados entran a una cola acotada y un hilo los vuelca con COPY cada
+INGEST_FLUSH_ROWS filas o INGEST_FLUSH_SECONDS segundos, lo que pase primero.
+El hilo usa su propia conexión (no el pool de SQLModel), así la ingesta no
+le quita conexiones a las lecturas del dashboard. Con la cola llena la API
+responde 503 en vez de crecer sin límite: el scraper reintenta más tarde.
+
+Si un lote falla por datos (p. ej. un timestamp sin partición), se parte en
+mitades hasta aislar las filas malas, que se descartan y se cuentan.
+"""
+import io
+import os
+import csv
+import time
+import threading
+from collections import deque
+from datetime import datetime
+
+import psycopg2
+
+from config.db_connection import get_database_url
+from services.stats_service import get_local_now, COLOMBIA_TZ
+
+FLUSH_ROWS = int(os.getenv("INGEST_FLUSH_ROWS", "5000"))
+FLUSH_SECONDS = float(os.getenv("INGEST_FLUSH_SECONDS", "1"))
+QUEUE_MAX = int(os.getenv("INGEST_QUEUE_MAX", "200000"))
+_RETRY_MAX_SECONDS = 30
+
+COLUMNS = (
+    "timestamp", "scraper_name", "city_code", "offer_type", "page_number",
+    "log_level", "log_type", "message", "execution_time_ms", "properties_found",
+    "properties_validated", "error_type", "session_id", "scheduled_time",
+)
+_COPY_SQL = f"COPY scraper_logs ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+
+
+def _to_csv(rows) -> io.StringIO:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # NULL explícito (\N): así un mensaje vacío llega como cadena vacía y no como NULL
+        writer.writerow(["\\N" if value is None else value for value in row])
+    buffer.seek(0)
+    return buffer
+
+
+class LogIngestBuffer:
+    """Cola acotada de filas (tuplas en el orden de COLUMNS) con un hilo que hace COPY"""
+
+    def __init__(self):
+        self._rows = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._conn = None
+        self.accepted = 0
+        self.flushed = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.last_flush_ms = None
+        self.last_error = None
+
+    def enqueue(self, rows: list) -> bool:
+        """Encola el lote completo o nada (False si no cabe)"""
+        with self._lock:
+            if len(self._rows) + len(rows) > QUEUE_MAX:
+                return False
+            self._rows.extend(rows)
+            self.accepted += len(rows)
+            depth = len(self._rows)
+        self._ensure_thread()
+        if depth >= FLUSH_ROWS:
+            self._wakeup.set()
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stop.clear()
+                    self._thread = threading.Thread(target=self._run, name="log-ingest-flusher", daemon=True)
+                    self._thread.start()
+
+    def _take_batch(self) -> list:
+        with self._lock:
+            count = min(len(self._rows), FLUSH_ROWS)
+            return [self._rows.popleft() for _ in range(count)]
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = psycopg2.connect(get_database_url())
+        return self._conn
+
+    def _copy(self, rows: list):
+        conn = self._connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.copy_expert(_COPY_SQL, _to_csv(rows))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _reject(self, error: Exception):
+        self.rejected += 1
+        self.last_error = str(error).strip()
+        print(f"⚠️ Log descartado en la ingesta: {self.last_error}")
+
+    def flush(self) -> int:
+        """Vuelca un lote; ante errores de datos lo parte en mitades hasta aislar las filas malas.
+
+        Si se cae la conexión a mitad de camino, solo vuelven al frente de la cola las
+        filas que no se confirmaron (los tramos ya escritos no se repiten).
+        """
+        batch = self._take_batch()
+        if not batch:
+            return 0
+        start = time.perf_counter()
+        # Pila de tramos por escribir: el próximo es el último
+        pending = [batch]
+        written = 0
+        try:
+            while pending:
+                rows = pending.pop()
+                try:
+                    self._copy(rows)
+                    written += len(rows)
+                except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                    if len(rows) == 1:
+                        self._reject(e)
+                        continue
+                    mid = len(rows) // 2
+                    pending.extend([rows[mid:], rows[:mid]])
+        except Exception:
+            unwritten = rows + [row for chunk in reversed(pending) for row in chunk]
+            with self._lock:
+                self._rows.extendleft(reversed(unwritten))
+            self.flushed += written
+            if self._conn is not None:
+                self._conn.close()
+            raise
+        self.flushed += written
+        self.flushes += 1
+        self.last_flush_ms = round((time.perf_counter() - start) * 1000, 1)
+        return written
+
+    def _run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            self._wakeup.wait(FLUSH_SECONDS)
+            self._wakeup.clear()
+            try:
+                # Vacía todo lo acumulado antes de volver a dormir
+                while self.flush():
+                    pass
+                backoff = 1
+            except Exception as e:
+                self.last_error = str(e).strip()
+                print(f"⚠️ Flush de ingesta falló, reintentando en {backoff}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, _RETRY_MAX_SECONDS)
+
+    def shutdown(self):
+        """Detiene el hilo y vuelca lo que quede (llamar al apagar la app)"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        try:
+            while self.flush():
+                pass
+        except Exception as e:
+            print(f"⚠️ Quedaron {len(self._rows)} logs sin volcar al apagar: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "accepted": self.accepted,
+            "flushed": self.flushed,
+            "rejected": self.rejected,
+            "queued": len(self._rows),
+            "queue_max": QUEUE_MAX,
+            "flushes": self.flushes,
+            "last_flush_ms": self.last_flush_ms,
+            "last_error": self.last_error,
+            "flush_rows": FLUSH_ROWS,
+            "flush_seconds": FLUSH_SECONDS
+        }
+
+
+log_buffer = LogIngestBuffer()
+
+
+def _local_naive(value: datetime):
+    """scraper_logs usa timestamp sin zona en hora de Colombia: se convierten las fechas con zona"""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(COLOMBIA_TZ).replace(tzinfo=None)
+    return value.isoformat()
+
+
+def as_row(log) -> tuple:
+    """Registro validado (ScraperLogIn) → tupla en el orden de COLUMNS"""
+    return (
+        _local_naive(log.timestamp or get_local_now()),
+        log.scraper_name, log.city_code, log.offer_type, log.page_number,
+        log.log_level.value, log.log_type.value, log.message, log.execution_time_ms,
+        log.properties_found, log.properties_validated, log.error_type,
+        log.session_id, _local_naive(log.scheduled_time),
+    )
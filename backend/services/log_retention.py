@@ -0,0 +1,228 @@
+"""
+Mantenimiento de scraper_logs particionada por mes
+
+- ensure_partitions: crea las particiones de los próximos meses y avisa si hay filas
+  en scraper_logs_default (logs que cayeron fuera de las particiones mensuales).
+- rollup_hourly: agrega los logs por hora/ciudad/oferta/nivel/tipo en
+  scraper_logs_hourly. Recalcula las horas recién cerradas (marca de tiempo) y las
+  horas viejas que recibieron logs nuevos (marca de id), sin importar el atraso. Incluye un histograma
+  de execution_time_ms para sacar percentiles sumando horas (ver scraper_throughput).
+- apply_retention: separa las particiones más viejas que SCRAPER_LOG_RETENTION_MONTHS,
+  las archiva (gzip CSV en SCRAPER_LOG_ARCHIVE_DIR, si está configurado) y las borra.
+  Solo se borra una partición cuyo mes ya está cubierto por el rollup.
+"""
+import os
+import re
+import gzip
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import text
+
+from models.rollup_watermark import RollupWatermark
+from services.stats_service import get_local_now
+
+WATERMARK_NAME = "scraper_logs_hourly"
+RETENTION_MONTHS = int(os.getenv("SCRAPER_LOG_RETENTION_MONTHS", "3"))
+PARTITIONS_AHEAD = int(os.getenv("SCRAPER_LOG_PARTITIONS_AHEAD", "2"))
+ARCHIVE_DIR = os.getenv("SCRAPER_LOG_ARCHIVE_DIR", "")
+# Mayor id de scraper_logs ya visto por el rollup: los logs con id mayor y timestamp
+# de una hora ya cerrada (reencolados o backfill de la ingesta) la hacen recalcular
+ID_WATERMARK_NAME = "scraper_logs_hourly_id"
+
+_PARTITION_NAME = re.compile(r"^scraper_logs_(\d{4})(\d{2})$")
+
+# Límites (ms) del histograma de execution_time_ms: buckets logarítmicos de 20% desde
+# 5 ms hasta ~24 min. El histograma guarda {bucket: logs} y se suma entre horas; cambiar
+# los límites deja incomparables las horas ya agregadas.
+EXECUTION_MS_BOUNDS = [round(5 * 1.2 ** i, 1) for i in range(70)]
+
+
+def ensure_partitions(session, months_ahead: int = PARTITIONS_AHEAD) -> int:
+    """Crea las particiones del mes actual y los siguientes. Devuelve cuántas creó."""
+    created = session.execute(
+        text("SELECT scraper_logs_ensure_partitions(CURRENT_DATE, :ahead)"),
+        {"ahead": months_ahead}
+    ).scalar()
+    session.commit()
+
+    stray = session.execute(text("SELECT COUNT(*) FROM scraper_logs_default")).scalar()
+    if stray:
+        print(f"🚨 scraper_logs_default tiene {stray} logs fuera de las particiones mensuales: "
+              f"revisar que el mantenimiento corra y aumentar SCRAPER_LOG_PARTITIONS_AHEAD")
+    return int(created or 0)
+
+
+def hourly_select(filters: str = "") -> str:
+    """SELECT que agrega scraper_logs en [:since, :until) con las columnas de scraper_logs_hourly.
+
+    Lo usan el rollup y la lectura de las horas que el rollup todavía no cubre.
+    `filters` se agrega al WHERE (p. ej. "AND city_code = :city_code").
+    """
+    return f"""
+        SELECT
+            hour, city_code, offer_type, log_level, log_type,
+            SUM(entries), SUM(execution_ms_sum), SUM(execution_ms_count),
+            SUM(properties_found), SUM(properties_validated),
+            COALESCE(jsonb_object_agg(bucket, execution_ms_count) FILTER (WHERE bucket IS NOT NULL), '{{}}'::jsonb)
+        FROM (
+            SELECT
+                date_trunc('hour', timestamp) AS hour,
+                COALESCE(city_code, '') AS city_code,
+                COALESCE(offer_type, '') AS offer_type,
+                LOWER(log_level::text) AS log_level,
+                LOWER(log_type::text) AS log_type,
+                width_bucket(execution_time_ms, CAST(:bounds AS double precision[])) AS bucket,
+                COUNT(*) AS entries,
+                COALESCE(SUM(execution_time_ms), 0) AS execution_ms_sum,
+                COUNT(execution_time_ms) AS execution_ms_count,
+                COALESCE(SUM(properties_found), 0) AS properties_found,
+                COALESCE(SUM(properties_validated), 0) AS properties_validated
+            FROM scraper_logs
+            WHERE timestamp >= :since AND timestamp < :until {filters}
+            GROUP BY 1, 2, 3, 4, 5, 6
+        ) buckets
+        GROUP BY 1, 2, 3, 4, 5
+    """
+
+
+def histogram_quantile(histogram: dict, q: float) -> Optional[float]:
+    """Cuantil aproximado de un histograma {bucket: logs} de EXECUTION_MS_BOUNDS (interpolado dentro del bucket)"""
+    counts = sorted((int(bucket), n) for bucket, n in histogram.items() if n)
+    total = sum(n for _, n in counts)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for bucket, n in counts:
+        if seen + n >= rank:
+            if bucket >= len(EXECUTION_MS_BOUNDS):
+                return EXECUTION_MS_BOUNDS[-1]
+            low = EXECUTION_MS_BOUNDS[bucket - 1] if bucket > 0 else 0.0
+            high = EXECUTION_MS_BOUNDS[bucket]
+            return low + (high - low) * (rank - seen) / n
+        seen += n
+    return EXECUTION_MS_BOUNDS[-1]
+
+
+def rolled_up_until(session) -> Optional[datetime]:
+    """Primera hora que el rollup aún no cubre (None si nunca corrió)"""
+    watermark = session.get(RollupWatermark, WATERMARK_NAME)
+    return datetime.fromisoformat(watermark.value) if watermark and watermark.value else None
+
+
+def _hour_ranges(hours: list) -> list:
+    """Horas sueltas → [(desde, hasta)] de horas consecutivas"""
+    ranges = []
+    for hour in sorted(hours):
+        if ranges and ranges[-1][1] == hour:
+            ranges[-1] = (ranges[-1][0], hour + timedelta(hours=1))
+        else:
+            ranges.append((hour, hour + timedelta(hours=1)))
+    return ranges
+
+
+def rollup_hourly(session) -> int:
+    """Recalcula las horas recién cerradas y las que recibieron logs con id nuevo. Devuelve horas recalculadas."""
+    until = get_local_now().replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    rolled_until = rolled_up_until(session)
+    id_watermark = session.get(RollupWatermark, ID_WATERMARK_NAME)
+    last_id = int(id_watermark.value) if id_watermark and id_watermark.value else 0
+    # Se fija antes de buscar horas: lo que entre después tiene id mayor y va en la próxima corrida
+    max_id = session.execute(text("SELECT COALESCE(MAX(id), 0) FROM scraper_logs")).scalar()
+
+    if rolled_until is None:
+        since = session.execute(text("SELECT date_trunc('hour', MIN(timestamp)) FROM scraper_logs")).scalar()
+        if since is None:
+            return 0
+        ranges = [(since, until)]
+    else:
+        # Horas ya cerradas que recibieron logs desde la última corrida
+        late_hours = session.execute(text("""
+            SELECT DISTINCT date_trunc('hour', timestamp)
+            FROM scraper_logs
+            WHERE id > :last_id AND id <= :max_id AND timestamp < :rolled_until
+        """), {"last_id": last_id, "max_id": max_id, "rolled_until": rolled_until}).scalars().all()
+        ranges = _hour_ranges(late_hours)
+        if rolled_until < until:
+            ranges.append((rolled_until, until))
+
+    hours = 0
+    for since, range_until in ranges:
+        params = {"since": since, "until": range_until, "bounds": EXECUTION_MS_BOUNDS}
+        # Reemplazo completo de cada hora: reprocesar es idempotente
+        session.execute(text("""
+            DELETE FROM scraper_logs_hourly WHERE hour >= :since AND hour < :until
+        """), params)
+        session.execute(text("""
+            INSERT INTO scraper_logs_hourly (
+                hour, city_code, offer_type, log_level, log_type, entries,
+                execution_time_ms_sum, execution_time_ms_count, properties_found, properties_validated,
+                execution_ms_histogram
+            )
+        """ + hourly_select()), params)
+        hours += int((range_until - since).total_seconds() // 3600)
+
+    for name, value in ((WATERMARK_NAME, max(until, rolled_until or until).isoformat()),
+                        (ID_WATERMARK_NAME, str(max(max_id, last_id)))):
+        watermark = session.get(RollupWatermark, name) or RollupWatermark(name=name)
+        watermark.value = value
+        watermark.updated_at = datetime.utcnow()
+        session.add(watermark)
+    session.commit()
+    return hours
+
+
+def _archive_partition(session, partition: str):
+    """Vuelca la partición a <ARCHIVE_DIR>/<partition>.csv.gz con COPY"""
+    archive_dir = Path(ARCHIVE_DIR)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    target = archive_dir / f"{partition}.csv.gz"
+    cursor = session.connection().connection.cursor()
+    with gzip.open(target, "wb") as f:
+        cursor.copy_expert(f'COPY "{partition}" TO STDOUT WITH (FORMAT csv, HEADER true)', f)
+    cursor.close()
+    return target
+
+
+def apply_retention(session, keep_months: int = RETENTION_MONTHS) -> list:
+    """Archiva y borra las particiones anteriores a keep_months. Devuelve los nombres borrados."""
+    now = get_local_now().replace(tzinfo=None)
+    month_index = now.year * 12 + (now.month - 1) - keep_months
+    cutoff = datetime(month_index // 12, month_index % 12 + 1, 1)
+
+    rolled_until = rolled_up_until(session)
+
+    partitions = session.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'scraper_logs'::regclass
+        ORDER BY c.relname
+    """)).scalars().all()
+
+    dropped = []
+    for partition in partitions:
+        match = _PARTITION_NAME.match(partition)
+        if not match:
+            continue
+        year, month = int(match.group(1)), int(match.group(2))
+        partition_end = datetime(year + month // 12, month % 12 + 1, 1)
+        if partition_end > cutoff:
+            continue
+        if rolled_until is None or rolled_until < partition_end:
+            print(f"⚠️ {partition} aún no está cubierta por el rollup horario, no se borra")
+            continue
+
+        # Se archiva antes de separarla: si el volcado falla, la partición sigue en su lugar
+        if ARCHIVE_DIR:
+            target = _archive_partition(session, partition)
+            print(f"📦 {partition} archivada en {target}")
+        session.execute(text(f'ALTER TABLE scraper_logs DETACH PARTITION "{partition}"'))
+        session.execute(text(f'DROP TABLE "{partition}"'))
+        session.commit()
+        dropped.append(partition)
+        print(f"🗑️ Partición {partition} eliminada")
+    return dropped
+
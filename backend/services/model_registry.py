@@ -0,0 +1,245 @@
+"""
+Registro versionado de los modelos de avalúo con hot-reload atómico
+
+Cada entrenamiento (ml_models/train.py con MODEL_VERSION) escribe su propia
+carpeta ml_models/versions/<versión>/ con los .txt y su metadata.json. El
+archivo ml_models/versions/CURRENT dice qué versión se sirve. Los archivos
+sueltos en ml_models/ (esquema anterior) siguen funcionando como versión "base".
+
+Activar una versión la carga y valida en el hilo que llama, mientras se sigue
+sirviendo la anterior, y al final cambia una sola referencia (versión, modelos):
+cada request toma esa tupla una vez y usa los modelos de esa versión de punta a
+punta. La versión anterior queda en memoria, así el rollback es instantáneo.
+Un hilo vigila CURRENT (MODEL_WATCH_SECONDS) para que los demás workers/procesos
+sigan el cambio hecho desde el endpoint en uno de ellos.
+"""
+import os
+import re
+import json
+import threading
+from typing import Callable, Optional
+
+from services.stats_service import get_local_now
+
+WATCH_SECONDS = float(os.getenv("MODEL_WATCH_SECONDS", "30"))
+# Fija la versión servida (ignora CURRENT y desactiva el watcher)
+PINNED_VERSION = os.getenv("MODEL_VERSION", "")
+BASE_VERSION = "base"
+_VERSION_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+
+class ModelRegistry:
+    """
+    Versión activa + anterior de los modelos.
+    loader(directorio) → modelos; validator(modelos) lanza si no sirven;
+    on_swap(versión, modelos) se llama cuando esa versión pasa a servirse.
+    """
+
+    def __init__(self, base_dir: str, loader: Callable[[str], dict], validator: Optional[Callable[[dict], None]] = None,
+                 on_swap: Optional[Callable[[str, dict], None]] = None):
+        self.base_dir = base_dir
+        self.versions_dir = os.path.join(base_dir, "versions")
+        self.pointer_path = os.path.join(self.versions_dir, "CURRENT")
+        self._loader = loader
+        self._validator = validator
+        self._on_swap = on_swap
+        self._active = None      # (versión, modelos): se reemplaza entera, nunca se muta
+        self._previous = None
+        self._lock = threading.Lock()   # serializa cargas y swaps
+        self._watcher = None
+        self._stop = threading.Event()
+        self._pointer_mtime = None
+        self.swaps = 0
+        self.last_swap_at = None
+        self.last_error = None
+
+    # ─── Versiones en disco ──────────────────────────────────────────────
+    def version_dir(self, version: str) -> str:
+        if version == BASE_VERSION:
+            return self.base_dir
+        if not _VERSION_RE.match(version or ""):
+            raise ValueError(f"Versión inválida: {version!r}")
+        path = os.path.join(self.versions_dir, version)
+        if not os.path.isfile(os.path.join(path, "metadata.json")):
+            raise ValueError(f"La versión {version} no existe en {self.versions_dir}")
+        return path
+
+    def available(self) -> list:
+        """Versiones en versions/ (orden de nombre) y "base" si hay metadata suelta"""
+        versions = []
+        if os.path.isdir(self.versions_dir):
+            versions = sorted(
+                name for name in os.listdir(self.versions_dir)
+                if _VERSION_RE.match(name) and os.path.isfile(os.path.join(self.versions_dir, name, "metadata.json"))
+            )
+        if os.path.isfile(os.path.join(self.base_dir, "metadata.json")):
+            versions.insert(0, BASE_VERSION)
+        return versions
+
+    def describe(self) -> list:
+        active, previous = self.active_version, self.previous_version
+        described = []
+        for version in self.available():
+            try:
+                with open(os.path.join(self.version_dir(version), "metadata.json")) as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                metadata = {}
+            described.append({
+                "version": version,
+                "active": version == active,
+                "previous": version == previous,
+                "models": {
+                    offer: {
+                        "trained_at": info.get("lightgbm", {}).get("trained_at"),
+                        "metrics": info.get("lightgbm", {}).get("metrics")
+                    }
+                    for offer, info in metadata.items() if isinstance(info, dict)
+                }
+            })
+        return described
+
+    def _read_pointer(self) -> Optional[str]:
+        try:
+            with open(self.pointer_path) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _write_pointer(self, version: str):
+        """CURRENT se reemplaza con os.replace: quien lo lea ve la versión vieja o la nueva"""
+        try:
+            os.makedirs(self.versions_dir, exist_ok=True)
+            tmp = f"{self.pointer_path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                f.write(version + "\n")
+            os.replace(tmp, self.pointer_path)
+            self._pointer_mtime = os.stat(self.pointer_path).st_mtime_ns
+        except OSError as e:
+            print(f"⚠️ No se pudo escribir {self.pointer_path}: {e}")
+
+    def _initial_version(self) -> str:
+        if PINNED_VERSION:
+            return PINNED_VERSION
+        pointer = self._read_pointer()
+        if pointer:
+            return pointer
+        available = self.available()
+        return available[-1] if available else BASE_VERSION
+
+    # ─── Servir / cambiar ────────────────────────────────────────────────
+    @property
+    def active_version(self) -> Optional[str]:
+        return self._active[0] if self._active else None
+
+    @property
+    def previous_version(self) -> Optional[str]:
+        return self._previous[0] if self._previous else None
+
+    def active(self) -> tuple:
+        """(versión, modelos) que se sirven; la primera vez carga la versión inicial"""
+        current = self._active
+        if current is not None:
+            return current
+        with self._lock:
+            if self._active is None:
+                version = self._initial_version()
+                try:
+                    path = self.version_dir(version)
+                except ValueError as e:
+                    # CURRENT apunta a algo que ya no está: se sirve lo que haya
+                    print(f"⚠️ {e}; se usa la versión {BASE_VERSION}")
+                    version, path = BASE_VERSION, self.base_dir
+                self._active = (version, self._loader(path))
+                if self._on_swap is not None:
+                    self._on_swap(*self._active)
+                try:
+                    self._pointer_mtime = os.stat(self.pointer_path).st_mtime_ns
+                except OSError:
+                    self._pointer_mtime = None
+            return self._active
+
+    def activate(self, version: str) -> dict:
+        """Carga, valida y pone en servicio `version`. Si algo falla sigue la actual."""
+        with self._lock:
+            if self._active is not None and self._active[0] == version:
+                return self.status()
+            try:
+                models = self._loader(self.version_dir(version))
+                if self._validator is not None:
+                    self._validator(models)
+            except Exception as e:
+                self.last_error = f"{version}: {e}"
+                raise
+            self._previous, self._active = self._active, (version, models)
+            self._after_swap(version)
+        print(f"🔄 Modelos de avalúo: ahora se sirve la versión {version} (antes {self.previous_version})")
+        return self.status()
+
+    def rollback(self) -> dict:
+        """Vuelve a la versión anterior (ya cargada: sin leer disco)"""
+        with self._lock:
+            if self._previous is None:
+                raise ValueError("No hay versión anterior cargada para hacer rollback")
+            self._previous, self._active = self._active, self._previous
+            version = self._active[0]
+            self._after_swap(version)
+        print(f"⏪ Rollback de modelos de avalúo a la versión {version}")
+        return self.status()
+
+    def _after_swap(self, version: str):
+        """Llamar con el lock tomado"""
+        self.swaps += 1
+        self.last_swap_at = get_local_now().isoformat()
+        self.last_error = None
+        if self._on_swap is not None:
+            self._on_swap(*self._active)
+        if not PINNED_VERSION:
+            self._write_pointer(version)
+
+    # ─── Watcher de CURRENT ──────────────────────────────────────────────
+    def check_pointer(self):
+        """Si CURRENT cambió (otro worker o un deploy de archivos) activa esa versión"""
+        try:
+            mtime = os.stat(self.pointer_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._pointer_mtime:
+            return
+        self._pointer_mtime = mtime
+        version = self._read_pointer()
+        if version and version != self.active_version:
+            if self._previous is not None and self._previous[0] == version:
+                self.rollback()
+            else:
+                self.activate(version)
+
+    def _watch(self):
+        while not self._stop.wait(WATCH_SECONDS):
+            try:
+                self.check_pointer()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"⚠️ No se pudo activar la versión de CURRENT: {e}")
+
+    def start_watcher(self):
+        if PINNED_VERSION or WATCH_SECONDS <= 0:
+            return
+        if self._watcher is None or not self._watcher.is_alive():
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name="model-registry-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+
+    def status(self) -> dict:
+        return {
+            "active_version": self.active_version,
+            "previous_version": self.previous_version,
+            "pinned": bool(PINNED_VERSION),
+            "watch_seconds": WATCH_SECONDS if not PINNED_VERSION else 0,
+            "swaps": self.swaps,
+            "last_swap_at": self.last_swap_at,
+            "last_error": self.last_error
+        }
@@ -0,0 +1,115 @@
+"""
+Servicio de historia de precios: fotos diarias de medianas por zona y ciudad
+
+La valorización de una ventana (p. ej. 30 días) se resuelve comparando dos
+fotos de zone_price_snapshot en vez de recalcular contra updated_property.
+"""
+import os
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from services.stats_service import get_local_now
+
+# Solo las propiedades vistas en esta ventana cuentan como "mercado activo" del día
+ACTIVE_DAYS = int(os.getenv("PRICE_SNAPSHOT_ACTIVE_DAYS", "90"))
+
+
+def take_price_snapshot(session, snapshot_date: date = None) -> int:
+    """Escribe (o reescribe) la foto del día por zona y por ciudad. Devuelve filas escritas."""
+    snapshot_date = snapshot_date or get_local_now().date()
+    result = session.execute(text("""
+        INSERT INTO zone_price_snapshot
+            (snapshot_date, city_id, location_main, sell_median_m2, rent_median_m2, sell_count, rent_count)
+        SELECT
+            :snapshot_date,
+            p.city_id,
+            COALESCE(p.location_main, '') as location_main,
+            PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY p.price / p.area) FILTER (WHERE p.offer = 'sell'),
+            PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY p.price / p.area) FILTER (WHERE p.offer = 'rent'),
+            COUNT(*) FILTER (WHERE p.offer = 'sell'),
+            COUNT(*) FILTER (WHERE p.offer = 'rent')
+        FROM property p
+        WHERE p.city_id IS NOT NULL
+            AND p.area > 0 AND p.price > 0
+            AND p.last_update > :active_since
+            AND p.last_update <= :snapshot_date
+        GROUP BY GROUPING SETS ((p.city_id, p.location_main), (p.city_id))
+        -- Zonas sin nombre no van: chocarían con la fila '' de la ciudad
+        HAVING GROUPING(p.location_main) = 1 OR COALESCE(p.location_main, '') != ''
+        ON CONFLICT (snapshot_date, city_id, location_main) DO UPDATE SET
+            sell_median_m2 = EXCLUDED.sell_median_m2,
+            rent_median_m2 = EXCLUDED.rent_median_m2,
+            sell_count = EXCLUDED.sell_count,
+            rent_count = EXCLUDED.rent_count
+    """), {
+        "snapshot_date": snapshot_date,
+        "active_since": snapshot_date - timedelta(days=ACTIVE_DAYS)
+    })
+    session.commit()
+    return result.rowcount
+
+
+def get_zone_valorizations(session, city_id: int = None, days: int = 30) -> dict:
+    """Valorización % por (city_id, location_main) entre la última foto y la de hace `days` días.
+
+    Dos filas por zona: la foto más reciente y la última anterior a (fecha - days).
+    Devuelve {} si todavía no hay historia suficiente.
+    """
+    city_filter = "AND cur.city_id = :city_id" if city_id else ""
+    rows = session.execute(text(f"""
+        WITH latest AS (
+            SELECT MAX(snapshot_date) as d1 FROM zone_price_snapshot
+        ),
+        previous AS (
+            SELECT MAX(s.snapshot_date) as d0
+            FROM zone_price_snapshot s, latest
+            WHERE s.snapshot_date <= latest.d1 - :days
+        )
+        SELECT cur.city_id, cur.location_main,
+               cur.sell_median_m2, prev.sell_median_m2,
+               cur.rent_median_m2, prev.rent_median_m2
+        FROM zone_price_snapshot cur
+        JOIN zone_price_snapshot prev
+            ON prev.city_id = cur.city_id AND prev.location_main = cur.location_main
+        WHERE cur.snapshot_date = (SELECT d1 FROM latest)
+            AND prev.snapshot_date = (SELECT d0 FROM previous)
+            {city_filter}
+    """), {"days": days, "city_id": city_id}).fetchall()
+
+    def pct(current, previous):
+        if current and previous and previous > 0:
+            return (current - previous) / previous * 100
+        return 0
+
+    return {
+        (row[0], row[1]): {
+            'sale_valorization': pct(row[2], row[3]),
+            'rent_valorization': pct(row[4], row[5])
+        }
+        for row in rows
+    }
+
+
+def get_price_history(session, city_id: int, location_main: str = "", days: int = 365) -> list:
+    """Serie diaria (más antigua primero) de una zona, o de la ciudad con location_main=''"""
+    rows = session.execute(text("""
+        SELECT snapshot_date, sell_median_m2, rent_median_m2, sell_count, rent_count
+        FROM zone_price_snapshot
+        WHERE city_id = :city_id
+            AND location_main = :location_main
+            AND snapshot_date >= :since
+        ORDER BY snapshot_date
+    """), {
+        "city_id": city_id,
+        "location_main": location_main or "",
+        "since": get_local_now().date() - timedelta(days=days)
+    }).fetchall()
+
+    return [{
+        'date': row[0].isoformat(),
+        'sell_median_m2': float(row[1]) if row[1] is not None else None,
+        'rent_median_m2': float(row[2]) if row[2] is not None else None,
+        'sell_count': int(row[3] or 0),
+        'rent_count': int(row[4] or 0)
+    } for row in rows]
@@ -242,6 +242,49 @@ def build_property_type_filter(Property, property_types: List[str]):
     return or_(*conditions) if conditions else None
 
 
+# Tipos que entiende build_property_type_filter, en el orden de sus bits para
+# property_type_mask (índices en memoria que no pueden ejecutar el ILIKE).
+MAP_PROPERTY_TYPES = ("apartamento", "casa", "oficina", "local", "bodega", "lote", "finca")
+
+
+def property_type_mask(title: Optional[str]) -> int:
+    """Bitmask de tipos del título con las mismas reglas que build_property_type_filter"""
+    if not title:
+        return 0
+    t = title.lower()
+    words = set(t.split(' '))
+
+    def has(*subs):
+        return any(sub in t for sub in subs)
+
+    mask = 0
+    if ('apartamento' in words or 'apto' in words) and not has('bodega', 'local', 'oficina'):
+        mask |= 1 << 0
+    if 'casa' in words and not has('apartamento', 'apto', 'bodega', 'local', 'oficina'):
+        mask |= 1 << 1
+    if 'oficina' in words and not has('apartamento', 'casa', 'bodega'):
+        mask |= 1 << 2
+    if 'local' in words and not has('apartamento', 'casa', 'oficina'):
+        mask |= 1 << 3
+    if 'bodega' in words:
+        mask |= 1 << 4
+    if 'lote' in words:
+        mask |= 1 << 5
+    if 'finca' in words:
+        mask |= 1 << 6
+    return mask
+
+
+def property_types_to_mask(property_types: List[str]) -> int:
+    """Bitmask de los tipos pedidos (los que no están en MAP_PROPERTY_TYPES se ignoran)"""
+    mask = 0
+    for prop_type in property_types or []:
+        name = prop_type.strip().lower()
+        if name in MAP_PROPERTY_TYPES:
+            mask |= 1 << MAP_PROPERTY_TYPES.index(name)
+    return mask
+
+
 def build_price_type_filters(Property, min_sale_price: float = None, max_sale_price: float = None,
                               min_rent_price: float = None, max_rent_price: float = None):
     """Construir filtros de precio por tipo de oferta"""
@@ -311,3 +354,29 @@ def format_antiquity(antiquity_value):
         if any(word in antiquity_lower for word in ['sin especificar', 'undefined', 'n/a', 'none']):
             return "Sin especificar"
         return antiquity_str
+
+
+# Códigos de property_type del modelo de avalúo (mismas reglas y orden que
+# extract_property_type en ml_models/train.py; si cambian allá, cambiar aquí)
+_MODEL_PROPERTY_TYPES = (
+    (1, ("apartamento", "apto")),
+    (2, ("casa",)),
+    (3, ("oficina",)),
+    (4, ("local",)),
+    (5, ("bodega",)),
+    (6, ("lote", "terreno")),
+    (7, ("estudio",)),
+    (8, ("penthouse", "pent house")),
+    (9, ("duplex", "dúplex")),
+)
+
+
+def classify_property_type(title: Optional[str]) -> int:
+    """Código 0-9 de property_type a partir del título (0 = otro / sin título)"""
+    if not title:
+        return 0
+    t = str(title).lower()
+    for code, subs in _MODEL_PROPERTY_TYPES:
+        if any(sub in t for sub in subs):
+            return code
+    return 0
@@ -0,0 +1,167 @@
+"""
+Upsert masivo de propiedades con detección de cambios
+
+Cada lote se carga con COPY a una tabla temporal y se aplica con un único
+INSERT ... ON CONFLICT DO UPDATE. La fila se reescribe solo si cambió el
+content_hash o si last_update avanza: last_update significa "la publicación
+sigue viva" (lo usan price_history, los comps y los conteos del dashboard), así
+que una publicación re-scrapeada sin cambios lo mueve una vez por día y nada más.
+En la misma sentencia:
+- creation_date se fija solo al insertar.
+- Si cambió el precio, el precio anterior va a updated_property.
+- Las zonas con contenido cambiado se marcan para recalcular sus sketches.
+- (xmax = 0) en RETURNING distingue filas insertadas de actualizadas.
+"""
+import io
+import csv
+import time
+import threading
+from datetime import date
+
+from services.zone_sketches import zone_sketch_updater
+
+# Columnas de contenido que entran al hash (sin fechas: solo cambian si cambia la publicación)
+CONTENT_COLUMNS = (
+    "area", "rooms", "price", "offer", "city_id", "latitude", "longitude", "title",
+    "location_main", "stratum", "baths", "garages", "antiquity", "is_new",
+)
+STAGE_COLUMNS = ("seq", "fr_property_id") + CONTENT_COLUMNS + ("creation_date", "last_update")
+
+_STAGE_DDL = """
+    CREATE TEMP TABLE property_stage (
+        seq integer, fr_property_id bigint, area double precision, rooms integer,
+        price double precision, offer varchar(10), city_id integer,
+        latitude double precision, longitude double precision, title text,
+        location_main text, stratum integer, baths integer, garages integer,
+        antiquity integer, is_new boolean, creation_date date, last_update date
+    ) ON COMMIT DROP
+"""
+
+_HASH_EXPR = "md5(ROW({})::text)".format(", ".join(f"s.{c}" for c in CONTENT_COLUMNS))
+_UPDATE_SET = ",\n        ".join(f"{c} = EXCLUDED.{c}" for c in CONTENT_COLUMNS)
+
+_UPSERT_SQL = f"""
+WITH stage AS (
+    -- Un mismo id repetido en el lote: gana la última aparición (ON CONFLICT no
+    -- puede tocar la misma fila dos veces en una sentencia)
+    SELECT DISTINCT ON (fr_property_id) *
+    FROM property_stage
+    ORDER BY fr_property_id, seq DESC
+),
+previous AS (
+    -- Todas las sub-sentencias ven el mismo snapshot: aquí están los valores de antes del upsert
+    SELECT p.fr_property_id, p.price, p.content_hash, p.city_id, p.location_main
+    FROM property p
+    JOIN stage s ON s.fr_property_id = p.fr_property_id
+),
+upserted AS (
+    INSERT INTO property AS p (fr_property_id, {", ".join(CONTENT_COLUMNS)}, creation_date, last_update, content_hash)
+    SELECT s.fr_property_id, {", ".join(f"s.{c}" for c in CONTENT_COLUMNS)},
+           COALESCE(s.creation_date, %(today)s), COALESCE(s.last_update, %(today)s), {_HASH_EXPR}
+    FROM stage s
+    ON CONFLICT (fr_property_id) DO UPDATE SET
+        {_UPDATE_SET},
+        -- Un payload con contenido nuevo pero fecha vieja no retrocede last_update: los
+        -- índices incrementales (comps, clusters) leen por last_update >= watermark
+        last_update = GREATEST(p.last_update, EXCLUDED.last_update),
+        content_hash = EXCLUDED.content_hash
+    WHERE p.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+       OR p.last_update IS NULL OR p.last_update < EXCLUDED.last_update
+    RETURNING p.fr_property_id, p.price, p.content_hash, p.city_id, p.location_main, (p.xmax = 0) AS inserted
+),
+classified AS (
+    SELECT u.*, NOT u.inserted AND prev.content_hash IS NOT DISTINCT FROM u.content_hash AS seen_only
+    FROM upserted u
+    LEFT JOIN previous prev ON prev.fr_property_id = u.fr_property_id
+),
+history AS (
+    INSERT INTO updated_property (property_id, previous_value, updated_date)
+    SELECT u.fr_property_id, prev.price, %(today)s
+    FROM upserted u
+    JOIN previous prev ON prev.fr_property_id = u.fr_property_id
+    WHERE NOT u.inserted AND prev.price IS NOT NULL AND prev.price IS DISTINCT FROM u.price
+    RETURNING 1
+)
+SELECT
+    (SELECT COUNT(*) FROM stage),
+    COUNT(*) FILTER (WHERE inserted),
+    COUNT(*) FILTER (WHERE NOT inserted AND NOT seen_only),
+    COUNT(*) FILTER (WHERE seen_only),
+    (SELECT COUNT(*) FROM history),
+    -- Zonas cuyo contenido cambió (la nueva y, si se movió, la vieja) para los sketches
+    (SELECT COALESCE(json_agg(json_build_array(z.city_id, z.location_main)), '[]'::json) FROM (
+        SELECT c.city_id, c.location_main FROM classified c WHERE NOT c.seen_only
+        UNION
+        SELECT prev.city_id, prev.location_main
+        FROM classified c JOIN previous prev ON prev.fr_property_id = c.fr_property_id
+        WHERE NOT c.seen_only
+    ) z WHERE z.city_id IS NOT NULL AND z.location_main IS NOT NULL)
+FROM classified
+"""
+
+
+_TOTALS = {"batches": 0, "received": 0, "inserted": 0, "updated": 0, "seen": 0, "unchanged": 0,
+           "price_changes": 0, "seconds": 0.0}
+_TOTALS_LOCK = threading.Lock()
+
+
+def _to_csv(rows) -> io.StringIO:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["\\N" if value is None else value for value in row])
+    buffer.seek(0)
+    return buffer
+
+
+def upsert_properties(raw_conn, rows: list, today: date) -> dict:
+    """Aplica un lote de filas (tuplas en el orden de STAGE_COLUMNS sin seq). Hace commit."""
+    start = time.perf_counter()
+    try:
+        with raw_conn.cursor() as cursor:
+            cursor.execute(_STAGE_DDL)
+            cursor.copy_expert(
+                f"COPY property_stage ({', '.join(STAGE_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                _to_csv((seq,) + tuple(row) for seq, row in enumerate(rows))
+            )
+            copied = time.perf_counter()
+            cursor.execute(_UPSERT_SQL, {"today": today})
+            distinct, inserted, updated, seen, price_changes, touched_zones = cursor.fetchone()
+        raw_conn.commit()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    zone_sketch_updater.mark(tuple(zone) for zone in touched_zones)
+
+    elapsed = time.perf_counter() - start
+    with _TOTALS_LOCK:
+        _TOTALS["batches"] += 1
+        _TOTALS["received"] += len(rows)
+        _TOTALS["inserted"] += inserted
+        _TOTALS["updated"] += updated
+        _TOTALS["seen"] += seen
+        _TOTALS["unchanged"] += distinct - inserted - updated - seen
+        _TOTALS["price_changes"] += price_changes
+        _TOTALS["seconds"] += elapsed
+    return {
+        "received": len(rows),
+        "inserted": inserted,
+        "updated": updated,
+        # seen: sin cambios de contenido, solo avanzó last_update; unchanged: no se tocó
+        "seen": seen,
+        "unchanged": distinct - inserted - updated - seen,
+        "duplicates_in_batch": len(rows) - distinct,
+        "price_changes": price_changes,
+        "copy_ms": round((copied - start) * 1000, 1),
+        "upsert_ms": round((time.perf_counter() - copied) * 1000, 1),
+        "rows_per_second": round(len(rows) / elapsed) if elapsed > 0 else None
+    }
+
+
+def property_ingest_stats() -> dict:
+    """Totales acumulados del proceso desde el arranque"""
+    with _TOTALS_LOCK:
+        totals = dict(_TOTALS)
+    seconds = totals.pop("seconds")
+    totals["avg_rows_per_second"] = round(totals["received"] / seconds) if seconds > 0 else None
+    return totals
@@ -0,0 +1,119 @@
+"""
+Sketch de cuantiles KLL (Karnin-Lang-Liberty) mergeable y serializable a JSON
+
+Mantiene O(k log(n/k)) valores en vez de todos: cada nivel h es un
+"compactor" cuyos ítems pesan 2^h. Al llenarse, un nivel se ordena y pasa la
+mitad de sus ítems (pares o impares al azar) al nivel siguiente. Dos sketches
+se combinan concatenando nivel a nivel, así que los de varias zonas/ciudades
+se pueden sumar sin volver a leer los datos.
+"""
+import math
+import random
+from bisect import bisect_left
+from typing import Optional
+
+DEFAULT_K = 200
+_C = 2.0 / 3.0
+
+
+class KLLSketch:
+    """Sketch de cuantiles con error de rango ~1.65/k"""
+
+    def __init__(self, k: int = DEFAULT_K):
+        self.k = k
+        self.n = 0
+        self.min = None
+        self.max = None
+        self.compactors = [[]]
+        self._cdf = None
+
+    def _capacity(self, height: int) -> int:
+        depth = len(self.compactors) - height - 1
+        return int(math.ceil((_C ** depth) * self.k)) + 1
+
+    def _size(self) -> int:
+        return sum(len(c) for c in self.compactors)
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    def _compress(self):
+        while self._size() >= self._max_size():
+            for h, compactor in enumerate(self.compactors):
+                if len(compactor) >= self._capacity(h):
+                    if h + 1 >= len(self.compactors):
+                        self.compactors.append([])
+                    compactor.sort()
+                    # Con largo impar el último ítem se queda en este nivel
+                    keep = [compactor.pop()] if len(compactor) % 2 else []
+                    offset = random.randint(0, 1)
+                    self.compactors[h + 1].extend(compactor[offset::2])
+                    self.compactors[h] = keep
+                    break
+
+    def update(self, value: float):
+        """Agrega un valor"""
+        value = float(value)
+        self.compactors[0].append(value)
+        self.n += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self._cdf = None
+        if len(self.compactors[0]) >= self._capacity(0):
+            self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        """Combina otro sketch en este (in place)"""
+        if other.n == 0:
+            return self
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for h, compactor in enumerate(other.compactors):
+            self.compactors[h].extend(compactor)
+        self.n += other.n
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._cdf = None
+        self._compress()
+        return self
+
+    def _build_cdf(self):
+        if self._cdf is None:
+            weighted = sorted(
+                (value, 1 << h)
+                for h, compactor in enumerate(self.compactors)
+                for value in compactor
+            )
+            values, cumulative, total = [], [], 0
+            for value, weight in weighted:
+                total += weight
+                values.append(value)
+                cumulative.append(total)
+            self._cdf = (values, cumulative, total)
+        return self._cdf
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Valor aproximado en el cuantil q (0..1); None si el sketch está vacío"""
+        if self.n == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        values, cumulative, total = self._build_cdf()
+        i = bisect_left(cumulative, q * total)
+        return values[min(i, len(values) - 1)]
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "n": self.n, "min": self.min, "max": self.max,
+                "compactors": self.compactors}
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "KLLSketch":
+        sketch = cls(k=(data or {}).get("k", DEFAULT_K))
+        if data:
+            sketch.n = data.get("n", 0)
+            sketch.min = data.get("min")
+            sketch.max = data.get("max")
+            sketch.compactors = [list(c) for c in data.get("compactors") or [[]]]
+        return sketch
@@ -0,0 +1,331 @@
+"""
+Geocodificador inverso offline: lat/lon → (city_id, zona location_main)
+
+Se construye con las coordenadas ya scrapeadas de property (redondeadas a ~11 m
+y agregadas por ciudad/zona, con su conteo como peso) y los polígonos de
+zone_polygon:
+- Polígonos: si el punto cae dentro de una zona (STRtree de shapely) esa zona
+  manda; con solapes gana la de la ciudad votada por los vecinos y, si no, la
+  de menor área.
+- Vecinos: rejilla NumPy de GEOCODER_CELL_DEGREES; se revisan anillos de celdas
+  alrededor del punto hasta tener GEOCODER_K vecinos garantizados y se vota la
+  ciudad (y la zona dentro de esa ciudad) ponderando conteo / distancia.
+A diferencia del centroide más cercano, en los bordes entre ciudades decide
+dónde están de verdad las publicaciones.
+
+El índice se arma en un hilo de fondo al arrancar y se reconstruye cada
+GEOCODER_REFRESH_SECONDS; mientras no está listo lookup devuelve None y quien
+llama usa su respaldo (centroides).
+"""
+import os
+import math
+import time
+import threading
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import text
+
+CELL_DEGREES = float(os.getenv("GEOCODER_CELL_DEGREES", "0.01"))   # ~1.1 km
+K = int(os.getenv("GEOCODER_K", "7"))
+# Anillos de celdas a revisar como máximo: más allá el punto no es de ninguna ciudad conocida
+MAX_RING = int(os.getenv("GEOCODER_MAX_RING", "5"))
+REFRESH_SECONDS = int(os.getenv("GEOCODER_REFRESH_SECONDS", "86400"))
+# Holgura alrededor del bbox de cada ciudad en cities_within: el índice puede tener hasta
+# REFRESH_SECONDS de antigüedad y una publicación nueva puede caer fuera del bbox viejo
+CITY_PAD_M = float(os.getenv("GEOCODER_CITY_PAD_M", "2000"))
+# Colombia (evita coords inválidas/0,0), igual que el serving de avalúos
+BOUNDS = {"south": -5.0, "north": 15.0, "west": -82.0, "east": -66.0}
+_EARTH_M_PER_DEGREE = 111_320.0
+_ROW_SPAN = 1 << 20   # celdas por fila de la rejilla (lon / CELL_DEGREES cabe holgado)
+
+
+def _inside(lat, lon) -> bool:
+    return BOUNDS["south"] <= lat <= BOUNDS["north"] and BOUNDS["west"] <= lon <= BOUNDS["east"]
+
+
+def _cell_xy(lat, lon):
+    return np.floor(np.asarray(lon) / CELL_DEGREES).astype(np.int64), np.floor(np.asarray(lat) / CELL_DEGREES).astype(np.int64)
+
+
+class GeoIndex:
+    """Puntos etiquetados en una rejilla + STRtree de polígonos de zona"""
+
+    def __init__(self, lats, lons, weights, city_ids, zone_ids, zone_names: list, polygons: list):
+        cx, cy = _cell_xy(lats, lons)
+        keys = cy * _ROW_SPAN + cx
+        order = np.argsort(keys, kind="stable")
+        self.lats = np.asarray(lats, dtype=np.float64)[order]
+        self.lons = np.asarray(lons, dtype=np.float64)[order]
+        self.weights = np.asarray(weights, dtype=np.float64)[order]
+        self.city_ids = np.asarray(city_ids, dtype=np.int64)[order]
+        self.zone_ids = np.asarray(zone_ids, dtype=np.int64)[order]
+        self.zone_names = zone_names
+        unique, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+        self._cells = {int(key): (int(s), int(s + c)) for key, s, c in zip(unique, starts, counts)}
+
+        # Bbox de los puntos de cada ciudad (para cities_within)
+        self.bbox_city_ids, city_index = np.unique(self.city_ids, return_inverse=True)
+        n_cities = len(self.bbox_city_ids)
+        self.bbox_south = np.full(n_cities, np.inf)
+        self.bbox_north = np.full(n_cities, -np.inf)
+        self.bbox_west = np.full(n_cities, np.inf)
+        self.bbox_east = np.full(n_cities, -np.inf)
+        np.minimum.at(self.bbox_south, city_index, self.lats)
+        np.maximum.at(self.bbox_north, city_index, self.lats)
+        np.minimum.at(self.bbox_west, city_index, self.lons)
+        np.maximum.at(self.bbox_east, city_index, self.lons)
+
+        self.tree = None
+        self.polygon_meta = [(city_id, zone) for _, city_id, zone in polygons]
+        if polygons:
+            import shapely
+            from shapely import STRtree
+            geoms = [geom for geom, _, _ in polygons]
+            self.tree = STRtree(geoms)
+            self.polygon_areas = shapely.area(np.array(geoms, dtype=object))
+        self.points = len(self.lats)
+        self.built_at = time.time()
+
+    # ─── Vecinos ─────────────────────────────────────────────────────────
+    def _ring_indices(self, cx: int, cy: int, ring: int) -> list:
+        """Slices de las celdas del borde del anillo `ring` (0 = la celda del punto)"""
+        slices = []
+        for dy in range(-ring, ring + 1):
+            step = 1 if abs(dy) == ring else 2 * ring
+            for dx in range(-ring, ring + 1, max(step, 1)):
+                span = self._cells.get((cy + dy) * _ROW_SPAN + cx + dx)
+                if span:
+                    slices.append(span)
+        return slices
+
+    def nearest(self, lat: float, lon: float, k: int = K):
+        """(índices, distancias en metros) de los k vecinos más cercanos, o None si no hay cerca"""
+        cx, cy = int(math.floor(lon / CELL_DEGREES)), int(math.floor(lat / CELL_DEGREES))
+        cos_lat = math.cos(math.radians(lat))
+        spans = []
+        for ring in range(MAX_RING + 1):
+            spans.extend(self._ring_indices(cx, cy, ring))
+            if not spans:
+                continue
+            idx = np.concatenate([np.arange(start, end) for start, end in spans])
+            dx = (self.lons[idx] - lon) * cos_lat
+            dy = self.lats[idx] - lat
+            dist = np.sqrt(dx * dx + dy * dy)
+            # Radio que el anillo cubre con certeza (el lado lon se achica con cos(lat))
+            covered = ring * CELL_DEGREES * cos_lat
+            if len(idx) >= k:
+                part = np.argpartition(dist, k - 1)[:k]
+                if dist[part].max() <= covered or ring == MAX_RING:
+                    order = part[np.argsort(dist[part])]
+                    return idx[order], dist[order] * _EARTH_M_PER_DEGREE
+            elif ring == MAX_RING:
+                order = np.argsort(dist)
+                return idx[order], dist[order] * _EARTH_M_PER_DEGREE
+        return None
+
+    def _vote(self, idx, dist_m) -> dict:
+        # +50 m: un vecino a 0 m no debe anular a todos los demás
+        w = self.weights[idx] / (dist_m + 50.0)
+        cities = self.city_ids[idx]
+        totals = {}
+        for city_id, weight in zip(cities.tolist(), w.tolist()):
+            totals[city_id] = totals.get(city_id, 0.0) + weight
+        city_id = max(totals, key=totals.get)
+        zones = {}
+        for zone_id, weight, city in zip(self.zone_ids[idx].tolist(), w.tolist(), cities.tolist()):
+            if city == city_id and zone_id >= 0:
+                zones[zone_id] = zones.get(zone_id, 0.0) + weight
+        zone_id = max(zones, key=zones.get) if zones else None
+        return {
+            "city_id": int(city_id),
+            "zone": self.zone_names[zone_id] if zone_id is not None else None,
+            "confidence": round(totals[city_id] / sum(totals.values()), 3),
+            "nearest_m": round(float(dist_m[0]), 1)
+        }
+
+    # ─── Polígonos ───────────────────────────────────────────────────────
+    def _pick_polygon(self, candidates, voted_city) -> Optional[int]:
+        if not len(candidates):
+            return None
+        same_city = [i for i in candidates if self.polygon_meta[i][0] == voted_city]
+        pool = same_city or list(candidates)
+        return min(pool, key=lambda i: self.polygon_areas[i])
+
+    def _result(self, lat, lon, polygon_hits) -> Optional[dict]:
+        found = self.nearest(lat, lon)
+        voted = self._vote(*found) if found is not None else None
+        best = self._pick_polygon(polygon_hits, voted["city_id"] if voted else None)
+        if best is not None:
+            city_id, zone = self.polygon_meta[best]
+            return {"city_id": int(city_id), "zone": zone, "source": "polygon",
+                    "confidence": voted["confidence"] if voted and voted["city_id"] == city_id else None,
+                    "nearest_m": voted["nearest_m"] if voted else None}
+        if voted is None:
+            return None
+        return {**voted, "source": "knn"}
+
+    def lookup(self, lat: float, lon: float) -> Optional[dict]:
+        if not _inside(lat, lon):
+            return None
+        hits = []
+        if self.tree is not None:
+            from shapely import Point
+            hits = self.tree.query(Point(lon, lat), predicate="within").tolist()
+        return self._result(lat, lon, hits)
+
+    def lookup_many(self, lats, lons) -> list:
+        """Igual que lookup para muchos puntos; la consulta a polígonos va vectorizada"""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        hits = [[] for _ in range(len(lats))]
+        if self.tree is not None and len(lats):
+            import shapely
+            point_idx, poly_idx = self.tree.query(shapely.points(lons, lats), predicate="within")
+            for p, g in zip(point_idx.tolist(), poly_idx.tolist()):
+                hits[p].append(g)
+        return [
+            self._result(float(lat), float(lon), hits[i]) if _inside(lat, lon) else None
+            for i, (lat, lon) in enumerate(zip(lats.tolist(), lons.tolist()))
+        ]
+
+    def cities_within(self, lat: float, lon: float, radius_m: float) -> set:
+        """city_id cuyo bbox (más CITY_PAD_M) queda a menos de radius_m (para acotar búsquedas por radio)
+
+        Se usa el bbox y no los puntos: un índice de hasta un día no tiene las
+        publicaciones nuevas, y una ciudad sin puntos viejos cerca igual puede tenerlas.
+        """
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        dy = np.maximum(np.maximum(self.bbox_south - lat, lat - self.bbox_north), 0.0)
+        dx = np.maximum(np.maximum(self.bbox_west - lon, lon - self.bbox_east), 0.0) * cos_lat
+        near = np.sqrt(dx * dx + dy * dy) * _EARTH_M_PER_DEGREE <= radius_m + CITY_PAD_M
+        return set(self.bbox_city_ids[near].tolist())
+
+    def known_cities(self) -> set:
+        return set(self.bbox_city_ids.tolist())
+
+
+def build_index(session) -> GeoIndex:
+    """Arma el índice desde property (puntos agregados a ~11 m) y zone_polygon"""
+    rows = session.execute(text("""
+        SELECT ROUND(latitude::numeric, 4)::float8, ROUND(longitude::numeric, 4)::float8,
+               city_id, NULLIF(location_main, ''), COUNT(*)
+        FROM property
+        WHERE latitude BETWEEN :south AND :north AND longitude BETWEEN :west AND :east
+            AND city_id IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+    """), BOUNDS).fetchall()
+
+    zone_codes, zone_names = {}, []
+    lats, lons, weights, city_ids, zone_ids = [], [], [], [], []
+    for lat, lon, city_id, zone, count in rows:
+        if zone is not None and zone not in zone_codes:
+            zone_codes[zone] = len(zone_names)
+            zone_names.append(zone)
+        lats.append(lat)
+        lons.append(lon)
+        weights.append(count)
+        city_ids.append(city_id)
+        zone_ids.append(zone_codes[zone] if zone is not None else -1)
+
+    polygons = []
+    try:
+        import shapely
+        for city_id, zone, wkb in session.execute(text(
+            "SELECT city_id, location_main, wkb FROM zone_polygon WHERE wkb IS NOT NULL"
+        )).fetchall():
+            polygons.append((shapely.from_wkb(bytes(wkb)), city_id, zone))
+    except Exception as e:
+        session.rollback()
+        print(f"⚠️ Geocodificador sin polígonos de zona: {e}")
+
+    return GeoIndex(lats, lons, weights, city_ids, zone_ids, zone_names, polygons)
+
+
+class ReverseGeocoder:
+    """Índice actual + reconstrucción en segundo plano"""
+
+    def __init__(self):
+        self.index: Optional[GeoIndex] = None
+        self._building = threading.Lock()
+        self.last_error = None
+        self.build_seconds = None
+
+    def refresh(self):
+        """Reconstruye el índice (bloqueante) y lo reemplaza de una vez"""
+        from sqlmodel import Session
+        from config.db_connection import engine
+
+        start = time.perf_counter()
+        with Session(engine) as session:
+            index = build_index(session)
+        self.index = index
+        self.build_seconds = round(time.perf_counter() - start, 2)
+        self.last_error = None
+        print(f"🗺️ Geocodificador inverso: {index.points} puntos, {len(index.polygon_meta)} polígonos en {self.build_seconds}s")
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"⚠️ No se pudo construir el geocodificador inverso: {e}")
+        finally:
+            self._building.release()
+
+    def refresh_async(self):
+        """Lanza una reconstrucción si no hay otra en curso"""
+        if self._building.acquire(blocking=False):
+            threading.Thread(target=self._refresh_in_background, name="reverse-geocoder", daemon=True).start()
+
+    def _ready(self) -> Optional[GeoIndex]:
+        index = self.index
+        if index is None or time.time() - index.built_at > REFRESH_SECONDS:
+            self.refresh_async()
+        return index
+
+    def lookup(self, lat, lon) -> Optional[dict]:
+        """{city_id, zone, source, confidence, nearest_m} o None (fuera de Colombia, lejos o sin índice)"""
+        index = self._ready()
+        try:
+            lat, lon = float(lat), float(lon)
+        except (TypeError, ValueError):
+            return None
+        if index is None or not (math.isfinite(lat) and math.isfinite(lon)):
+            return None
+        return index.lookup(lat, lon)
+
+    def lookup_many(self, lats, lons) -> list:
+        index = self._ready()
+        if index is None:
+            return [None] * len(lats)
+        return index.lookup_many(lats, lons)
+
+    def cities_within(self, lat, lon, radius_m) -> Optional[set]:
+        """None si el índice no está listo (quien llama no debe acotar)"""
+        index = self._ready()
+        return index.cities_within(float(lat), float(lon), float(radius_m)) if index is not None else None
+
+    def known_cities(self) -> Optional[set]:
+        """Ciudades con puntos en el índice (None si no está listo); las demás no se pueden acotar"""
+        index = self._ready()
+        return index.known_cities() if index is not None else None
+
+    def stats(self) -> dict:
+        index = self.index
+        return {
+            "ready": index is not None,
+            "points": index.points if index else 0,
+            "polygons": len(index.polygon_meta) if index else 0,
+            "zones": len(index.zone_names) if index else 0,
+            "built_at": index.built_at if index else None,
+            "build_seconds": self.build_seconds,
+            "refresh_seconds": REFRESH_SECONDS,
+            "cell_degrees": CELL_DEGREES,
+            "city_pad_m": CITY_PAD_M,
+            "k": K,
+            "last_error": self.last_error
+        }
+
+
+reverse_geocoder = ReverseGeocoder()
@@ -0,0 +1,189 @@
+"""
+Estimación de horarios del scraper a partir del historial de ejecución
+
+Aprende cuánto tarda una página por (ciudad, oferta) con un promedio móvil
+exponencial (EWMA) de execution_time_ms de los logs con page_number, y lo
+combina con el progreso de cada ciudad (offsets y límites de páginas) para
+predecir cuándo arranca y termina cada ciudad/oferta pendiente y el ciclo
+completo. Las corridas siguen arrancando en el slot de las :30 de cada hora;
+lo nuevo es que una ciudad larga empuja a las siguientes.
+
+El modelo vive en memoria: la primera vez carga ETA_HISTORY_DAYS de logs y
+después solo los logs con id mayor al último visto.
+"""
+import os
+import time
+import threading
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from services.stats_service import get_local_now, COLOMBIA_TZ
+
+HISTORY_DAYS = int(os.getenv("ETA_HISTORY_DAYS", "14"))
+EWMA_ALPHA = float(os.getenv("ETA_EWMA_ALPHA", "0.05"))
+DEFAULT_PAGE_MS = float(os.getenv("ETA_DEFAULT_PAGE_MS", "20000"))
+CACHE_SECONDS = int(os.getenv("ETA_CACHE_SECONDS", "30"))
+# Si el último log es más reciente que esto, la ciudad/oferta de ese log está corriendo
+RUNNING_WINDOW_MINUTES = int(os.getenv("ETA_RUNNING_WINDOW_MINUTES", "10"))
+PAGE_SIZE = 25
+# Páginas de más de 10 min son cuelgues o reintentos, no el ritmo normal
+_MAX_PAGE_MS = 10 * 60 * 1000
+
+
+class PageDurationModel:
+    """EWMA de ms por página por (city_code, offer_type), con respaldo por oferta y global"""
+
+    def __init__(self):
+        self.stats = {}   # key -> [ewma_ms, n]
+        self.last_id = None
+        self.lock = threading.Lock()
+
+    def _observe(self, key, value):
+        current = self.stats.get(key)
+        if current is None:
+            self.stats[key] = [value, 1]
+        else:
+            current[0] += EWMA_ALPHA * (value - current[0])
+            current[1] += 1
+
+    def update(self, session) -> int:
+        """Incorpora los logs de página nuevos. Devuelve cuántos leyó."""
+        params = {"max_ms": _MAX_PAGE_MS}
+        if self.last_id is None:
+            since_filter = "AND timestamp >= :since"
+            params["since"] = get_local_now() - timedelta(days=HISTORY_DAYS)
+        else:
+            since_filter = "AND id > :last_id"
+            params["last_id"] = self.last_id
+
+        rows = session.execute(text(f"""
+            SELECT id, city_code, LOWER(offer_type), execution_time_ms
+            FROM scraper_logs
+            WHERE page_number IS NOT NULL
+                AND execution_time_ms > 0 AND execution_time_ms < :max_ms
+                {since_filter}
+            ORDER BY id
+        """), params).fetchall()
+
+        with self.lock:
+            for log_id, city_code, offer_type, ms in rows:
+                ms = float(ms)
+                self._observe((city_code, offer_type), ms)
+                self._observe((None, offer_type), ms)
+                self._observe((None, None), ms)
+                self.last_id = log_id
+            if self.last_id is None:
+                # Sin historial todavía: la próxima vez se sigue desde el id máximo actual
+                self.last_id = session.execute(text("SELECT COALESCE(MAX(id), 0) FROM scraper_logs")).scalar()
+        return len(rows)
+
+    def page_ms(self, city_code, offer_type):
+        """(ms por página, fuente): ciudad/oferta → oferta → global → default"""
+        with self.lock:
+            for key, source in (((city_code, offer_type), "city"), ((None, offer_type), "offer"), ((None, None), "global")):
+                if key in self.stats:
+                    return self.stats[key][0], source
+        return DEFAULT_PAGE_MS, "default"
+
+    def snapshot(self) -> list:
+        with self.lock:
+            return [
+                {"city_code": city, "offer_type": offer, "page_ms": round(ms, 1), "samples": n}
+                for (city, offer), (ms, n) in sorted(self.stats.items(), key=lambda kv: (kv[0][0] or "", kv[0][1] or ""))
+                if city is not None
+            ]
+
+
+_MODEL = PageDurationModel()
+_CACHE = {"at": 0.0, "plan": None}
+_CACHE_LOCK = threading.Lock()
+# Un solo update a la vez: dos lecturas del mismo rango contarían los logs dos veces
+_UPDATE_LOCK = threading.Lock()
+
+
+def _next_slot(moment):
+    """Próximo arranque de cron (:30) en o después de `moment`"""
+    slot = moment.replace(minute=30, second=0, microsecond=0)
+    return slot if slot >= moment else slot + timedelta(hours=1)
+
+
+def _pending_runs(session):
+    """Ciudades/ofertas pendientes en el orden en que las toma el scraper"""
+    current = session.execute(text("""
+        SELECT city_code, offer_type, timestamp FROM scraper_logs
+        ORDER BY timestamp DESC LIMIT 1
+    """)).first()
+    current_city_code = current[0] if current else None
+    current_offer_type = current[1] if current else None
+    last_log_at = current[2] if current else None
+
+    cities = session.execute(text("""
+        SELECT c.name, c.website_name, c.current_sell_offset, c.sell_pages_limit,
+               c.current_rent_offset, c.rent_pages_limit
+        FROM city c
+        WHERE c.updated = false
+        ORDER BY c.name ASC
+    """)).fetchall()
+
+    runs = []
+    for name, website_name, sell_offset, sell_limit, rent_offset, rent_limit in cities:
+        sell_completed = sell_offset >= sell_limit if sell_limit > 0 else True
+        rent_completed = rent_offset >= rent_limit if rent_limit > 0 else True
+        is_current = website_name == current_city_code
+
+        if not sell_completed and (not is_current or current_offer_type == "sell"):
+            runs.append((name, website_name, "sell", max(sell_limit - sell_offset // PAGE_SIZE, 0), is_current))
+        elif sell_completed and not rent_completed:
+            runs.append((name, website_name, "rent", max(rent_limit - rent_offset // PAGE_SIZE, 0), is_current))
+    return runs, last_log_at
+
+
+def estimate_schedule(session) -> dict:
+    """Plan estimado: arranque y fin de cada ciudad/oferta pendiente y fin del ciclo (cacheado)"""
+    with _CACHE_LOCK:
+        if _CACHE["plan"] is not None and time.time() - _CACHE["at"] < CACHE_SECONDS:
+            return _CACHE["plan"]
+
+    with _UPDATE_LOCK:
+        _MODEL.update(session)
+    runs, last_log_at = _pending_runs(session)
+
+    now = get_local_now()
+    running = False
+    if last_log_at is not None:
+        last_log_at = last_log_at if last_log_at.tzinfo else COLOMBIA_TZ.localize(last_log_at)
+        running = now - last_log_at < timedelta(minutes=RUNNING_WINDOW_MINUTES)
+
+    executions = []
+    cursor = now
+    for name, city_code, offer_type, pages_remaining, is_current in runs:
+        page_ms, source = _MODEL.page_ms(city_code, offer_type)
+        start = now if (is_current and running) else _next_slot(cursor)
+        end = start + timedelta(milliseconds=pages_remaining * page_ms)
+        executions.append({
+            "city": name,
+            "city_code": city_code,
+            "type": offer_type,
+            "running": is_current and running,
+            "pages_remaining": pages_remaining,
+            "page_ms": round(page_ms, 1),
+            "estimate_source": source,
+            "scheduled_time": start.isoformat(),
+            "minutes_remaining": max(int((start - now).total_seconds() / 60), 0),
+            "estimated_completion": end.isoformat(),
+            "minutes_to_completion": int((end - now).total_seconds() / 60)
+        })
+        cursor = end
+
+    plan = {
+        "generated_at": now.isoformat(),
+        "executions": executions,
+        "cycle_completion": executions[-1]["estimated_completion"] if executions else None,
+        "cycle_minutes_remaining": executions[-1]["minutes_to_completion"] if executions else 0,
+        "page_durations": _MODEL.snapshot()
+    }
+    with _CACHE_LOCK:
+        _CACHE["at"] = time.time()
+        _CACHE["plan"] = plan
+    return plan
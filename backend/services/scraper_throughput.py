@@ -0,0 +1,102 @@
+"""
+Rendimiento del scraper por hora, ciudad y oferta
+
+Se lee del rollup horario de scraper_logs (scraper_logs_hourly, ver
+services/log_retention.py): las horas ya agregadas salen de ahí y las que el
+rollup todavía no cubre (la hora en curso, o más si el mantenimiento se atrasó)
+se agregan al vuelo sobre scraper_logs con la misma consulta. p50/p95 de
+execution_time_ms salen de sumar los histogramas de cada fila.
+"""
+from datetime import timedelta
+from collections import defaultdict
+
+from sqlalchemy import text
+
+from services.log_retention import EXECUTION_MS_BOUNDS, hourly_select, histogram_quantile, rolled_up_until
+from services.stats_service import get_local_now
+
+PAGE_LOG_TYPES = ("page_navigation", "page_processed")
+
+
+def _hourly_rows(session, since, city_code: str = None, offer_type: str = None) -> list:
+    """Filas (hora, ciudad, oferta, nivel, tipo) desde `since`: rollup + horas aún sin agregar"""
+    now = get_local_now().replace(tzinfo=None)
+    rolled_until = max(rolled_up_until(session) or since, since)
+    params = {"since": since, "rolled_until": rolled_until, "until": now + timedelta(hours=1),
+              "city_code": city_code, "offer_type": offer_type, "bounds": EXECUTION_MS_BOUNDS}
+
+    filters = ""
+    if city_code:
+        filters += " AND city_code = :city_code"
+    if offer_type:
+        filters += " AND offer_type = :offer_type"
+
+    rows = session.execute(text(f"""
+        SELECT hour, city_code, offer_type, log_level, log_type, entries,
+               execution_time_ms_sum, execution_time_ms_count, properties_found, properties_validated,
+               execution_ms_histogram
+        FROM scraper_logs_hourly
+        WHERE hour >= :since AND hour < :rolled_until {filters}
+    """), params).fetchall()
+
+    live = session.execute(text(hourly_select(filters)), {**params, "since": rolled_until}).fetchall()
+    return list(rows) + list(live)
+
+
+def get_throughput(session, hours: int = 24, city_code: str = None, offer_type: str = None) -> dict:
+    """Serie horaria y resumen por (ciudad, oferta) de las últimas `hours` horas"""
+    since = get_local_now().replace(tzinfo=None, minute=0, second=0, microsecond=0) - timedelta(hours=hours)
+
+    def empty():
+        return {"pages": 0, "properties_found": 0, "properties_validated": 0, "errors": 0,
+                "histogram": defaultdict(int)}
+
+    # (hora, ciudad, oferta) suma todos los niveles/tipos del rollup
+    by_hour = defaultdict(empty)
+    for (hour, city, offer, level, log_type, entries, _ms_sum, _ms_count,
+         found, validated, histogram) in _hourly_rows(session, since, city_code, offer_type):
+        total = by_hour[(hour, city, offer)]
+        total["pages"] += int(entries) if log_type in PAGE_LOG_TYPES else 0
+        total["errors"] += int(entries) if level == "error" else 0
+        total["properties_found"] += int(found)
+        total["properties_validated"] += int(validated)
+        for bucket, count in (histogram or {}).items():
+            total["histogram"][bucket] += int(count)
+
+    series = []
+    totals = defaultdict(lambda: {**empty(), "hours_active": 0})
+    for (hour, city, offer), row in sorted(by_hour.items()):
+        p50, p95 = histogram_quantile(row["histogram"], 0.5), histogram_quantile(row["histogram"], 0.95)
+        series.append({
+            "hour": hour.isoformat(),
+            "city_code": city or None,
+            "offer_type": offer or None,
+            "pages": row["pages"],
+            "properties_found": row["properties_found"],
+            "properties_validated": row["properties_validated"],
+            "errors": row["errors"],
+            "p50_ms": round(p50, 1) if p50 is not None else None,
+            "p95_ms": round(p95, 1) if p95 is not None else None
+        })
+        total = totals[(city, offer)]
+        for key in ("pages", "properties_found", "properties_validated", "errors"):
+            total[key] += row[key]
+        total["hours_active"] += 1 if row["pages"] else 0
+        for bucket, count in row["histogram"].items():
+            total["histogram"][bucket] += count
+
+    summary = []
+    for (city, offer), total in sorted(totals.items()):
+        histogram = total.pop("histogram")
+        p50, p95 = histogram_quantile(histogram, 0.5), histogram_quantile(histogram, 0.95)
+        summary.append({
+            "city_code": city or None,
+            "offer_type": offer or None,
+            **total,
+            # Por hora activa: las horas sin scraping no bajan el ritmo de la ciudad
+            "pages_per_hour": round(total["pages"] / total["hours_active"], 1) if total["hours_active"] else 0,
+            "p50_ms": round(p50, 1) if p50 is not None else None,
+            "p95_ms": round(p95, 1) if p95 is not None else None
+        })
+
+    return {"hours": hours, "series": series, "by_city": summary}
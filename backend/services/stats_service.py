@@ -1,12 +1,14 @@
 """
 Servicio de estadísticas reutilizable
 """
+import os
 from datetime import datetime, timedelta
-from sqlmodel import select, func
+from sqlmodel import select
 from sqlalchemy import text
 import pytz
 
 COLOMBIA_TZ = pytz.timezone('America/Bogota')
+ALERT_WINDOW_HOURS = int(os.getenv("ALERT_WINDOW_HOURS", "168"))
 
 def get_local_now():
     """Obtener la hora actual en timezone de Colombia"""
@@ -57,100 +59,20 @@ def get_recent_logs(session, limit: int = 10):
 
 
 def get_next_executions(session, limit: int = 5):
-    """Obtener próximas ejecuciones basadas en lógica de orden alfabético"""
+    """Próximas ejecuciones con arranque y fin estimados según el historial de cada ciudad"""
+    from services.scraper_eta import estimate_schedule
+    
     try:
-        now = get_local_now()
-        
-        # Determinar cuál es la ciudad que se está ejecutando actualmente
-        current_city_query = text("""
-            SELECT city_code, offer_type FROM scraper_logs 
-            ORDER BY timestamp DESC LIMIT 1
-        """)
-        
-        current_result = session.exec(current_city_query).first()
-        current_city_code = current_result[0] if current_result else None
-        current_offer_type = current_result[1] if current_result else None
-        
-        # Obtener información de ciudades y su progreso
-        cities_query = text("""
-            SELECT 
-                c.name,
-                c.website_name,
-                c.current_sell_offset,
-                c.sell_pages_limit,
-                c.current_rent_offset,
-                c.rent_pages_limit,
-                c.updated
-            FROM city c
-            WHERE c.updated = false
-            ORDER BY c.name ASC
-        """)
-        
-        cities_result = session.exec(cities_query).fetchall()
-        
-        executions = []
-        
-        next_execution_time = now.replace(second=0, microsecond=0)
-        if next_execution_time.minute < 30:
-            next_execution_time = next_execution_time.replace(minute=30)
-        else:
-            next_execution_time = next_execution_time.replace(minute=30) + timedelta(hours=1)
-        
-        execution_count = 0
-        for city_row in cities_result:
-            if execution_count >= limit:
-                break
-                
-            name, website_name, sell_offset, sell_limit, rent_offset, rent_limit, updated = city_row
-            
-            sell_completed = sell_offset >= sell_limit if sell_limit > 0 else True
-            rent_completed = rent_offset >= rent_limit if rent_limit > 0 else True
-            
-            if website_name == current_city_code:
-                if current_offer_type == "sell" and not sell_completed:
-                    executions.append({
-                        "city": name,
-                        "type": "sell",
-                        "scheduled_time": next_execution_time.isoformat(),
-                        "minutes_remaining": int((next_execution_time - now).total_seconds() / 60)
-                    })
-                    next_execution_time += timedelta(hours=1)
-                    execution_count += 1
-                elif sell_completed and not rent_completed:
-                    executions.append({
-                        "city": name,
-                        "type": "rent",
-                        "scheduled_time": next_execution_time.isoformat(),
-                        "minutes_remaining": int((next_execution_time - now).total_seconds() / 60)
-                    })
-                    next_execution_time += timedelta(hours=1)
-                    execution_count += 1
-                continue
-            
-            if not sell_completed:
-                executions.append({
-                    "city": name,
-                    "type": "sell",
-                    "scheduled_time": next_execution_time.isoformat(),
-                    "minutes_remaining": int((next_execution_time - now).total_seconds() / 60)
-                })
-                next_execution_time += timedelta(hours=1)
-                execution_count += 1
-                
-                if execution_count >= limit:
-                    break
-            
-            if sell_completed and not rent_completed:
-                executions.append({
-                    "city": name,
-                    "type": "rent",
-                    "scheduled_time": next_execution_time.isoformat(),
-                    "minutes_remaining": int((next_execution_time - now).total_seconds() / 60)
-                })
-                next_execution_time += timedelta(hours=1)
-                execution_count += 1
+        plan = estimate_schedule(session)
+        executions = plan["executions"][:limit]
         
         if not executions:
+            now = get_local_now()
+            next_execution_time = now.replace(second=0, microsecond=0)
+            if next_execution_time.minute < 30:
+                next_execution_time = next_execution_time.replace(minute=30)
+            else:
+                next_execution_time = next_execution_time.replace(minute=30) + timedelta(hours=1)
             executions.append({
                 "city": "Sistema",
                 "type": "info",
@@ -176,103 +98,145 @@ def get_next_executions(session, limit: int = 5):
         }]
 
 
-def get_property_stats(session, city_id=None):
-    """Obtener estadísticas reales de propiedades"""
-    from models.property import Property
-    
+# Sentinelas de property_daily_counts para city_id y fechas NULL (ver migrations/add_property_daily_counts.sql)
+_NO_CITY_ID = 0
+_NO_DATE = "1900-01-01"
+
+
+def _daily_counts(session, query: str, params: dict):
+    """Consulta sobre property_daily_counts; None si la tabla no existe todavía (migración pendiente)"""
     try:
-        today = get_local_now().date()
-        
-        if city_id:
-            total_query = select(func.count(Property.fr_property_id)).where(Property.city_id == city_id)
-            today_query = select(func.count(Property.fr_property_id)).where(
-                Property.city_id == city_id,
-                Property.creation_date == today
-            )
-        else:
-            total_query = select(func.count(Property.fr_property_id))
-            today_query = select(func.count(Property.fr_property_id)).where(Property.creation_date == today)
-        
-        total_properties = session.exec(total_query).first() or 0
-        today_properties = session.exec(today_query).first() or 0
-        
-        return total_properties, today_properties
+        return session.execute(text(query), params).fetchall()
     except Exception as e:
-        print(f"Error getting property stats: {e}")
-        return 0, 0
+        # La transacción queda abortada en Postgres: hay que limpiarla antes del fallback
+        session.rollback()
+        print(f"⚠️ property_daily_counts no disponible, contando sobre property: {e}")
+        return None
 
 
-def get_avg_speed(session):
-    """Calcular páginas por minuto desde PAGE_NAVIGATION logs"""
-    from models.scraper_log import ScraperLog
+def get_property_stats_by_city(session):
+    """Totales, creadas hoy y actualizadas hoy por ciudad en una sola consulta agrupada.
     
+    Returns: {city_id: {"total", "today", "updated_today"}}; las propiedades sin
+    ciudad quedan bajo la clave None para que los totales globales cuadren.
+    """
     try:
-        yesterday = get_local_now() - timedelta(hours=24)
+        today = get_local_now().date()
         
-        page_count_query = select(func.count(ScraperLog.id)).where(
-            ScraperLog.timestamp >= yesterday,
-            ScraperLog.log_type == "PAGE_NAVIGATION"
-        )
+        rows = _daily_counts(session, """
+            SELECT 
+                NULLIF(city_id, :no_city) as city_id,
+                SUM(created) as total,
+                COALESCE(SUM(created) FILTER (WHERE day = :today), 0) as today,
+                COALESCE(SUM(updated) FILTER (WHERE day = :today), 0) as updated_today
+            FROM property_daily_counts
+            GROUP BY city_id
+        """, {"today": today, "no_city": _NO_CITY_ID})
         
-        page_count = session.exec(page_count_query).first()
+        if rows is None:
+            query = text("""
+                SELECT 
+                    city_id,
+                    COUNT(*) as total,
+                    COUNT(*) FILTER (WHERE creation_date = :today) as today,
+                    COUNT(*) FILTER (WHERE last_update = :today) as updated_today
+                FROM property
+                GROUP BY city_id
+            """)
+            rows = session.execute(query, {"today": today}).fetchall()
         
-        if page_count and page_count > 0:
-            pages_per_minute = page_count / 1440
-            return round(float(pages_per_minute), 2)
-        else:
-            return 0.0
+        return {
+            city_id: {"total": int(total), "today": int(today_count), "updated_today": int(updated_today)}
+            for city_id, total, today_count, updated_today in rows
+        }
     except Exception as e:
-        print(f"Error calculating pages per minute: {e}")
-        return 0.0
+        print(f"Error getting property stats by city: {e}")
+        return {}
 
 
-def get_last_execution_time(session):
-    """Obtener tiempo desde la última ejecución"""
-    try:
-        query = text("SELECT MAX(timestamp) FROM scraper_logs")
-        result = session.execute(query).fetchone()
-        
-        if result and result[0]:
-            now = get_local_now()
-            diff = now - result[0]
-            total_seconds = abs(diff.total_seconds())
-            
-            if total_seconds < 60:
-                return "Hace unos segundos"
-            elif total_seconds < 3600:
-                minutes = int(total_seconds // 60)
-                return f"Hace {minutes} min"
-            elif total_seconds < 86400:
-                hours = int(total_seconds // 3600)
-                return f"Hace {hours} hora{'s' if hours > 1 else ''}"
-            else:
-                days = int(total_seconds // 86400)
-                return f"Hace {days} día{'s' if days > 1 else ''}"
-        else:
-            return "N/A"
-            
-    except Exception as e:
-        print(f"Error getting last execution time: {e}")
-        return "N/A"
+def get_summary_counts(session):
+    """Ciudades (total/activas) y propiedades creadas hoy / ayer, total y hasta hace 7 días, en una consulta"""
+    today = get_local_now().date()
+    params = {"today": today, "yesterday": today - timedelta(days=1), "week_ago": today - timedelta(days=7)}
+    city_columns = """
+            (SELECT COUNT(*) FROM city),
+            (SELECT COUNT(*) FILTER (WHERE NOT updated) FROM city)"""
+    
+    rows = _daily_counts(session, f"""
+        SELECT 
+            COALESCE(SUM(created) FILTER (WHERE day = :today), 0),
+            COALESCE(SUM(created) FILTER (WHERE day = :yesterday), 0),
+            COALESCE(SUM(created), 0),
+            COALESCE(SUM(created) FILTER (WHERE day <= :week_ago AND day != :no_date), 0),{city_columns}
+        FROM property_daily_counts
+    """, {**params, "no_date": _NO_DATE})
+    
+    if rows is None:
+        rows = session.execute(text(f"""
+            SELECT 
+                COUNT(*) FILTER (WHERE creation_date = :today),
+                COUNT(*) FILTER (WHERE creation_date = :yesterday),
+                COUNT(*),
+                COUNT(*) FILTER (WHERE creation_date <= :week_ago),{city_columns}
+            FROM property
+        """), params).fetchall()
+    
+    today_count, yesterday_count, total, week_ago_total, cities, active_cities = (int(v) for v in rows[0])
+    return {
+        "today": today_count,
+        "yesterday": yesterday_count,
+        "total": total,
+        "week_ago_total": week_ago_total,
+        "total_cities": cities,
+        "active_cities": active_cities
+    }
 
 
-def get_recent_errors_count(session):
-    """Obtener conteo de errores en las últimas 24h"""
+def get_log_metrics(session):
+    """Velocidad (páginas/min en 24h), última ejecución y errores en 24h, en una consulta sobre scraper_logs"""
     try:
-        yesterday = get_local_now() - timedelta(hours=24)
+        since = get_local_now() - timedelta(hours=24)
         
         query = text("""
-            SELECT COUNT(*) FROM scraper_logs 
-            WHERE timestamp >= :yesterday 
-            AND log_level = 'ERROR'
+            SELECT 
+                COUNT(*) FILTER (WHERE log_type = 'PAGE_NAVIGATION'),
+                COUNT(*) FILTER (WHERE log_level = 'ERROR'),
+                (SELECT MAX(timestamp) FROM scraper_logs)
+            FROM scraper_logs
+            WHERE timestamp >= :since
         """)
-        result = session.execute(query, {"yesterday": yesterday}).fetchone()
-        count = int(result[0]) if result else 0
+        page_count, error_count, last_timestamp = session.execute(query, {"since": since}).fetchone()
         
-        return count
+        return {
+            "avg_speed_ms": round(float(page_count / 1440), 2) if page_count else 0.0,
+            "last_execution_time": _format_elapsed(last_timestamp),
+            "recent_errors_count": int(error_count or 0)
+        }
     except Exception as e:
-        print(f"Error getting recent errors count: {e}")
-        return 0
+        print(f"Error getting log metrics: {e}")
+        return {"avg_speed_ms": 0.0, "last_execution_time": "N/A", "recent_errors_count": 0}
+
+
+def _format_elapsed(timestamp):
+    """'Hace N min/horas/días' desde `timestamp` ("N/A" si no hay)"""
+    if not timestamp:
+        return "N/A"
+    
+    now = get_local_now()
+    diff = now - timestamp
+    total_seconds = abs(diff.total_seconds())
+    
+    if total_seconds < 60:
+        return "Hace unos segundos"
+    elif total_seconds < 3600:
+        minutes = int(total_seconds // 60)
+        return f"Hace {minutes} min"
+    elif total_seconds < 86400:
+        hours = int(total_seconds // 3600)
+        return f"Hace {hours} hora{'s' if hours > 1 else ''}"
+    else:
+        days = int(total_seconds // 86400)
+        return f"Hace {days} día{'s' if days > 1 else ''}"
 
 
 def get_system_alerts(session):
@@ -285,10 +249,11 @@ def get_system_alerts(session):
                     city_code,
                     offer_type,
                     message,
-                    timestamp,
-                    ROW_NUMBER() OVER (PARTITION BY LOWER(log_level) ORDER BY timestamp DESC) as rn
+                    timestamp
                 FROM scraper_logs
                 WHERE log_level IS NOT NULL
+                    AND timestamp >= :since
+                ORDER BY LOWER(log_level), timestamp DESC
             )
             SELECT 
                 ll.log_level,
@@ -298,13 +263,13 @@ def get_system_alerts(session):
                 ll.timestamp
             FROM latest_logs ll
             LEFT JOIN city c ON ll.city_code = c.website_name
-            WHERE ll.rn = 1
             ORDER BY ll.timestamp DESC
             LIMIT 10
         """)
         
-        result = session.exec(sql_query)
-        rows = result.fetchall()
+        # Ventana acotada: con scraper_logs particionada solo se leen las particiones recientes
+        since = get_local_now() - timedelta(hours=ALERT_WINDOW_HOURS)
+        rows = session.execute(sql_query, {"since": since}).fetchall()
         
         alerts = []
         level_map = {
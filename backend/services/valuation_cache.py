@@ -0,0 +1,123 @@
+"""
+Cache LRU + TTL de predicciones de avalúo
+
+La clave es el vector de features ya normalizado (salida de
+_normalize_categoricals) con lat/lon redondeadas a VALUATION_CACHE_LATLON_DECIMALS
+(5 decimales ≈ 1 m), así cambiar campos del formulario que el modelo no usa o
+reabrir un avalúo guardado no vuelve a correr los árboles. El valor guardado es
+el de la primera predicción para esa clave.
+
+La clave incluye la versión del modelo que respondió. Además se vigila la huella
+(versión activa + mtime y tamaño de sus archivos): si cambia, el cache se vacía
+entero. La huella se revisa como mucho cada VALUATION_CACHE_CHECK_SECONDS para
+no hacer stat por request.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+MAX_ENTRIES = int(os.getenv("VALUATION_CACHE_MAX_ENTRIES", "10000"))
+TTL_SECONDS = int(os.getenv("VALUATION_CACHE_TTL_SECONDS", "86400"))
+LATLON_DECIMALS = int(os.getenv("VALUATION_CACHE_LATLON_DECIMALS", "5"))
+CHECK_SECONDS = float(os.getenv("VALUATION_CACHE_CHECK_SECONDS", "5"))
+_ROUNDED = ("latitude", "longitude")
+
+
+def file_fingerprint(paths) -> tuple:
+    """(ruta, mtime_ns, tamaño) de cada archivo; None si no existe"""
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            fingerprint.append((path, None, None))
+    return tuple(fingerprint)
+
+
+class ValuationCache:
+    """offer + features normalizadas → precio/m²"""
+
+    def __init__(self, fingerprint: Callable[[], tuple], max_entries: int = MAX_ENTRIES,
+                 ttl_seconds: int = TTL_SECONDS, latlon_decimals: int = LATLON_DECIMALS):
+        self._fingerprint = fingerprint
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.latlon_decimals = latlon_decimals
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._current = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def key(self, offer: str, model_input: dict, version: Optional[str] = None) -> tuple:
+        items = []
+        for name, value in sorted(model_input.items()):
+            if name in _ROUNDED and value is not None:
+                value = round(float(value), self.latlon_decimals)
+            items.append((name, value))
+        return (offer, version, tuple(items))
+
+    def _check_fingerprint(self):
+        """Vacía el cache si cambiaron los archivos del modelo. Llamar con el lock tomado."""
+        now = time.monotonic()
+        if now - self._checked_at < CHECK_SECONDS and self._current is not None:
+            return
+        self._checked_at = now
+        fingerprint = self._fingerprint()
+        if self._current is not None and fingerprint != self._current:
+            self._entries.clear()
+            self.invalidations += 1
+            print("♻️ Archivos del modelo cambiaron: cache de avalúos vaciado")
+        self._current = fingerprint
+
+    def get(self, key: tuple) -> Optional[float]:
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            self._check_fingerprint()
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, value: float):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_fingerprint()
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "latlon_decimals": self.latlon_decimals,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
@@ -0,0 +1,129 @@
+"""
+Servicio de polígonos de zona (concave hulls) construidos offline con shapely
+
+Reemplaza la aproximación de percentiles 20/80 de lat/lng por la forma real
+de cada (city_id, location_main): concave hull de las coordenadas de las
+propiedades, recortando puntos atípicos y simplificada para el mapa.
+"""
+import os
+import time
+import threading
+from datetime import datetime
+from collections import defaultdict
+
+from sqlalchemy import text, delete
+from sqlmodel import select
+
+from models.zone_polygon import ZonePolygon
+
+HULL_RATIO = float(os.getenv("ZONE_HULL_RATIO", "0.3"))
+SIMPLIFY_TOLERANCE = float(os.getenv("ZONE_SIMPLIFY_TOLERANCE", "0.0005"))  # grados (~50 m)
+MIN_POINTS = int(os.getenv("ZONE_MIN_POINTS", "4"))
+# Percentil de distancia a la mediana de la zona a partir del cual un punto se descarta
+OUTLIER_PERCENTILE = float(os.getenv("ZONE_OUTLIER_PERCENTILE", "95"))
+POLYGONS_CACHE_SECONDS = int(os.getenv("ZONE_POLYGONS_CACHE_SECONDS", "3600"))
+
+
+def _zone_geometry(coords):
+    """Concave hull simplificado de una lista de (lng, lat), o None si no alcanza"""
+    import numpy as np
+    import shapely
+    from shapely.geometry import MultiPoint
+
+    points = np.asarray(coords, dtype=float)
+    if len(points) < MIN_POINTS:
+        return None
+
+    # Las coordenadas scrapeadas traen errores groseros: descartar las más lejanas a la mediana
+    median = np.median(points, axis=0)
+    dist = np.hypot(*(points - median).T)
+    points = points[dist <= np.percentile(dist, OUTLIER_PERCENTILE)]
+    if len(points) < MIN_POINTS:
+        return None
+
+    hull = shapely.concave_hull(MultiPoint(points), ratio=HULL_RATIO)
+    if hull.geom_type != "Polygon":
+        # Puntos colineales o repetidos: un buffer mínimo para tener área visible
+        hull = hull.buffer(SIMPLIFY_TOLERANCE)
+    hull = hull.simplify(SIMPLIFY_TOLERANCE, preserve_topology=True)
+    return shapely.set_precision(hull, 1e-5)
+
+
+def build_zone_polygons(session, city_id: int = None) -> int:
+    """Reconstruye los polígonos de una ciudad (o de todas) y los guarda. Devuelve cuántos."""
+    import shapely
+    from shapely.geometry import mapping
+
+    city_filter = "AND city_id = :city_id" if city_id else ""
+    rows = session.execute(text(f"""
+        SELECT city_id, location_main, longitude, latitude
+        FROM property
+        WHERE location_main IS NOT NULL AND location_main != ''
+            AND latitude IS NOT NULL AND longitude IS NOT NULL
+            AND city_id IS NOT NULL
+            {city_filter}
+    """), {"city_id": city_id} if city_id else {}).fetchall()
+
+    zones = defaultdict(list)
+    for zone_city_id, location_main, lng, lat in rows:
+        zones[(zone_city_id, location_main)].append((float(lng), float(lat)))
+
+    polygons = []
+    now = datetime.utcnow()
+    for (zone_city_id, location_main), coords in zones.items():
+        geom = _zone_geometry(coords)
+        if geom is None or geom.is_empty:
+            continue
+        polygons.append(ZonePolygon(
+            city_id=zone_city_id,
+            location_main=location_main,
+            geojson=mapping(geom),
+            wkb=shapely.to_wkb(geom),
+            property_count=len(coords),
+            updated_at=now
+        ))
+
+    # Reemplazo completo por ciudad en una sola transacción
+    stmt = delete(ZonePolygon)
+    if city_id:
+        stmt = stmt.where(ZonePolygon.city_id == city_id)
+    session.execute(stmt)
+    session.add_all(polygons)
+    session.commit()
+
+    with _CACHE_LOCK:
+        _CACHE.clear()
+    return len(polygons)
+
+
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def get_city_polygons(session, city_id: int) -> dict:
+    """FeatureCollection de los polígonos de una ciudad (cacheada en memoria)"""
+    with _CACHE_LOCK:
+        cached = _CACHE.get(city_id)
+        if cached and time.time() - cached[0] < POLYGONS_CACHE_SECONDS:
+            return cached[1]
+
+    polygons = session.exec(
+        select(ZonePolygon.location_main, ZonePolygon.property_count, ZonePolygon.geojson)
+        .where(ZonePolygon.city_id == city_id)
+        .order_by(ZonePolygon.location_main)
+    ).all()
+
+    collection = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {"name": location_main, "property_count": property_count},
+                "geometry": geojson
+            }
+            for location_main, property_count, geojson in polygons
+        ]
+    }
+    with _CACHE_LOCK:
+        _CACHE[city_id] = (time.time(), collection)
+    return collection
@@ -0,0 +1,236 @@
+"""
+Servicio de sketches de cuantiles por zona
+
+Cada (city_id, location_main, offer) guarda un KLLSketch de precio, área y
+precio/m² en zone_sketch, y responden medianas, percentiles y límites de
+outliers por IQR sin volver a recorrer property.
+
+Un KLLSketch no sabe restar: si se agregara cada versión de una publicación
+re-scrapeada, la zona la contaría varias veces. Por eso nunca se suma sobre lo
+que hay: la zona tocada se recalcula entera desde el estado actual de property
+(rebuild_zones), así cada publicación cuenta una vez con su valor vigente. Las
+zonas se marcan como sucias al escribir (ingesta de propiedades, también la
+zona vieja de una publicación que cambió de zona) y un hilo las recalcula cada
+ZONE_SKETCH_FLUSH_SECONDS; el cron diario (update_zone_sketches) recalcula las
+zonas con last_update nuevo por si algo se escribió por otro camino.
+"""
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+from collections import defaultdict
+
+from sqlalchemy import text, delete, tuple_
+from sqlmodel import Session, select
+
+from models.zone_sketch import ZoneSketch
+from models.rollup_watermark import RollupWatermark
+from services.quantile_sketch import KLLSketch
+from services.stats_service import get_local_now
+
+WATERMARK_NAME = "zone_sketches"
+SKETCH_CACHE_SECONDS = int(os.getenv("ZONE_SKETCH_CACHE_SECONDS", "600"))
+FLUSH_SECONDS = float(os.getenv("ZONE_SKETCH_FLUSH_SECONDS", "30"))
+REBUILD_CHUNK = 500
+METRICS = ("price", "area", "price_m2")
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+def observe_properties(session, rows) -> int:
+    """Agrega filas (city_id, location_main, offer, price, area) a sus sketches. No hace commit."""
+    grouped = defaultdict(list)
+    for city_id, location_main, offer, price, area in rows:
+        if city_id is None or not location_main or offer not in ("sell", "rent"):
+            continue
+        if not price or not area or price <= 0 or area <= 0:
+            continue
+        grouped[(city_id, location_main, offer)].append((float(price), float(area)))
+    if not grouped:
+        return 0
+
+    city_ids = {key[0] for key in grouped}
+    existing = {
+        (s.city_id, s.location_main, s.offer): s
+        for s in session.exec(select(ZoneSketch).where(ZoneSketch.city_id.in_(city_ids))).all()
+    }
+
+    observed = 0
+    now = datetime.utcnow()
+    for key, values in grouped.items():
+        row = existing.get(key) or ZoneSketch(city_id=key[0], location_main=key[1], offer=key[2])
+        sketches = {metric: KLLSketch.from_dict(getattr(row, metric)) for metric in METRICS}
+        for price, area in values:
+            sketches["price"].update(price)
+            sketches["area"].update(area)
+            sketches["price_m2"].update(price / area)
+        for metric in METRICS:
+            setattr(row, metric, sketches[metric].to_dict())
+        row.n = sketches["price"].n
+        row.updated_at = now
+        session.add(row)
+        observed += len(values)
+
+    with _CACHE_LOCK:
+        _CACHE.clear()
+    return observed
+
+
+def rebuild_zones(session, zones) -> int:
+    """Recalcula desde cero los sketches de las (city_id, location_main) dadas. No hace commit."""
+    zones = sorted({(city_id, zone) for city_id, zone in zones if city_id is not None and zone})
+    observed = 0
+    for start in range(0, len(zones), REBUILD_CHUNK):
+        chunk = zones[start:start + REBUILD_CHUNK]
+        session.execute(delete(ZoneSketch).where(
+            tuple_(ZoneSketch.city_id, ZoneSketch.location_main).in_(chunk)
+        ))
+        rows = session.execute(text("""
+            SELECT p.city_id, p.location_main, p.offer, p.price, p.area
+            FROM property p
+            JOIN unnest(CAST(:city_ids AS integer[]), CAST(:zones AS text[])) AS z(city_id, location_main)
+                ON p.city_id = z.city_id AND p.location_main = z.location_main
+            WHERE p.area > 0 AND p.price > 0
+        """), {"city_ids": [c for c, _ in chunk], "zones": [z for _, z in chunk]}).fetchall()
+        observed += observe_properties(session, rows)
+    return observed
+
+
+def update_zone_sketches(session, rebuild: bool = False) -> int:
+    """Recalcula las zonas con propiedades de last_update posterior a la marca de agua (hasta ayer).
+
+    Se corta en ayer porque el día en curso todavía recibe filas (las zonas de
+    hoy ya las recalcula la ingesta). rebuild=True recalcula todas las zonas:
+    además saca las publicaciones borradas, que no marcan su zona.
+    """
+    watermark = session.get(RollupWatermark, WATERMARK_NAME)
+    through = get_local_now().date() - timedelta(days=1)
+
+    if rebuild or watermark is None or not watermark.value:
+        session.execute(delete(ZoneSketch))
+        rows = session.execute(text("""
+            SELECT p.city_id, p.location_main, p.offer, p.price, p.area
+            FROM property p
+            WHERE p.location_main IS NOT NULL
+                AND p.city_id IS NOT NULL
+                AND p.area > 0 AND p.price > 0
+        """)).fetchall()
+        observed = observe_properties(session, rows)
+    else:
+        touched = session.execute(text("""
+            SELECT DISTINCT p.city_id, p.location_main
+            FROM property p
+            WHERE p.location_main IS NOT NULL
+                AND p.city_id IS NOT NULL
+                AND p.last_update > :since AND p.last_update <= :through
+        """), {
+            "since": datetime.strptime(watermark.value, "%Y-%m-%d").date(),
+            "through": through
+        }).fetchall()
+        observed = rebuild_zones(session, touched)
+
+    watermark = watermark or RollupWatermark(name=WATERMARK_NAME)
+    watermark.value = through.isoformat()
+    watermark.updated_at = datetime.utcnow()
+    session.add(watermark)
+    session.commit()
+    return observed
+
+
+class ZoneSketchUpdater:
+    """Zonas sucias por escrituras de property, recalculadas por un hilo cada FLUSH_SECONDS"""
+
+    def __init__(self):
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.rebuilt_zones = 0
+        self.last_error = None
+
+    def mark(self, zones):
+        zones = {(city_id, zone) for city_id, zone in zones if city_id is not None and zone}
+        if not zones:
+            return
+        with self._lock:
+            self._dirty |= zones
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="zone-sketch-updater", daemon=True)
+                self._thread.start()
+
+    def flush(self) -> int:
+        with self._lock:
+            zones, self._dirty = self._dirty, set()
+        if not zones:
+            return 0
+        from config.db_connection import engine
+        try:
+            with Session(engine) as session:
+                rebuild_zones(session, zones)
+                session.commit()
+        except Exception as e:
+            # Se reintentan en la próxima vuelta (y el cron diario las recalcula igual)
+            with self._lock:
+                self._dirty |= zones
+            self.last_error = str(e)
+            print(f"⚠️ No se pudieron recalcular los sketches de {len(zones)} zonas: {e}")
+            return 0
+        self.rebuilt_zones += len(zones)
+        return len(zones)
+
+    def _run(self):
+        while True:
+            time.sleep(FLUSH_SECONDS)
+            self.flush()
+            with self._lock:
+                if not self._dirty:
+                    self._thread = None
+                    return
+
+
+zone_sketch_updater = ZoneSketchUpdater()
+
+
+def _summary(sketch: KLLSketch) -> dict:
+    p10, p25, p50, p75, p90 = (sketch.quantile(q) for q in QUANTILES)
+    iqr = p75 - p25
+    return {
+        'n': sketch.n,
+        'p10': p10, 'p25': p25, 'median': p50, 'p75': p75, 'p90': p90,
+        'iqr': iqr,
+        'lower_fence': p25 - 1.5 * iqr,
+        'upper_fence': p75 + 1.5 * iqr
+    }
+
+
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def get_zone_quantiles(session, location_main: str, city_id: int = None) -> dict:
+    """Resumen de cuantiles por oferta y métrica: {offer: {metric: summary}}.
+
+    Son de todas las publicaciones de la zona (sin filtros de tipo ni fecha).
+    Sin city_id se combinan (merge) los sketches de la zona en todas las ciudades.
+    """
+    cache_key = (location_main, city_id)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(cache_key)
+        if cached and time.time() - cached[0] < SKETCH_CACHE_SECONDS:
+            return cached[1]
+
+    query = select(ZoneSketch).where(ZoneSketch.location_main == location_main)
+    if city_id:
+        query = query.where(ZoneSketch.city_id == city_id)
+
+    merged = {}
+    for row in session.exec(query).all():
+        offer_sketches = merged.setdefault(row.offer, {metric: KLLSketch() for metric in METRICS})
+        for metric in METRICS:
+            offer_sketches[metric].merge(KLLSketch.from_dict(getattr(row, metric)))
+
+    result = {
+        offer: {metric: _summary(sketch) for metric, sketch in sketches.items() if sketch.n}
+        for offer, sketches in merged.items()
+    }
+    with _CACHE_LOCK:
+        _CACHE[cache_key] = (time.time(), result)
+    return result
@@ -0,0 +1,7 @@
+"""
+Configuración de pytest: los tests importan los módulos del backend como lo hace la app
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
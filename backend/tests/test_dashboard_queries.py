@@ -0,0 +1,80 @@
+"""
+El payload del dashboard se arma con un número fijo de consultas, sin importar
+cuántas ciudades haya (los conteos por ciudad salen de una consulta agrupada).
+
+Corre contra SQLite en memoria: las consultas exclusivas de Postgres fallan y
+caen a su respaldo, pero eso pasa igual con 1 ciudad que con N.
+"""
+from sqlalchemy import event, text
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine
+
+from models.city import City
+from models.property import Property
+from services.stats_service import get_local_now
+import routers.dashboard as dashboard
+import services.scraper_eta as scraper_eta
+
+PROPERTIES_PER_CITY = 3
+
+# SQLite no admite autoincrement con la PK compuesta (id, timestamp) del modelo
+_SCRAPER_LOGS_DDL = """
+    CREATE TABLE scraper_logs (
+        id INTEGER PRIMARY KEY, timestamp DATETIME, scraper_name VARCHAR(50),
+        city_code VARCHAR(50), offer_type VARCHAR(10), page_number INTEGER,
+        log_level VARCHAR(20), log_type VARCHAR(50), message TEXT,
+        execution_time_ms FLOAT, properties_found INTEGER, properties_validated INTEGER,
+        error_type VARCHAR(100), session_id VARCHAR(100), scheduled_time DATETIME
+    )
+"""
+
+
+def _engine_with_cities(n: int):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine, tables=[City.__table__, Property.__table__])
+    with engine.begin() as conn:
+        conn.execute(text(_SCRAPER_LOGS_DDL))
+    today = get_local_now().date()
+    with Session(engine) as session:
+        for i in range(n):
+            city = City(name=f"Ciudad {i}", website_name=f"ciudad-{i}",
+                        sell_pages_limit=10, rent_pages_limit=10)
+            session.add(city)
+            session.flush()
+            for j in range(PROPERTIES_PER_CITY):
+                session.add(Property(
+                    fr_property_id=i * 100 + j, offer="sell", city_id=city.id,
+                    area=60.0, price=250_000_000.0, creation_date=today, last_update=today
+                ))
+        session.commit()
+    return engine
+
+
+def _build_counting_queries(monkeypatch, engine):
+    monkeypatch.setattr(dashboard, "engine", engine)
+    # El plan de ETA se cachea por proceso: cada build debe partir del mismo estado
+    monkeypatch.setattr(scraper_eta, "_MODEL", scraper_eta.PageDurationModel())
+    monkeypatch.setattr(scraper_eta, "_CACHE", {"at": 0.0, "plan": None})
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        payload = dashboard._build_dashboard()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return payload, statements
+
+
+def test_dashboard_query_count_does_not_grow_with_cities(monkeypatch):
+    payload_one, queries_one = _build_counting_queries(monkeypatch, _engine_with_cities(1))
+    payload_many, queries_many = _build_counting_queries(monkeypatch, _engine_with_cities(25))
+
+    assert len(payload_one["data"]["cities"]) == 1
+    assert len(payload_many["data"]["cities"]) == 25
+    assert payload_many["data"]["summary"]["properties_total"] == 25 * PROPERTIES_PER_CITY
+    assert all(c["properties_total"] == PROPERTIES_PER_CITY for c in payload_many["data"]["cities"])
+    assert len(queries_one) == len(queries_many), (queries_one, queries_many)
@@ -0,0 +1,5 @@
+-- Hash del contenido scrapeado para la ingesta masiva (POST /api/ingest/properties)
+-- Ejecutar con: python backend/scripts/run_migration.py migrations/add_property_content_hash.sql
+-- Las filas existentes quedan con hash NULL y se completan la primera vez que el
+-- scraper las vuelve a enviar (evita reescribir toda la tabla en la migración).
+ALTER TABLE property ADD COLUMN IF NOT EXISTS content_hash varchar(32);
@@ -0,0 +1,110 @@
+-- Conteos diarios de propiedades por ciudad y oferta, mantenidos por triggers
+-- Ejecutar con: python backend/scripts/run_migration.py migrations/add_property_daily_counts.sql
+--
+-- created = propiedades cuyo creation_date es ese día; updated = cuyo last_update es ese día.
+-- Son conteos del estado actual de property (no eventos): un UPDATE que mueve last_update
+-- resta en el día viejo y suma en el nuevo, y un DELETE resta. Así
+--   SUM(created) por ciudad            = COUNT(*) de property de la ciudad
+--   created / updated del día          = COUNT(*) FILTER (creation_date / last_update = día)
+-- city_id NULL se guarda como 0 y las fechas NULL como 1900-01-01 (el PK no admite NULL).
+
+CREATE TABLE IF NOT EXISTS property_daily_counts (
+    city_id integer NOT NULL,
+    day date NOT NULL,
+    offer varchar(10) NOT NULL,
+    created integer NOT NULL DEFAULT 0,
+    updated integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (city_id, day, offer)
+);
+
+CREATE OR REPLACE FUNCTION property_daily_counts_apply() RETURNS trigger AS $$
+BEGIN
+    -- Triggers por sentencia con tablas de transición: un COPY o un INSERT masivo
+    -- hace un solo upsert agrupado en vez de uno por fila
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO property_daily_counts AS t (city_id, day, offer, created, updated)
+        SELECT city_id, day, offer, SUM(created), SUM(updated)
+        FROM (
+            SELECT COALESCE(city_id, 0) AS city_id, COALESCE(creation_date, DATE '1900-01-01') AS day,
+                   COALESCE(offer, '') AS offer, 1 AS created, 0 AS updated
+            FROM new_rows
+            UNION ALL
+            SELECT COALESCE(city_id, 0), COALESCE(last_update, DATE '1900-01-01'), COALESCE(offer, ''), 0, 1
+            FROM new_rows
+        ) d
+        GROUP BY city_id, day, offer
+        ON CONFLICT (city_id, day, offer) DO UPDATE
+            SET created = t.created + EXCLUDED.created, updated = t.updated + EXCLUDED.updated;
+
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO property_daily_counts AS t (city_id, day, offer, created, updated)
+        SELECT city_id, day, offer, SUM(created), SUM(updated)
+        FROM (
+            SELECT COALESCE(city_id, 0) AS city_id, COALESCE(creation_date, DATE '1900-01-01') AS day,
+                   COALESCE(offer, '') AS offer, -1 AS created, 0 AS updated
+            FROM old_rows
+            UNION ALL
+            SELECT COALESCE(city_id, 0), COALESCE(last_update, DATE '1900-01-01'), COALESCE(offer, ''), 0, -1
+            FROM old_rows
+        ) d
+        GROUP BY city_id, day, offer
+        ON CONFLICT (city_id, day, offer) DO UPDATE
+            SET created = t.created + EXCLUDED.created, updated = t.updated + EXCLUDED.updated;
+
+    ELSE
+        -- UPDATE: -1 en la clave vieja, +1 en la nueva; las filas que no cambian de
+        -- clave se anulan en el GROUP BY y no tocan la tabla
+        INSERT INTO property_daily_counts AS t (city_id, day, offer, created, updated)
+        SELECT city_id, day, offer, SUM(created), SUM(updated)
+        FROM (
+            SELECT COALESCE(city_id, 0) AS city_id, COALESCE(creation_date, DATE '1900-01-01') AS day,
+                   COALESCE(offer, '') AS offer, 1 AS created, 0 AS updated
+            FROM new_rows
+            UNION ALL
+            SELECT COALESCE(city_id, 0), COALESCE(last_update, DATE '1900-01-01'), COALESCE(offer, ''), 0, 1
+            FROM new_rows
+            UNION ALL
+            SELECT COALESCE(city_id, 0), COALESCE(creation_date, DATE '1900-01-01'), COALESCE(offer, ''), -1, 0
+            FROM old_rows
+            UNION ALL
+            SELECT COALESCE(city_id, 0), COALESCE(last_update, DATE '1900-01-01'), COALESCE(offer, ''), 0, -1
+            FROM old_rows
+        ) d
+        GROUP BY city_id, day, offer
+        HAVING SUM(created) != 0 OR SUM(updated) != 0
+        ON CONFLICT (city_id, day, offer) DO UPDATE
+            SET created = t.created + EXCLUDED.created, updated = t.updated + EXCLUDED.updated;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS property_daily_counts_insert ON property;
+DROP TRIGGER IF EXISTS property_daily_counts_update ON property;
+DROP TRIGGER IF EXISTS property_daily_counts_delete ON property;
+
+CREATE TRIGGER property_daily_counts_insert AFTER INSERT ON property
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION property_daily_counts_apply();
+CREATE TRIGGER property_daily_counts_update AFTER UPDATE ON property
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION property_daily_counts_apply();
+CREATE TRIGGER property_daily_counts_delete AFTER DELETE ON property
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION property_daily_counts_apply();
+
+-- Backfill: se bloquean las escrituras de property mientras se recalcula, para
+-- que ningún cambio quede fuera del conteo inicial ni se cuente dos veces
+LOCK TABLE property IN SHARE MODE;
+TRUNCATE property_daily_counts;
+INSERT INTO property_daily_counts (city_id, day, offer, created, updated)
+SELECT city_id, day, offer, SUM(created), SUM(updated)
+FROM (
+    SELECT COALESCE(city_id, 0) AS city_id, COALESCE(creation_date, DATE '1900-01-01') AS day,
+           COALESCE(offer, '') AS offer, 1 AS created, 0 AS updated
+    FROM property
+    UNION ALL
+    SELECT COALESCE(city_id, 0), COALESCE(last_update, DATE '1900-01-01'), COALESCE(offer, ''), 0, 1
+    FROM property
+) d
+GROUP BY city_id, day, offer;
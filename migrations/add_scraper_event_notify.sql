@@ -0,0 +1,93 @@
+-- Notificaciones en vivo para /api/stream/scraper-events (LISTEN scraper_events)
+-- Ejecutar con: python backend/scripts/run_migration.py migrations/add_scraper_event_notify.sql
+--
+-- NOTIFY se entrega al hacer COMMIT (los rollbacks no notifican). El payload de
+-- NOTIFY está limitado a 8000 bytes, por eso el mensaje del log se recorta.
+--
+-- Los logs notifican una vez por sentencia (no por fila): un COPY/INSERT de miles de
+-- filas produce un solo NOTIFY con el conteo y las filas más recientes que caben en
+-- el payload; el resto se informa en "omitted".
+
+DROP TRIGGER IF EXISTS scraper_logs_notify ON scraper_logs;
+DROP FUNCTION IF EXISTS notify_scraper_log();
+
+CREATE OR REPLACE FUNCTION notify_scraper_logs() RETURNS trigger AS $$
+DECLARE
+    total integer;
+    entry text;
+    entries text[] := '{}';
+    payload_bytes integer := 0;
+BEGIN
+    SELECT COUNT(*) INTO total FROM new_logs;
+    IF total = 0 THEN
+        RETURN NULL;
+    END IF;
+
+    -- De la más nueva a la más vieja hasta llenar el payload; se envían en orden de id
+    FOR entry IN
+        SELECT json_build_object(
+            'id', id,
+            'timestamp', timestamp,
+            'scraper_name', scraper_name,
+            'city_code', city_code,
+            'offer_type', offer_type,
+            'page_number', page_number,
+            'log_level', LOWER(log_level::text),
+            'log_type', LOWER(log_type::text),
+            'message', LEFT(message, 1000),
+            'execution_time_ms', execution_time_ms,
+            'properties_found', properties_found,
+            'properties_validated', properties_validated
+        )::text
+        FROM new_logs
+        ORDER BY id DESC
+        LIMIT 100
+    LOOP
+        EXIT WHEN payload_bytes + octet_length(entry) > 7500;
+        entries := array_prepend(entry, entries);
+        payload_bytes := payload_bytes + octet_length(entry) + 1;
+    END LOOP;
+
+    PERFORM pg_notify('scraper_events', json_build_object(
+        'type', 'logs',
+        'count', total,
+        'omitted', total - cardinality(entries),
+        'logs', ('[' || array_to_string(entries, ',') || ']')::json
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_city_progress() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('scraper_events', json_build_object(
+        'type', 'city',
+        'id', NEW.id,
+        'name', NEW.name,
+        'website_name', NEW.website_name,
+        'current_sell_offset', NEW.current_sell_offset,
+        'current_rent_offset', NEW.current_rent_offset,
+        'sell_pages_limit', NEW.sell_pages_limit,
+        'rent_pages_limit', NEW.rent_pages_limit,
+        'updated', NEW.updated,
+        'last_updated', NEW.last_updated
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER scraper_logs_notify AFTER INSERT ON scraper_logs
+    REFERENCING NEW TABLE AS new_logs
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_scraper_logs();
+
+-- Solo cuando cambia el progreso: evita notificar updates que no mueven nada
+DROP TRIGGER IF EXISTS city_progress_notify ON city;
+CREATE TRIGGER city_progress_notify AFTER UPDATE ON city
+    FOR EACH ROW
+    WHEN (
+        OLD.current_sell_offset IS DISTINCT FROM NEW.current_sell_offset
+        OR OLD.current_rent_offset IS DISTINCT FROM NEW.current_rent_offset
+        OR OLD.updated IS DISTINCT FROM NEW.updated
+        OR OLD.last_updated IS DISTINCT FROM NEW.last_updated
+    )
+    EXECUTE FUNCTION notify_city_progress();
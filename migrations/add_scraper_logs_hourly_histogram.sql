@@ -0,0 +1,14 @@
+-- Throughput del scraper sobre el rollup scraper_logs_hourly (reemplaza scraper_throughput_hourly)
+-- Ejecutar con: python backend/scripts/run_migration.py migrations/add_scraper_logs_hourly_histogram.sql
+-- Requiere migrations/partition_scraper_logs.sql.
+--
+-- Agrega el histograma de execution_time_ms al rollup horario y borra el rollup de
+-- throughput duplicado. La marca de agua se reinicia para que el próximo
+-- maintain_scraper_logs.py recalcule (con histograma) todas las horas que aún tienen
+-- logs crudos; las horas ya sin particiones conservan sus conteos.
+
+ALTER TABLE scraper_logs_hourly
+    ADD COLUMN IF NOT EXISTS execution_ms_histogram jsonb NOT NULL DEFAULT '{}';
+
+DROP TABLE IF EXISTS scraper_throughput_hourly;
+DELETE FROM rollup_watermark WHERE name IN ('scraper_throughput', 'scraper_logs_hourly', 'scraper_logs_hourly_id');
@@ -0,0 +1,83 @@
+-- Particiona scraper_logs por mes sobre timestamp y agrega el rollup horario
+-- Ejecutar con: python backend/scripts/run_migration.py migrations/partition_scraper_logs.sql
+-- Después, programar backend/scripts/maintain_scraper_logs.py (crea particiones futuras,
+-- actualiza el rollup horario y aplica la retención).
+--
+-- La tabla vieja se renombra, se crea la particionada con las mismas columnas y se copian
+-- los datos. La PK pasa a ser (id, timestamp): Postgres exige que incluya la clave de
+-- partición. Las filas sin timestamp no pueden ubicarse en ninguna partición y se descartan.
+
+ALTER TABLE scraper_logs RENAME TO scraper_logs_legacy;
+-- La secuencia del id sobrevive al DROP de la tabla vieja y la sigue usando la nueva
+ALTER SEQUENCE scraper_logs_id_seq OWNED BY NONE;
+
+CREATE TABLE scraper_logs (LIKE scraper_logs_legacy INCLUDING DEFAULTS)
+    PARTITION BY RANGE (timestamp);
+ALTER TABLE scraper_logs ADD PRIMARY KEY (id, timestamp);
+
+-- Red de seguridad: si el mantenimiento no corre y un log cae fuera de las particiones
+-- mensuales, va aquí en vez de fallar el INSERT. maintain_scraper_logs.py avisa si tiene filas.
+CREATE TABLE scraper_logs_default PARTITION OF scraper_logs DEFAULT;
+
+CREATE INDEX IF NOT EXISTS ix_scraper_logs_timestamp ON scraper_logs (timestamp DESC);
+CREATE INDEX IF NOT EXISTS ix_scraper_logs_level_timestamp ON scraper_logs (log_level, timestamp DESC);
+CREATE INDEX IF NOT EXISTS ix_scraper_logs_type_timestamp ON scraper_logs (log_type, timestamp DESC);
+CREATE INDEX IF NOT EXISTS ix_scraper_logs_city_offer_timestamp ON scraper_logs (city_code, offer_type, timestamp DESC);
+
+-- Crea (si faltan) las particiones mensuales desde from_month hasta months_ahead meses
+-- después del mes actual. Nombre: scraper_logs_YYYYMM.
+-- Postgres no deja crear una partición cuyo rango ya tiene filas en la DEFAULT, así que la
+-- partición se crea suelta, recibe esas filas y recién entonces se adjunta.
+CREATE OR REPLACE FUNCTION scraper_logs_ensure_partitions(from_month date, months_ahead integer)
+RETURNS integer AS $$
+DECLARE
+    month_start date := date_trunc('month', from_month)::date;
+    last_month date := (date_trunc('month', now()) + make_interval(months => months_ahead))::date;
+    created integer := 0;
+    partition_name text;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := 'scraper_logs_' || to_char(month_start, 'YYYYMM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE scraper_logs INCLUDING DEFAULTS)', partition_name);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM scraper_logs_default WHERE timestamp >= %L AND timestamp < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                month_start, (month_start + interval '1 month')::date, partition_name
+            );
+            EXECUTE format(
+                'ALTER TABLE scraper_logs ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, (month_start + interval '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT scraper_logs_ensure_partitions(
+    COALESCE((SELECT MIN(timestamp) FROM scraper_logs_legacy), now())::date, 2
+);
+
+INSERT INTO scraper_logs SELECT * FROM scraper_logs_legacy WHERE timestamp IS NOT NULL;
+DROP TABLE scraper_logs_legacy;
+
+-- Rollup horario: sobrevive a la retención de las particiones crudas.
+-- Guarda sumas y conteos (no promedios) para poder recombinar horas en días/meses.
+CREATE TABLE IF NOT EXISTS scraper_logs_hourly (
+    hour timestamp NOT NULL,
+    city_code varchar(50) NOT NULL DEFAULT '',
+    offer_type varchar(10) NOT NULL DEFAULT '',
+    log_level varchar(20) NOT NULL,
+    log_type varchar(50) NOT NULL,
+    entries integer NOT NULL,
+    execution_time_ms_sum double precision NOT NULL DEFAULT 0,
+    execution_time_ms_count integer NOT NULL DEFAULT 0,
+    properties_found integer NOT NULL DEFAULT 0,
+    properties_validated integer NOT NULL DEFAULT 0,
+    -- {bucket de width_bucket(execution_time_ms, EXECUTION_MS_BOUNDS): logs} (ver services/log_retention.py)
+    execution_ms_histogram jsonb NOT NULL DEFAULT '{}',
+    PRIMARY KEY (hour, city_code, offer_type, log_level, log_type)
+);